@@ -0,0 +1,173 @@
+"""
+Result cache key and location rebasing tests (modules/mask.py canonicalization,
+modules/codeql_cache.py).
+
+    python -m pytest codeql_cache_test.py
+"""
+
+import json
+import os
+import sys
+
+import pytest
+
+pytest.importorskip('tree_sitter_cpp')
+
+from modules.codeql_analyzer import CodeQLAnalyzer
+from modules.codeql_cache import CodeQLResultCache, rebase_cached_entry
+from modules.mask import canonicalize_source, canonicalize_source_with_columns
+from modules.sarif_reader import SarifFinding, SarifLocation
+
+CODE = 'int main() {\n    char buf[8];\n    strcpy(buf, "hello world");\n    return 0;\n}\n'
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return CodeQLResultCache(str(tmp_path / 'cache'))
+
+
+def key(cache, code, build_config='cpp:make'):
+    return cache.make_key(code, 'cpp', 'fingerprint', build_config)
+
+
+# 1. 주석/공백만 다른 코드는 같은 키
+@pytest.mark.parametrize('variant', [
+    'int main() {\n  char buf[8];  // buffer\n\tstrcpy(buf,   "hello world");\n    return 0;\n}\n',
+    'int main()   {\n    char buf[8]; /* x */\n    strcpy(buf, "hello world");   \n    return 0;\n}\n',
+])
+def test_comment_and_whitespace_variants_share_a_key(cache, variant):
+    assert key(cache, variant) == key(cache, CODE)
+
+
+# 2. 리터럴, 매크로 본문, 줄바꿈이 다르면 다른 키
+@pytest.mark.parametrize('variant', [
+    CODE.replace('"hello world"', '"hello  world"'),
+    CODE.replace('"hello world"', '"hello\tworld"'),
+    CODE.replace('char buf[8];', 'char buf[8]; char c = \' \';'),
+    CODE.replace('    return 0;\n', '\n    return 0;\n'),
+    CODE.replace('strcpy(buf, ', 'strcpy(buf,\n'),
+])
+def test_literal_and_line_break_changes_change_the_key(cache, variant):
+    assert key(cache, variant) != key(cache, CODE)
+
+
+def test_macro_bodies_are_kept():
+    assert canonicalize_source('#define S "a  b"\n') != canonicalize_source('#define S "a b"\n')
+    assert canonicalize_source('#define N (1  +  2)\n') != canonicalize_source('#define N (1 + 2)\n')
+
+
+def test_build_config_is_part_of_the_key(cache):
+    assert key(cache, CODE, 'cpp:make:c++17:c11::2.11.2') != key(cache, CODE, 'cpp:compile:c++17:c11::2.11.2')
+    assert key(cache, CODE, 'cpp:make:c++17:c11::2.11.2') != key(cache, CODE, 'cpp:make:c++17:c11::2.12.0')
+
+
+# 분석기 캐시 키에 빌드 설정과 CodeQL 버전 포함
+def test_analyzer_key_covers_build_config(tmp_path, monkeypatch):
+    monkeypatch.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+    def make(**kwargs):
+        return CodeQLAnalyzer(str(tmp_path / 'code'), str(tmp_path / 'db'), str(tmp_path / 'repo'),
+                              cache_path=str(tmp_path / 'cache'), cli_server=True,
+                              cli_server_command=[sys.executable, '-m', 'modules.fake_codeql_server'], **kwargs)
+
+    analyzers = [make(build_mode='make'), make(build_mode='compile'), make(build_mode='compile', cpp_std='c++14')]
+    try:
+        keys = {analyzer._cache_key(CODE, 'cpp') for analyzer in analyzers}
+        assert len(keys) == len(analyzers)
+        same = make(build_mode='make')
+        analyzers.append(same)
+        assert same._cache_key(CODE, 'cpp') == analyzers[0]._cache_key(CODE, 'cpp')
+        same.codeql._version = 'CodeQL command-line toolchain release 2.12.0.'
+        assert same._cache_key(CODE, 'cpp') != analyzers[0]._cache_key(CODE, 'cpp')
+    finally:
+        for analyzer in analyzers:
+            analyzer.codeql.close()
+
+
+# 수정 검증(verify_fix)의 범위 한정 키도 빌드 설정별로 구분
+def test_scoped_keys_cover_build_config(tmp_path, monkeypatch):
+    monkeypatch.chdir(os.path.dirname(os.path.abspath(__file__)))
+    rules = ['cpp/overflow-buffer', 'cpp/unbounded-write']
+
+    def make(**kwargs):
+        return CodeQLAnalyzer(str(tmp_path / 'code'), str(tmp_path / 'db'), str(tmp_path / 'repo'),
+                              cache_path=str(tmp_path / 'cache'), cli_server=True,
+                              cli_server_command=[sys.executable, '-m', 'modules.fake_codeql_server'], **kwargs)
+
+    analyzers = [make(build_mode='make'), make(build_mode='compile'), make(build_mode='make', c_std='c99')]
+    try:
+        keys = {analyzer._cache_key(CODE, 'cpp', rules) for analyzer in analyzers}
+        assert len(keys) == len(analyzers)
+        first = analyzers[0]
+        assert first._cache_key(CODE, 'cpp', rules) == first._cache_key(CODE, 'cpp', rules[::-1])
+        assert first._cache_key(CODE, 'cpp', rules) != first._cache_key(CODE, 'cpp')
+        assert first._cache_key(CODE, 'cpp', rules) != first._cache_key(CODE, 'cpp', rules[:1])
+        first.codeql._version = 'CodeQL command-line toolchain release 2.12.0.'
+        assert first._cache_key(CODE, 'cpp', rules) not in keys
+    finally:
+        for analyzer in analyzers:
+            analyzer.codeql.close()
+
+
+def test_line_numbers_are_preserved():
+    source = 'int a; /* one\ntwo */ int b;\n\n\nint c;\n'
+    canonical, columns = canonicalize_source_with_columns(source)
+    assert canonical.count('\n') == source.count('\n')
+    assert [len(line) for line in columns] == [len(line) + 1 for line in source.split('\n')][:-1] + [0]
+
+
+# 3. 캐시된 위치의 열 번호와 파일 이름을 새 코드 기준으로 변환
+def test_cached_columns_and_filename_are_rebased():
+    source = 'int main() {\n    char buf[8];\n    strcpy(buf, "hello world");\n}\n'
+    snippet = 'int main() {\n  char buf[8];\n  /* copy */ strcpy(buf,    "hello world");\n}\n'
+    old_start = source.split('\n')[2].index('strcpy') + 1
+    old_end = source.split('\n')[2].index(')') + 2
+    location = f"line 3, column {old_start}-{old_end}"
+    step = SarifLocation('code_old.cpp', 3, old_start, 3, old_end)
+    finding = SarifFinding('cpp/overflow-buffer', 'Overflow in code_old.cpp', '120', (step,), ((step,),))
+    entry = {
+        'vul_type': 'Vulnerable',
+        'report': f"- File: code_old.cpp\n- Location(s): {location}\n",
+        'findings': [finding.to_dict()],
+        'source': source,
+    }
+    assert canonicalize_source(snippet) == canonicalize_source(source)
+
+    rebased = rebase_cached_entry(entry, snippet, 'cpp', 'code_new.cpp')
+
+    new_line = snippet.split('\n')[2]
+    expected = f"line 3, column {new_line.index('strcpy') + 1}-{new_line.index(')') + 2}"
+    rebased_finding = SarifFinding.from_dict(rebased['findings'][0])
+    assert rebased_finding.locations[0].describe() == expected
+    assert rebased_finding.code_flows[0][0].describe() == expected
+    assert rebased_finding.uri == 'code_new.cpp' and rebased_finding.code_flows[0][0].uri == 'code_new.cpp'
+    assert rebased_finding.message == 'Overflow in code_new.cpp'
+    assert expected in rebased['report']
+    assert 'code_new.cpp' in rebased['report'] and 'code_old.cpp' not in rebased['report']
+    # 원본 entry 는 변경하지 않음
+    assert entry['findings'][0]['locations'][0]['start_column'] == old_start
+
+
+def test_identical_source_is_not_rebased():
+    entry = {'vul_type': 'Safe', 'report': 'line 1, column 1-4', 'findings': [], 'source': CODE}
+    assert rebase_cached_entry(entry, CODE, 'cpp', 'code_new.cpp')['report'] == 'line 1, column 1-4'
+
+
+def test_put_and_get_round_trip(cache):
+    cache_key = key(cache, CODE)
+    assert cache.get(cache_key) is None
+    cache.put(cache_key, 'Safe', 'report', [], source=CODE)
+    entry = cache.get(cache_key)
+    assert entry['vul_type'] == 'Safe' and entry['source'] == CODE
+
+
+def test_entries_of_an_older_format_are_misses(cache):
+    cache_key = key(cache, CODE)
+    cache.put(cache_key, 'Vulnerable', 'report', [], source=CODE)
+    entry_path = cache._entry_path(cache_key)
+    with open(entry_path) as file:
+        entry = json.load(file)
+    del entry['format']
+    with open(entry_path, 'w') as file:
+        json.dump(entry, file)
+    assert cache.get(cache_key) is None
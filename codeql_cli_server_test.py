@@ -0,0 +1,137 @@
+"""
+CodeQL CLI server mode tests, run against modules/fake_codeql_server.py so
+no CodeQL installation is needed.
+
+    python -m pytest codeql_cli_server_test.py
+"""
+
+import asyncio
+import os
+import shutil
+import stat
+import sys
+
+import pytest
+
+from modules.codeql_analyzer import CodeQLAnalyzer
+from modules.codeql_cli import CodeQLCliServer
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+FAKE_SERVER_COMMAND = [sys.executable, '-m', 'modules.fake_codeql_server']
+CODE = "int main() {\n    return 0;\n}\n"
+
+
+@pytest.fixture
+def make_analyzer(tmp_path, monkeypatch):
+    """Build analyzers on the fake CLI server, with the top25 queries and no cache."""
+    monkeypatch.chdir(ROOT)
+    monkeypatch.setenv('PYTHONPATH', ROOT)
+    repo = tmp_path / 'repo'
+    shutil.copytree(os.path.join(ROOT, 'codeql-queries', 'cpp', 'top25'), repo / 'cpp' / 'ql' / 'src' / 'top25')
+    analyzers = []
+
+    def make(server_command=FAKE_SERVER_COMMAND):
+        analyzer = CodeQLAnalyzer(str(tmp_path / 'code'), str(tmp_path / 'db'), str(repo),
+                                  cli_server=True, cli_server_command=server_command, build_mode='compile')
+        analyzers.append(analyzer)
+        return analyzer
+
+    yield make
+    for analyzer in analyzers:
+        analyzer.codeql.close()
+
+
+@pytest.fixture
+def server_starts(monkeypatch):
+    """Count CLI server process starts."""
+    starts = []
+    original = CodeQLCliServer.start
+
+    def start(self):
+        starts.append(self.command)
+        original(self)
+
+    monkeypatch.setattr(CodeQLCliServer, 'start', start)
+    return starts
+
+
+@pytest.fixture
+def fake_codeql_binary(tmp_path, monkeypatch):
+    """Put a 'codeql' on PATH that runs one fake command per process and logs it."""
+    bin_dir = tmp_path / 'bin'
+    bin_dir.mkdir()
+    log = tmp_path / 'subprocess_calls.log'
+    script = bin_dir / 'codeql'
+    script.write_text(
+        "#!/bin/sh\n"
+        f"echo \"$1 $2\" >> '{log}'\n"
+        f"exec '{sys.executable}' -m modules.fake_codeql_server \"$@\"\n"
+    )
+    script.chmod(script.stat().st_mode | stat.S_IXUSR)
+    monkeypatch.setenv('PATH', f"{bin_dir}{os.pathsep}{os.environ.get('PATH', '')}")
+    return log
+
+
+# 1. 서버 1개로 database create / analyze 처리
+def test_analyze_on_cli_server(make_analyzer, server_starts):
+    analyzer = make_analyzer()
+    result = analyzer.analyze(CODE, 'cpp')
+
+    assert result.vul_type == 'Safe', result.report
+    assert analyzer.codeql.use_server
+    assert len(server_starts) == 1
+    # 두 번째 분석도 같은 서버 재사용
+    assert analyzer.analyze(CODE, 'cpp').vul_type == 'Safe'
+    assert len(server_starts) == 1
+
+
+# 2. 서버가 중간에 종료되면 재시작 후 같은 명령 재실행
+def test_server_crash_is_restarted(make_analyzer, server_starts, monkeypatch):
+    monkeypatch.setenv('FAKE_CODEQL_CRASH_AFTER', '1')
+    analyzer = make_analyzer()
+    result = analyzer.analyze(CODE, 'cpp')
+
+    assert result.vul_type == 'Safe', result.report
+    # 첫 명령 이후의 명령마다 서버가 재시작되고, subprocess fallback 은 없음
+    assert len(server_starts) >= 2
+    assert analyzer.codeql.use_server
+    assert analyzer.codeql._server_failures == 0
+
+
+# 3. 재시작도 실패하면 subprocess 로 fallback, 반복 실패 시 server 모드 해제
+def test_fallback_to_subprocess(make_analyzer, server_starts, fake_codeql_binary, monkeypatch):
+    # 시작하자마자 종료되는 서버: 재시작도 실패
+    crashing_server = [sys.executable, '-c', 'import sys; sys.exit(1)']
+    analyzer = make_analyzer(crashing_server)
+    result = analyzer.analyze(CODE, 'cpp')
+
+    assert result.vul_type == 'Safe', result.report
+    calls = fake_codeql_binary.read_text().splitlines()
+    assert 'database create' in calls
+    assert 'database analyze' in calls
+    assert len(server_starts) >= 2
+
+    for _ in range(analyzer.codeql.MAX_SERVER_FAILURES):
+        analyzer.analyze(CODE, 'cpp')
+    assert not analyzer.codeql.use_server
+    starts = len(server_starts)
+    assert analyzer.analyze(CODE, 'cpp').vul_type == 'Safe'
+    assert len(server_starts) == starts
+
+
+# 4. server 모드와 작업별 자원 제한은 함께 사용할 수 없음
+def test_server_mode_rejects_resource_limits(tmp_path):
+    with pytest.raises(ValueError):
+        CodeQLAnalyzer(str(tmp_path / 'code'), str(tmp_path / 'db'), str(tmp_path / 'repo'),
+                       cli_server=True, cli_server_command=FAKE_SERVER_COMMAND, job_wall_clock=300)
+
+
+# 5. 비동기(취소 가능) 분석의 명령은 서버가 아닌 개별 subprocess 로 실행
+def test_async_jobs_run_as_subprocesses(make_analyzer, server_starts, fake_codeql_binary):
+    analyzer = make_analyzer()
+    vul_type, report = asyncio.run(analyzer.analyze_code_async(CODE, 'cpp', deadline=60))
+
+    assert vul_type == 'Safe', report
+    assert server_starts == []
+    calls = fake_codeql_binary.read_text().splitlines()
+    assert 'database create' in calls and 'database analyze' in calls
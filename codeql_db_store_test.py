@@ -0,0 +1,106 @@
+"""
+Retained database store tests (modules/codeql_cache.py CodeQLDatabaseStore and
+database reuse in CodeQLAnalyzer).
+
+    python -m pytest codeql_db_store_test.py
+"""
+
+import os
+import sys
+
+import pytest
+
+from modules.codeql_analyzer import CodeQLAnalyzer
+from modules.codeql_cache import CodeQLDatabaseStore
+from modules.sarif_reader import SarifFinding, SarifLocation
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+CODE = "int main() {\n    return 0;\n}\n"
+
+
+def make_database(path):
+    os.makedirs(os.path.join(path, 'db-cpp'))
+    with open(os.path.join(path, 'codeql-database.yml'), 'w') as file:
+        file.write('primaryLanguage: cpp\n')
+    with open(os.path.join(path, 'db-cpp', 'functions.rel'), 'w') as file:
+        file.write('r' * 100)
+    return str(path)
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = CodeQLDatabaseStore(str(tmp_path / 'retained'), 10 ** 6)
+    assert store.put('key', make_database(tmp_path / 'db'), source_name='code_first.cpp')
+    return store
+
+
+# 1. 첫 checkout 만 독점, 동시 checkout 은 대기 없이 공유(읽기 전용)
+def test_concurrent_checkouts_are_shared(store):
+    path, exclusive = store.acquire('key')
+    assert exclusive
+    shared_path, shared = store.acquire('key')
+    assert shared_path == path and not shared
+
+    store.release('key', shared)
+    store.release('key', exclusive)
+    assert store.acquire('key')[1]
+    store.release('key')
+
+
+def test_missing_entry_is_not_checked_out(store):
+    assert store.acquire('other') is None
+
+
+# 2. 원본 소스 파일 이름은 크기 갱신 후에도 유지
+def test_source_name_survives_release(store):
+    store.release('key', store.acquire('key')[1])
+    assert store.source_name('key') == 'code_first.cpp'
+    assert store.source_name('other') is None
+
+
+# 3. 보관된 DB 재사용 시 결과의 파일 이름을 현재 작업 기준으로 변환
+def test_reused_database_findings_are_renamed(tmp_path, monkeypatch):
+    monkeypatch.chdir(ROOT)
+    analyzer = CodeQLAnalyzer(str(tmp_path / 'code'), str(tmp_path / 'db'), str(tmp_path / 'repo'),
+                              cli_server=True, cli_server_command=[sys.executable, '-m', 'modules.fake_codeql_server'],
+                              db_retention_bytes=10 ** 8, build_mode='compile')
+    try:
+        analyzer.analyze(CODE, 'cpp')
+        stored_name = analyzer.db_store.source_name(analyzer._database_key(CODE, 'cpp'))
+        assert stored_name and stored_name.startswith('code_')
+
+        monkeypatch.setattr(analyzer, 'process_sarif_results', lambda sarif_file: [
+            SarifFinding('cpp/overflow-buffer', f"Overflow in {stored_name}", '120',
+                         (SarifLocation(stored_name, 2, 5, 2, 10),), ())
+        ])
+        result = analyzer.analyze(CODE, 'cpp')
+
+        assert analyzer.get_metrics()['db_reuses'] == 1
+        new_name = result.findings[0].uri
+        assert new_name != stored_name and new_name.startswith('code_')
+        assert stored_name not in result.report and new_name in result.report
+    finally:
+        analyzer.codeql.close()
+
+
+def test_busy_database_is_cloned(tmp_path, monkeypatch):
+    monkeypatch.chdir(ROOT)
+    analyzer = CodeQLAnalyzer(str(tmp_path / 'code'), str(tmp_path / 'db'), str(tmp_path / 'repo'),
+                              cli_server=True, cli_server_command=[sys.executable, '-m', 'modules.fake_codeql_server'],
+                              db_retention_bytes=10 ** 8, build_mode='compile')
+    try:
+        analyzer.analyze(CODE, 'cpp')
+        key = analyzer._database_key(CODE, 'cpp')
+        stored, exclusive = analyzer.db_store.acquire(key)
+        queried = []
+        run_queries = analyzer.run_queries
+        monkeypatch.setattr(analyzer, 'run_queries',
+                            lambda db_path, *args, **kwargs: queried.append(db_path) or run_queries(db_path, *args, **kwargs))
+
+        # Another job holds the stored database: this one queries a clone without waiting
+        assert analyzer.analyze(CODE, 'cpp').vul_type == 'Safe'
+        assert queried and queried[0] != stored
+        assert analyzer.get_metrics()['db_reuses'] == 1
+        analyzer.db_store.release(key, exclusive)
+    finally:
+        analyzer.codeql.close()
@@ -0,0 +1,96 @@
+"""
+Per-job resource limit tests (modules/codeql_cli.py run_limited, breach
+classification and memoization in CodeQLAnalyzer).
+
+    python -m pytest codeql_limits_test.py
+"""
+
+import subprocess
+import sys
+
+import pytest
+
+from modules.codeql_analyzer import CodeQLAnalyzer, JVM_NON_HEAP_MB
+from modules.codeql_cli import CodeQLResourceLimitError, ResourceLimits, resource, run_limited
+
+pytestmark = pytest.mark.skipif(resource is None, reason="rlimits need the resource module")
+
+MB = 1024 * 1024
+
+
+def python(code):
+    return [sys.executable, '-c', code]
+
+
+def limit_of(command, **limits):
+    with pytest.raises(CodeQLResourceLimitError) as error:
+        run_limited(command, 30, ResourceLimits(**limits))
+    return error.value.limit
+
+
+# 1. 제한 초과 종류 분류
+def test_memory_breach():
+    assert limit_of(python("bytearray(512 * 1024 * 1024)"), memory_bytes=256 * MB) == 'memory'
+
+
+def test_reserved_address_space_is_not_limited():
+    # JVM 처럼 큰 주소 공간을 예약만 하는 프로세스는 RLIMIT_DATA 에 걸리지 않음
+    reserve = ("import mmap; m = mmap.mmap(-1, 4 << 30, flags=mmap.MAP_PRIVATE | mmap.MAP_ANONYMOUS, "
+               "prot=0); print('ok')")
+    assert run_limited(python(reserve), 30, ResourceLimits(memory_bytes=256 * MB)).stdout.strip() == 'ok'
+
+
+def test_file_size_breach(tmp_path):
+    write = f"open({str(tmp_path / 'big')!r}, 'wb').write(b'0' * (20 * 1024 * 1024))"
+    assert limit_of(python(write), file_size_bytes=5 * MB) == 'file_size'
+
+
+def test_cpu_breach():
+    assert limit_of(python("while True: pass"), cpu_seconds=1) == 'cpu'
+
+
+def test_wall_clock_breach():
+    assert limit_of(python("import time; time.sleep(30)"), wall_clock_seconds=1) == 'wall_clock'
+
+
+# 2. 제한 초과가 아닌 실패는 CalledProcessError
+def test_bare_sigkill_is_not_a_cpu_breach():
+    kill = "import os, signal; os.kill(os.getpid(), signal.SIGKILL)"
+    with pytest.raises(subprocess.CalledProcessError):
+        run_limited(python(kill), 30, ResourceLimits(cpu_seconds=60))
+
+
+def test_jvm_startup_failure_is_not_a_memory_breach():
+    jvm = ("import sys; sys.stderr.write('Error occurred during initialization of VM\\n"
+           "Could not reserve enough space for object heap\\n'); sys.exit(1)")
+    with pytest.raises(subprocess.CalledProcessError):
+        run_limited(python(jvm), 30, ResourceLimits(memory_bytes=256 * MB))
+
+
+# 3. 같은 코드에서 반복되는 초과(file_size)만 기억, 부하에 따라 달라지는 초과는 재시도
+@pytest.fixture
+def analyzer(tmp_path):
+    return CodeQLAnalyzer(str(tmp_path / 'code'), str(tmp_path / 'db'), str(tmp_path / 'repo'),
+                          job_memory_mb=4096)
+
+
+@pytest.mark.parametrize('limit, remembered', [
+    ('file_size', True), ('memory', False), ('cpu', False), ('wall_clock', False), ('disk', False),
+])
+def test_only_reproducible_breaches_are_remembered(analyzer, limit, remembered):
+    calls = []
+
+    def job(code, language):
+        calls.append(code)
+        raise CodeQLResourceLimitError(limit, f"exceeded {limit}")
+
+    for _ in range(2):
+        with pytest.raises(CodeQLResourceLimitError):
+            analyzer._run_snippet_job('int main() {}', 'cpp', job)
+    assert len(calls) == (1 if remembered else 2)
+    assert analyzer.get_metrics()['limit_fast_failures'] == (1 if remembered else 0)
+
+
+def test_ram_is_capped_below_the_memory_limit(analyzer):
+    plan = analyzer.plan_resources()
+    assert plan.ram_mb <= 4096 - JVM_NON_HEAP_MB
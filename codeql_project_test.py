@@ -0,0 +1,110 @@
+"""
+Project archive analysis tests (safe extraction and workspace sizing in
+CodeQLAnalyzer.analyze_project).
+
+    python -m pytest codeql_project_test.py
+"""
+
+import io
+import os
+import stat
+import tarfile
+import zipfile
+
+import pytest
+
+from modules.codeql_analyzer import CodeQLAnalyzer, UnsafeArchiveError
+
+
+@pytest.fixture
+def analyzer(tmp_path):
+    return CodeQLAnalyzer(str(tmp_path / 'code'), str(tmp_path / 'db'), str(tmp_path / 'repo'),
+                          allow_project_build_commands=True)
+
+
+def make_tar(path, members):
+    """Write a gzipped tar from (TarInfo, data) pairs."""
+    with tarfile.open(path, 'w:gz') as archive:
+        for info, data in members:
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data) if data else None)
+    return str(path)
+
+
+def regular(name, data):
+    return tarfile.TarInfo(name), data
+
+
+# 1. 프로젝트 밖을 가리키는 경로 거부
+@pytest.mark.parametrize('name', ['../evil.c', 'src/../../evil.c', '..', '/etc/passwd', '..\\evil.c', 'src\\..\\..\\evil.c'])
+def test_escaping_member_paths_are_rejected(analyzer, tmp_path, name):
+    with pytest.raises(UnsafeArchiveError):
+        analyzer._safe_member_path(str(tmp_path), name)
+
+
+@pytest.mark.parametrize('name, expected', [('src/main.c', 'src/main.c'), ('./src/../main.c', 'main.c'),
+                                            ('src\\util.c', 'src/util.c')])
+def test_member_paths_stay_below_the_root(analyzer, tmp_path, name, expected):
+    assert analyzer._safe_member_path(str(tmp_path), name) == os.path.join(str(tmp_path), expected)
+
+
+# 2. 링크, 장치 파일, 탈출 경로가 있는 압축 파일은 추출 거부
+@pytest.mark.parametrize('link_type', [tarfile.SYMTYPE, tarfile.LNKTYPE, tarfile.CHRTYPE])
+def test_tar_links_are_rejected(analyzer, tmp_path, link_type):
+    link = tarfile.TarInfo('src/passwd')
+    link.type = link_type
+    link.linkname = '/etc/passwd'
+    archive = make_tar(tmp_path / 'project.tar.gz', [regular('src/main.c', b'int main() {}\n'), (link, b'')])
+
+    with pytest.raises(UnsafeArchiveError):
+        analyzer.extract_project_archive(archive, str(tmp_path / 'out'))
+    assert not os.path.lexists(tmp_path / 'out' / 'src' / 'passwd')
+
+
+def test_zip_symlinks_are_rejected(analyzer, tmp_path):
+    path = tmp_path / 'project.zip'
+    with zipfile.ZipFile(path, 'w') as archive:
+        link = zipfile.ZipInfo('src/passwd')
+        link.external_attr = (stat.S_IFLNK | 0o777) << 16
+        archive.writestr(link, '/etc/passwd')
+
+    with pytest.raises(UnsafeArchiveError):
+        analyzer.extract_project_archive(str(path), str(tmp_path / 'out'))
+
+
+def test_escaping_tar_member_writes_nothing_outside(analyzer, tmp_path):
+    archive = make_tar(tmp_path / 'project.tar.gz', [regular('../escaped.c', b'int x;\n')])
+    with pytest.raises(UnsafeArchiveError):
+        analyzer.extract_project_archive(archive, str(tmp_path / 'out'))
+    assert not os.path.exists(tmp_path / 'escaped.c')
+
+
+def test_extraction_reports_files_and_bytes(analyzer, tmp_path):
+    archive = make_tar(tmp_path / 'project.tar.gz', [regular('src/main.c', b'int main() {}\n'),
+                                                      regular('include/util.h', b'#pragma once\n')])
+    assert analyzer.extract_project_archive(archive, str(tmp_path / 'out')) == (2, 27)
+
+
+# 3. 작업 공간 크기는 압축 해제된 크기 기준, 빌드 명령은 C/C++ 전용
+def test_workspace_is_sized_from_extracted_bytes(analyzer, tmp_path, monkeypatch):
+    source = b'int x;\n' + b' ' * (1024 * 1024)
+    archive = make_tar(tmp_path / 'project.tar.gz', [regular('src/main.c', source)])
+    assert os.path.getsize(archive) < len(source) // 100
+    sized = []
+    create_workspace = analyzer.create_workspace
+    monkeypatch.setattr(analyzer, 'create_workspace',
+                        lambda language, source_bytes: sized.append(source_bytes) or create_workspace(language, source_bytes))
+    monkeypatch.setattr(analyzer, 'create_codeql_database', lambda *args, **kwargs: None)
+
+    with pytest.raises(RuntimeError):
+        analyzer.analyze_project(archive, 'cpp', build_command='make')
+
+    assert sized == [len(source)]
+    # The staging directory and the workspace are both removed
+    assert os.listdir(tmp_path / 'code' / 'cpp') == []
+
+
+def test_build_command_is_rejected_for_other_languages(analyzer, tmp_path):
+    archive = make_tar(tmp_path / 'project.tar.gz', [regular('main.py', b'print(1)\n')])
+    with pytest.raises(ValueError):
+        analyzer.analyze_project(archive, 'python', build_command='make')
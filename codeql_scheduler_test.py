@@ -0,0 +1,131 @@
+"""
+CodeQL job scheduler tests (CodeQLJobScheduler FIFO admission, cancellation
+and the worker pool of the async entry points).
+
+    python -m pytest codeql_scheduler_test.py
+"""
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+from modules.codeql_analyzer import CodeQLAnalyzer, CodeQLJobScheduler, CodeQLQueueFull
+from modules.codeql_cli import CodeQLCancelled
+
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not reached"
+        time.sleep(0.01)
+
+
+def start_waiter(scheduler, order, name, **kwargs):
+    """Queue a job that records when it gets its slot, and wait until it is queued."""
+    queued = scheduler.stats()['queue_length'] + scheduler.stats()['background_queue_length']
+
+    def job():
+        try:
+            scheduler.acquire(**kwargs)
+        except CodeQLCancelled:
+            order.append(f"{name} cancelled")
+            return
+        order.append(name)
+        scheduler.release(0.01)
+
+    thread = threading.Thread(target=job)
+    thread.start()
+    wait_until(lambda: scheduler.stats()['queue_length'] + scheduler.stats()['background_queue_length'] > queued)
+    return thread
+
+
+# 1. 대기열은 도착 순서대로 슬롯을 넘겨받음
+def test_fifo_handoff():
+    scheduler = CodeQLJobScheduler(max_concurrent=1, max_queue=8)
+    scheduler.acquire()
+    order = []
+    threads = [start_waiter(scheduler, order, name) for name in ('a', 'b', 'c')]
+
+    scheduler.release(0.01)
+    for thread in threads:
+        thread.join(5)
+    assert order == ['a', 'b', 'c']
+    assert scheduler.stats()['running'] == 0
+
+
+def test_low_priority_jobs_wait_behind_regular_jobs():
+    scheduler = CodeQLJobScheduler(max_concurrent=1, max_queue=8)
+    scheduler.acquire()
+    order = []
+    threads = [start_waiter(scheduler, order, 'rescan', low_priority=True),
+               start_waiter(scheduler, order, 'live')]
+
+    scheduler.release(0.01)
+    for thread in threads:
+        thread.join(5)
+    assert order == ['live', 'rescan']
+
+
+def test_full_queue_is_rejected_with_retry_after():
+    scheduler = CodeQLJobScheduler(max_concurrent=1, max_queue=1)
+    scheduler.acquire()
+    order = []
+    thread = start_waiter(scheduler, order, 'a')
+
+    with pytest.raises(CodeQLQueueFull) as error:
+        scheduler.acquire()
+    assert error.value.retry_after > 0
+    assert scheduler.stats()['rejected'] == 1
+    scheduler.release(0.01)
+    thread.join(5)
+
+
+# 2. 대기 중 취소
+def test_cancel_while_queued():
+    scheduler = CodeQLJobScheduler(max_concurrent=1, max_queue=8)
+    scheduler.acquire()
+    cancelled = threading.Event()
+    order = []
+    thread = start_waiter(scheduler, order, 'a', cancelled=cancelled.is_set)
+
+    cancelled.set()
+    thread.join(5)
+    assert order == ['a cancelled']
+    stats = scheduler.stats()
+    assert stats['queue_length'] == 0 and stats['running'] == 1
+    scheduler.release(0.01)
+    assert scheduler.stats()['running'] == 0
+
+
+def test_cancel_at_handoff_passes_the_slot_on_without_a_run_sample():
+    scheduler = CodeQLJobScheduler(max_concurrent=1, max_queue=8)
+    scheduler.acquire()
+    order = []
+
+    def cancelled():
+        # The slot is handed over while the job decides to leave
+        scheduler.release(5.0)
+        return True
+
+    thread = start_waiter(scheduler, order, 'a', cancelled=cancelled)
+    thread.join(5)
+
+    assert order == ['a cancelled']
+    stats = scheduler.stats()
+    assert stats['running'] == 0
+    # Only the real run is recorded, not a 0s sample for the cancelled hand-over
+    assert stats['run_seconds']['count'] == 1 and stats['run_seconds']['mean'] == 5.0
+
+
+# 3. 비동기 분석은 기본 executor 가 아닌 전용 스레드 풀에서 실행
+def test_async_jobs_use_a_dedicated_pool(tmp_path):
+    analyzer = CodeQLAnalyzer(str(tmp_path / 'code'), str(tmp_path / 'db'), str(tmp_path / 'repo'),
+                              max_concurrent_jobs=1, max_queued_jobs=2)
+
+    async def main():
+        return await analyzer._run_cancellable(lambda: threading.current_thread().name)
+
+    assert asyncio.run(main()).startswith('codeql-async')
+    assert analyzer._async_executor._max_workers == 1 + 2 + 4
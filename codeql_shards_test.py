@@ -0,0 +1,119 @@
+"""
+Query shard tests (database cloning for parallel query runs, SARIF merging).
+
+    python -m pytest codeql_shards_test.py
+"""
+
+import json
+import os
+
+import pytest
+
+from modules.codeql_analyzer import CodeQLAnalyzer, clone_database
+from modules.codeql_cache import directory_size
+
+
+def write(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as file:
+        file.write(text)
+
+
+@pytest.fixture
+def database(tmp_path):
+    db = tmp_path / 'db'
+    write(db / 'codeql-database.yml', 'primaryLanguage: cpp\n')
+    write(db / 'src.zip', 'z' * 1000)
+    write(db / 'db-cpp' / 'default' / 'functions.rel', 'r' * 4000)
+    write(db / 'db-cpp' / 'default' / 'cache' / 'pages' / 'page0', 'c' * 100)
+    write(db / 'log' / 'database-create.log', 'log')
+    return str(db)
+
+
+# 1. 샤드용 DB 복제: 데이터셋은 하드링크, 평가 캐시만 복사
+def test_clone_links_the_dataset_and_copies_the_cache(database, tmp_path):
+    clone = str(tmp_path / 'shard1')
+    clone_database(database, clone)
+
+    def same_file(*parts):
+        return os.stat(os.path.join(database, *parts)).st_ino == os.stat(os.path.join(clone, *parts)).st_ino
+
+    assert same_file('db-cpp', 'default', 'functions.rel')
+    assert same_file('src.zip')
+    assert not same_file('db-cpp', 'default', 'cache', 'pages', 'page0')
+    with open(os.path.join(clone, 'db-cpp', 'default', 'cache', 'pages', 'page0')) as file:
+        assert file.read() == 'c' * 100
+    assert not os.path.exists(os.path.join(clone, 'log'))
+
+
+def test_linked_files_are_counted_once(database, tmp_path):
+    clone = str(tmp_path / 'shard1')
+    clone_database(database, clone)
+
+    assert directory_size(str(tmp_path)) == directory_size(database) + 100
+    seen = set()
+    assert directory_size(database, seen) + directory_size(clone, seen) == directory_size(str(tmp_path))
+
+
+# 2. 샤드 SARIF 병합: 규칙/아티팩트 중복 제거 및 인덱스 재매핑
+def sarif(rules, artifacts, results):
+    return {
+        'version': '2.1.0',
+        '$schema': 'https://json.schemastore.org/sarif-2.1.0.json',
+        'runs': [{
+            'tool': {'driver': {'name': 'CodeQL', 'rules': [{'id': rule} for rule in rules]}},
+            'artifacts': [{'location': {'uri': uri, 'index': i}} for i, uri in enumerate(artifacts)],
+            'invocations': [{'executionSuccessful': True}],
+            'results': [
+                {'ruleId': rule, 'ruleIndex': rules.index(rule), 'message': {'text': message},
+                 'locations': [{'physicalLocation': {'artifactLocation': {'uri': uri, 'index': artifacts.index(uri)}}}]}
+                for rule, uri, message in results
+            ],
+        }],
+    }
+
+
+@pytest.fixture
+def analyzer(tmp_path):
+    return CodeQLAnalyzer(str(tmp_path / 'code'), str(tmp_path / 'dbs'), str(tmp_path / 'repo'))
+
+
+def test_merge_remaps_rules_and_artifacts(analyzer, tmp_path):
+    shards = [
+        sarif(['cpp/a', 'cpp/b'], ['x.cpp'], [('cpp/b', 'x.cpp', 'b in x')]),
+        sarif(['cpp/c', 'cpp/b'], ['y.cpp', 'x.cpp'], [('cpp/c', 'y.cpp', 'c in y'), ('cpp/b', 'x.cpp', 'b again')]),
+        sarif(['cpp/d'], [], []),
+    ]
+    paths = []
+    for i, log in enumerate(shards):
+        paths.append(str(tmp_path / f'shard{i}.sarif'))
+        with open(paths[-1], 'w') as file:
+            json.dump(log, file)
+
+    output = str(tmp_path / 'merged.sarif')
+    analyzer.merge_sarif_files(paths, output)
+    with open(output) as file:
+        merged = json.load(file)
+
+    assert merged['$schema'] == shards[0]['$schema']
+    run, = merged['runs']
+    rules = [rule['id'] for rule in run['tool']['driver']['rules']]
+    artifacts = [artifact['location']['uri'] for artifact in run['artifacts']]
+    assert rules == ['cpp/a', 'cpp/b', 'cpp/c', 'cpp/d']
+    assert artifacts == ['x.cpp', 'y.cpp']
+    assert len(run['invocations']) == 3
+    for result in run['results']:
+        assert rules[result['ruleIndex']] == result['ruleId']
+        location = result['locations'][0]['physicalLocation']['artifactLocation']
+        assert artifacts[location['index']] == location['uri']
+    assert [result['message']['text'] for result in run['results']] == ['b in x', 'c in y', 'b again']
+
+
+def test_merge_without_runs(analyzer, tmp_path):
+    path = str(tmp_path / 'empty.sarif')
+    with open(path, 'w') as file:
+        json.dump({'version': '2.1.0', 'runs': []}, file)
+    output = str(tmp_path / 'merged.sarif')
+    analyzer.merge_sarif_files([path], output)
+    with open(output) as file:
+        assert json.load(file) == {'version': '2.1.0', 'runs': []}
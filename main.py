@@ -1,10 +1,16 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
+from typing import List, Optional
 import asyncio
-from service import (code_generation, model_code_analysis, codeql_code_analysis, code_fix, pipeline)
+from service import (code_generation, model_code_analysis_async, model_metrics, codeql_code_analysis_async, codeql_batch_analysis, codeql_metrics, codeql_query_profile, code_fix, pipeline)
 from service import (pipeline_stream, code_generation_pipeline_stream, code_fix_pipeline_stream)
+from service import (codeql_project_analysis, upload_path, max_project_upload_bytes)
+from modules.codeql_analyzer import CodeQLQueueFull, CodeQLResourceLimitError, UnsafeArchiveError
 import json
+import math
+import os
+import uuid
 
 app = FastAPI(title="Code Service API")
     
@@ -19,6 +25,9 @@ class GenerationRequest(BaseModel):
 class AnalysisRequest(BaseModel):
     code: str
 
+class BatchAnalysisRequest(BaseModel):
+    codes: List[str]
+
 class FixRequest(BaseModel):
     code: str
     analysis: str
@@ -34,6 +43,29 @@ class PipelineRequest(BaseModel):
 async def run_in_thread(func, *args):
     return await asyncio.to_thread(func, *args)
 
+# 클라이언트 연결이 끊기면 작업을 취소하는 helper (CodeQL 프로세스도 함께 종료됨)
+async def run_until_disconnected(request: Request, coro):
+    task = asyncio.ensure_future(coro)
+    while True:
+        done, _ = await asyncio.wait({task}, timeout=1.0)
+        if done:
+            return task.result()
+        if await request.is_disconnected():
+            task.cancel()
+            raise HTTPException(status_code=499, detail="Client disconnected")
+
+# CodeQL 대기열 포화 시 503 + Retry-After 응답
+def queue_full_error(e: CodeQLQueueFull):
+    return HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(math.ceil(e.retry_after))})
+
+# 스트리밍 응답 helper (대기열 포화 시 error 단계로 전달)
+async def stream_events(generator):
+    try:
+        async for item in generator:
+            yield json.dumps(item) + "\n"   # 줄바꿈으로 chunk 구분
+    except CodeQLQueueFull as e:
+        yield json.dumps({"stage": "error", "message": str(e), "retry_after": math.ceil(e.retry_after)}) + "\n"
+
 # 1. 코드 생성 API
 @app.post("/code/generation")
 async def generate_code(req: GenerationRequest):
@@ -47,19 +79,78 @@ async def generate_code(req: GenerationRequest):
 @app.post("/code/analysis/model")
 async def analyze_code_model(req: AnalysisRequest):
     try:
-        vul_type, analysis = await run_in_thread(model_code_analysis, req.code)
+        vul_type, analysis = await model_code_analysis_async(req.code)
         return {"vulnerability_type": vul_type, "analysis": analysis}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+# 2.1.1 모델 분석 micro-batcher 지표 API
+@app.get("/code/analysis/model/metrics")
+async def get_model_metrics():
+    return model_metrics()
+
 # 2.2 CodeQL 코드 분석 API
 @app.post("/code/analysis/codeql")
-async def analyze_code_codeql(req: AnalysisRequest):
+async def analyze_code_codeql(req: AnalysisRequest, request: Request):
     try:
-        vul_type, report = await run_in_thread(codeql_code_analysis, req.code)
+        vul_type, report = await run_until_disconnected(request, codeql_code_analysis_async(req.code))
         return {"vulnerability_type": vul_type, "analysis": report}
+    except CodeQLQueueFull as e:
+        raise queue_full_error(e)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+# 2.3 CodeQL 배치 코드 분석 API
+@app.post("/code/analysis/codeql/batch")
+async def analyze_code_codeql_batch(req: BatchAnalysisRequest):
+    try:
+        results = await run_in_thread(codeql_batch_analysis, req.codes)
+        return {"results": [{"vulnerability_type": vul_type, "analysis": report} for vul_type, report in results]}
+    except CodeQLQueueFull as e:
+        raise queue_full_error(e)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+# 2.3.1 CodeQL 프로젝트 분석 API (요청 본문에 tar/zip 파일을 그대로 전송, 디스크로 스트리밍 저장)
+@app.post("/code/analysis/codeql/project")
+async def analyze_project_codeql(request: Request, build_command: Optional[str] = None):
+    os.makedirs(upload_path, exist_ok=True)
+    archive_path = os.path.join(upload_path, f"upload_{uuid.uuid4().hex}")
+    try:
+        received = 0
+        with open(archive_path, "wb") as file:
+            async for chunk in request.stream():
+                received += len(chunk)
+                if received > max_project_upload_bytes:
+                    raise HTTPException(status_code=413, detail=f"Upload exceeds {max_project_upload_bytes} bytes")
+                file.write(chunk)
+        vul_type, report, diagnostics = await run_until_disconnected(request, codeql_project_analysis(archive_path, build_command))
+        return {"vulnerability_type": vul_type, "analysis": report, "diagnostics": diagnostics}
+    except CodeQLQueueFull as e:
+        raise queue_full_error(e)
+    except (UnsafeArchiveError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except CodeQLResourceLimitError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if os.path.exists(archive_path):
+            os.remove(archive_path)
+
+# 2.4 CodeQL 분석기 지표 API
+@app.get("/code/analysis/codeql/metrics")
+async def get_codeql_metrics():
+    return codeql_metrics()
+
+# 2.5 CodeQL 쿼리별 프로파일 API
+@app.get("/code/analysis/codeql/profile")
+async def get_codeql_query_profile(limit: int = 10):
+    return {"queries": codeql_query_profile(limit)}
 
 # 3. 코드 수정 API
 @app.post("/code/fix")
@@ -77,29 +168,22 @@ async def run_pipeline(req: PipelineRequest):
     try:
         code, vul_type, analysis, code_fixed, vul_type_fixed, analysis_fixed = await run_in_thread(pipeline, req.model_id, req.prompt)
         return {"code": code, "vul_type": vul_type, "analysis": analysis, "code_fixed": code_fixed, "vul_type_fixed": vul_type_fixed, "analysis_fixed": analysis_fixed}
+    except CodeQLQueueFull as e:
+        raise queue_full_error(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 # 5. 스트리밍 파이프라인 API
 @app.post("/code/pipeline/stream")
 async def run_pipeline_stream(req: PipelineRequest):
-    async def event_generator():
-        async for item in pipeline_stream(req.model_id, req.prompt):
-            yield json.dumps(item) + "\n"   # 줄바꿈으로 chunk 구분
-    return StreamingResponse(event_generator(), media_type="application/json")
+    return StreamingResponse(stream_events(pipeline_stream(req.model_id, req.prompt)), media_type="application/json")
 
 # 5. 스트리밍 코드 생성 파이프라인 API
 @app.post("/code/pipeline/generation_stream")
 async def run_generation_pipeline_stream(req: PipelineRequest):
-    async def event_generator():
-        async for item in code_generation_pipeline_stream(req.model_id, req.prompt):
-            yield json.dumps(item) + "\n"   # 줄바꿈으로 chunk 구분
-    return StreamingResponse(event_generator(), media_type="application/json")
+    return StreamingResponse(stream_events(code_generation_pipeline_stream(req.model_id, req.prompt)), media_type="application/json")
 
 # 6. 스트리밍 코드 수정 파이프라인 API
 @app.post("/code/pipeline/fix_stream")
 async def run_fix_pipeline_stream(req: FixRequest):
-    async def event_generator():
-        async for item in code_fix_pipeline_stream(req.code, req.analysis):
-            yield json.dumps(item) + "\n"   # 줄바꿈으로 chunk 구분
-    return StreamingResponse(event_generator(), media_type="application/json")
\ No newline at end of file
+    return StreamingResponse(stream_events(code_fix_pipeline_stream(req.code, req.analysis)), media_type="application/json")
\ No newline at end of file
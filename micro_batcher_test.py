@@ -0,0 +1,67 @@
+"""
+Micro-batcher tests (modules/micro_batcher.py) with a fake detector.
+
+    python -m pytest micro_batcher_test.py
+"""
+
+import pytest
+
+from modules.micro_batcher import MicroBatcher
+
+
+class FakeDetector:
+    """predict_batch() that fails on any batch holding a 'bad' snippet."""
+    VULNERABILITY_TYPES = ['Safe', 'Vulnerable']
+
+    def __init__(self):
+        self.calls = []
+
+    def predict_batch(self, codes, language, batch_size=8):
+        self.calls.append(list(codes))
+        if any('bad' in code for code in codes):
+            raise ValueError('cannot tokenize')
+        return [f"{language}:{code}" for code in codes]
+
+
+@pytest.fixture
+def detector():
+    return FakeDetector()
+
+
+def run_together(batcher, codes, language='c'):
+    """Submit codes so they fill one batch, then wait for all of them."""
+    futures = [batcher.submit(code, language) for code in codes]
+    batcher.close(timeout=5)
+    return futures
+
+
+# 1. 요청을 하나의 배치로 묶어 실행
+def test_requests_share_one_batch(detector):
+    batcher = MicroBatcher(detector, max_batch_size=3, max_wait_ms=1000)
+    futures = run_together(batcher, ['a', 'b', 'c'])
+
+    assert [future.result() for future in futures] == ['c:a', 'c:b', 'c:c']
+    assert detector.calls == [['a', 'b', 'c']]
+    assert batcher.stats()['batches'] == 1 and batcher.stats()['failed_batches'] == 0
+
+
+# 2. 배치 실패 시 요청별로 다시 실행해 실패한 요청에만 예외 전달
+def test_failed_batch_fails_only_the_bad_request(detector):
+    batcher = MicroBatcher(detector, max_batch_size=3, max_wait_ms=1000)
+    good, bad, other = run_together(batcher, ['a', 'bad', 'c'])
+
+    assert good.result() == 'c:a' and other.result() == 'c:c'
+    with pytest.raises(ValueError):
+        bad.result()
+    assert detector.calls == [['a', 'bad', 'c'], ['a'], ['bad'], ['c']]
+    assert batcher.stats()['failed_batches'] == 1
+
+
+def test_failed_single_request_is_not_retried(detector):
+    batcher = MicroBatcher(detector, max_batch_size=1, max_wait_ms=0)
+    bad, = run_together(batcher, ['bad'])
+
+    with pytest.raises(ValueError):
+        bad.result()
+    assert detector.calls == [['bad']]
+    assert batcher.stats()['failed_batches'] == 1
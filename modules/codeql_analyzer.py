@@ -4,10 +4,32 @@ import logging
 import json
 import re
 import shutil
+import time
+import uuid
+import threading
+import asyncio
+import contextvars
+from collections import deque, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict, List, Optional, Union, Set
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union, Set
+from dataclasses import dataclass, field
+import hashlib
+import shlex
+import stat
+import tarfile
+import zipfile
 import traceback
 
+from modules.codeql_cache import CodeQLResultCache, CodeQLDatabaseStore, directory_size, rebase_cached_entry
+from modules.codeql_cli import (CodeQLRunner, CodeQLCancelled, AsyncCommandJob, current_async_job,
+                                CodeQLResourceLimitError, ResourceLimits)
+from modules.codeql_querypack import COMPILATION_CACHE_DIR, pack_dir_name
+from modules.sarif_reader import (SarifReader, SarifFinding, extract_cwe_id, read_sarif_outline,
+                                  iter_sarif_results)
+from modules.codeql_profile import CodeQLProfileStore, summarize_evaluator_log, read_json_stream, profile_by_query
+from modules.query_planner import QueryPlanner, QueryPlan, read_query_id
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -15,11 +37,329 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+
+@dataclass
+class CodeQLResult:
+    """Result of a CodeQL analysis."""
+    vul_type: str
+    report: str
+    findings: List[SarifFinding] = field(default_factory=list)
+    cached: bool = False
+    diagnostics: List[str] = field(default_factory=list)
+    profile: Optional[List[Dict]] = None
+    verified_rules: Optional[List[str]] = None
+
+
+@dataclass
+class CodeQLWorkspace:
+    """Working directories owned by a single analysis job."""
+    job_id: str
+    source_dir: str
+    db_root: str
+    backend: str = 'disk'
+    reserved_bytes: int = 0
+
+    @property
+    def db_path(self) -> str:
+        """Path of the job's CodeQL database."""
+        return os.path.join(self.db_root, 'db')
+
+    @property
+    def sarif_path(self) -> str:
+        """Path of the job's SARIF results."""
+        return os.path.join(self.db_root, 'results.sarif')
+
+
+@dataclass
+class ResourcePlan:
+    """Thread and memory budget for one CodeQL job."""
+    threads: int
+    ram_mb: int
+    jobs_in_flight: int = 1
+
+    def codeql_flags(self) -> List[str]:
+        """Return the --threads/--ram flags for CodeQL commands."""
+        return [f'--threads={self.threads}', f'--ram={self.ram_mb}']
+
+
+def _available_memory_mb() -> Optional[int]:
+    """Return the available system memory in MB, if it can be determined."""
+    try:
+        import psutil
+        return int(psutil.virtual_memory().available / (1024 * 1024))
+    except ImportError:
+        pass
+    try:
+        with open('/proc/meminfo', 'r') as file:
+            for line in file:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) // 1024
+    except OSError:
+        pass
+    return None
+
+
+def _available_cores() -> int:
+    """Return the number of cores this process may run on."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+# Memory the JVM commits besides its --ram budget (metaspace, code cache, thread stacks);
+# --ram is kept this far below job_memory_mb
+JVM_NON_HEAP_MB = 1024
+
+# Breaches that recur for the same snippet and are remembered for fast failure. CPU,
+# wall-clock and memory breaches depend on load (the --ram budget shrinks as jobs are
+# added) and are retried
+REMEMBERED_LIMITS = ('file_size',)
+
+# Database entries a query run writes to, which query shards cannot share: the evaluation
+# cache (under db-<lang>/default) and the top-level log directory
+EVALUATION_CACHE_DIR = 'cache'
+DATABASE_LOG_DIR = 'log'
+
+
+def _link_or_copy(source: str, target: str) -> None:
+    """Hardlink a file, copying it if the target is on another filesystem."""
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copy2(source, target)
+
+
+def clone_database(database_path: str, target: str) -> None:
+    """
+    Clone a finalized database for a parallel query run.
+
+    The dataset and source archive are immutable once the database is
+    finalized, so they are hardlinked (no extra disk or tmpfs space); the
+    evaluation caches, which a query run locks and writes, are copied.
+
+    Args:
+        database_path: Finalized CodeQL database
+        target: Directory to create the clone in
+    """
+    caches = []
+
+    def skip_written(directory: str, names: List[str]) -> List[str]:
+        skipped = []
+        if EVALUATION_CACHE_DIR in names and os.path.isdir(os.path.join(directory, EVALUATION_CACHE_DIR)):
+            caches.append(os.path.relpath(os.path.join(directory, EVALUATION_CACHE_DIR), database_path))
+            skipped.append(EVALUATION_CACHE_DIR)
+        if os.path.samefile(directory, database_path) and DATABASE_LOG_DIR in names:
+            skipped.append(DATABASE_LOG_DIR)
+        return skipped
+
+    shutil.copytree(database_path, target, copy_function=_link_or_copy, ignore=skip_written)
+    for cache in caches:
+        shutil.copytree(os.path.join(database_path, cache), os.path.join(target, cache))
+
+
+# Database size model for tmpfs placement: a fixed overhead plus a multiple of the source size
+DB_BASE_BYTES = 48 * 1024 * 1024
+DB_BYTES_PER_SOURCE_BYTE = 400
+
+WORKSPACE_STAGES = ('source', 'database', 'queries', 'sarif', 'cleanup')
+
+# C/C++ files compiled, and directories added to the include path, for project archives
+PROJECT_SOURCE_EXTENSIONS = ('.c', '.cc', '.cpp', '.cxx')
+PROJECT_HEADER_EXTENSIONS = ('.h', '.hh', '.hpp', '.hxx')
+
+
+class UnsafeArchiveError(ValueError):
+    """Raised when an uploaded project archive is malformed, unsafe or too large."""
+
+
+class CodeQLQueueFull(RuntimeError):
+    """Raised when the CodeQL job queue is full."""
+    def __init__(self, retry_after: float):
+        self.retry_after = retry_after
+        super().__init__(f"CodeQL job queue is full, retry after {retry_after:.0f} seconds")
+
+
+class LatencyWindow:
+    """Summary statistics over the most recent latency samples."""
+    def __init__(self, size: int = 1000):
+        self.samples = deque(maxlen=size)
+        self.count = 0
+
+    def add(self, seconds: float) -> None:
+        self.samples.append(seconds)
+        self.count += 1
+
+    def mean(self) -> Optional[float]:
+        return sum(self.samples) / len(self.samples) if self.samples else None
+
+    def summary(self) -> Dict[str, float]:
+        """Return count, mean, p50, p95 and max over the window."""
+        if not self.samples:
+            return {'count': self.count}
+        ordered = sorted(self.samples)
+        return {
+            'count': self.count,
+            'mean': sum(ordered) / len(ordered),
+            'p50': ordered[len(ordered) // 2],
+            'p95': ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+            'max': ordered[-1],
+        }
+
+
+# Set while a background rescan runs, so its jobs take the scheduler's low-priority queue
+background_job: contextvars.ContextVar[bool] = contextvars.ContextVar('background_job', default=False)
+
+
+class CodeQLJobScheduler:
+    """
+    Admits CodeQL jobs with a concurrency limit and a bounded FIFO wait queue.
+
+    Jobs beyond max_concurrent wait in arrival order; once max_queue jobs are
+    waiting, new jobs are rejected with CodeQLQueueFull carrying a retry-after
+    estimate, instead of oversubscribing CPU and memory.
+
+    Low-priority jobs (background rescans) wait in a separate queue and are
+    only given a slot while no regular job is waiting.
+    """
+    def __init__(self, max_concurrent: int = 2, max_queue: int = 16):
+        """
+        Initialize the scheduler.
+
+        Args:
+            max_concurrent: Maximum number of analyses running at once
+            max_queue: Maximum number of analyses waiting for a slot
+        """
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.running = 0
+        self.rejected = 0
+        self._waiters = deque()
+        self._background_waiters = deque()
+        self._lock = threading.Lock()
+        self.wait_times = LatencyWindow()
+        self.run_times = LatencyWindow()
+
+    def retry_after(self) -> float:
+        """Estimate how long a rejected job should wait before retrying."""
+        mean_run = self.run_times.mean() or 60.0
+        rounds = (len(self._waiters) + self.max_concurrent) // self.max_concurrent
+        return mean_run * rounds
+
+    def acquire(self, cancelled: Callable[[], bool] = None, low_priority: bool = False) -> float:
+        """
+        Wait for a job slot.
+
+        Args:
+            cancelled: Polled while waiting; the job leaves the queue once it returns True
+            low_priority: Wait behind every regular job, in the background queue
+
+        Returns:
+            Seconds spent waiting
+
+        Raises:
+            CodeQLQueueFull: If the wait queue is full
+            CodeQLCancelled: If the job was cancelled while waiting
+        """
+        start = time.monotonic()
+        with self._lock:
+            waiters = self._background_waiters if low_priority else self._waiters
+            if self.running < self.max_concurrent and not self._waiters and not (
+                    low_priority and self._background_waiters):
+                self.running += 1
+                self.wait_times.add(0.0)
+                return 0.0
+            if len(waiters) >= self.max_queue:
+                self.rejected += 1
+                raise CodeQLQueueFull(self.retry_after())
+            event = threading.Event()
+            waiters.append(event)
+
+        # release() hands the slot over directly, so running is already counted
+        if cancelled is None:
+            event.wait()
+        else:
+            while not event.wait(0.5):
+                if cancelled():
+                    with self._lock:
+                        if event in waiters:
+                            waiters.remove(event)
+                            raise CodeQLCancelled("CodeQL job was cancelled while queued")
+                    # The slot was handed over at the same moment, pass it on
+                    self.release()
+                    raise CodeQLCancelled("CodeQL job was cancelled while queued")
+        waited = time.monotonic() - start
+        with self._lock:
+            self.wait_times.add(waited)
+        return waited
+
+    def release(self, run_seconds: float = None) -> None:
+        """
+        Free a job slot, handing it to the oldest waiting job (regular jobs first).
+
+        Args:
+            run_seconds: How long the finished job ran (None if it never ran, so that
+                the run time window behind retry_after() is not skewed)
+        """
+        with self._lock:
+            if run_seconds is not None:
+                self.run_times.add(run_seconds)
+            if self._waiters:
+                self._waiters.popleft().set()
+            elif self._background_waiters:
+                self._background_waiters.popleft().set()
+            else:
+                self.running -= 1
+
+    def run(self, func, *args, cancelled: Callable[[], bool] = None, low_priority: bool = False, **kwargs):
+        """
+        Run a job once a slot is free.
+
+        Raises:
+            CodeQLQueueFull: If the wait queue is full
+            CodeQLCancelled: If the job was cancelled while waiting
+        """
+        self.acquire(cancelled, low_priority)
+        start = time.monotonic()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            self.release(time.monotonic() - start)
+
+    def stats(self) -> Dict:
+        """Return queue length, running jobs, rejections and wait/run time summaries."""
+        with self._lock:
+            return {
+                'max_concurrent': self.max_concurrent,
+                'max_queue': self.max_queue,
+                'running': self.running,
+                'queue_length': len(self._waiters),
+                'background_queue_length': len(self._background_waiters),
+                'rejected': self.rejected,
+                'wait_seconds': self.wait_times.summary(),
+                'run_seconds': self.run_times.summary(),
+            }
+
+
 class CodeQLAnalyzer:
     """
     A class to analyze code for security vulnerabilities using CodeQL.
     """
-    def __init__(self, code_path: str = None, database_path: str = None, codeql_repo_path: str = None):
+    def __init__(self, code_path: str = None, database_path: str = None, codeql_repo_path: str = None,
+                 cache_path: str = None, cache_max_entries: int = 1000, cache_ttl: int = 7 * 24 * 3600,
+                 cli_server: bool = False, cli_server_command: List[str] = None,
+                 query_pack_path: str = None, build_mode: str = 'make', include_paths: List[str] = None,
+                 cpp_std: str = 'c++17', c_std: str = 'c11', preflight: List[str] = None,
+                 preflight_action: str = 'reject', max_concurrent_jobs: int = None,
+                 max_queued_jobs: int = 16, resource_planning: bool = True, ram_fraction: float = 0.75,
+                 min_ram_mb: int = 1024, query_shards: int = 1, profile_path: str = None,
+                 db_retention_bytes: int = None, workspace_backend: str = 'disk',
+                 tmpfs_path: str = '/dev/shm/secllm_codeql', tmpfs_reserve_mb: int = 512,
+                 tmpfs_baseline_every: int = 20, allow_project_build_commands: bool = False,
+                 max_project_bytes: int = 512 * 1024 ** 2, max_project_files: int = 20000,
+                 project_timeout: float = 1800, query_planning: bool = False,
+                 job_cpu_seconds: int = None, job_memory_mb: int = None, job_file_size_mb: int = None,
+                 job_disk_quota_mb: int = None, job_wall_clock: float = None):
         """
         Initialize the CodeQL analyzer.
         
@@ -27,7 +367,69 @@ class CodeQLAnalyzer:
             code_path: Path to store code snippets
             database_path: Path to store CodeQL databases
             codeql_repo_path: Path to the CodeQL repository
+            cache_path: Path to store cached analysis results (disabled if None)
+            cache_max_entries: Maximum number of cached results
+            cache_ttl: Time-to-live of a cached result in seconds
+            cli_server: Run CodeQL commands on persistent 'codeql execute cli-server' processes.
+                Per-job limits cannot be applied to a shared server, so this excludes the
+                job_* limits; commands of the async (cancellable) entry points always run as
+                their own subprocesses so that they can be killed
+            cli_server_command: Command line that starts a CLI server (optional)
+            query_pack_path: Output root of modules.codeql_querypack; when set, queries are
+                evaluated from the precompiled packs instead of the CodeQL repository
+            build_mode: C/C++ build strategy, 'make' (generated Makefile that links each file)
+                or 'compile' (compile-only compiler invocation per file, no Makefile)
+            include_paths: Extra include directories for the 'compile' build mode
+            cpp_std: C++ standard for the 'compile' build mode
+            c_std: C standard for the 'compile' build mode
+            preflight: C/C++ syntax checks to run before CodeQL, in order: 'tree-sitter'
+                (parse only, may flag macro-heavy code) and/or 'compiler' (-fsyntax-only)
+            preflight_action: 'reject' to fail broken input immediately, or 'flag' to attach
+                the diagnostics and analyze anyway
+            max_concurrent_jobs: Maximum number of CodeQL analyses running at once (unbounded if None)
+            max_queued_jobs: Maximum number of analyses waiting for a slot before rejecting
+            resource_planning: Pass per-job --threads/--ram budgets to CodeQL commands
+            ram_fraction: Fraction of the available memory shared among jobs in flight
+            min_ram_mb: Lower bound of a job's memory budget
+            query_shards: Split the query suite into up to this many shards evaluated in
+                parallel (limited by the job's planned threads, so busy boxes do not shard)
+            profile_path: Directory to record per-query evaluator profiles in (profiling
+                is disabled if None)
+            db_retention_bytes: Disk quota of the finalized databases kept under
+                database_path/retained for follow-up runs (retention is disabled if None)
+            workspace_backend: Where job workspaces live, 'disk' (code_path/database_path)
+                or 'tmpfs' (tmpfs_path, falling back to disk per job when RAM runs short)
+            tmpfs_path: RAM-backed directory for the 'tmpfs' backend
+            tmpfs_reserve_mb: Free tmpfs space never handed to workspaces
+            tmpfs_baseline_every: With the 'tmpfs' backend, place every Nth job on disk so
+                the per-stage time saved can still be measured (0 disables)
+            allow_project_build_commands: Let analyze_project run a caller-supplied build
+                command (only enable for trusted uploads, the command runs on this host)
+            max_project_bytes: Maximum uncompressed size of a project archive
+            max_project_files: Maximum number of files in a project archive
+            project_timeout: Seconds allowed for each of a project's build and query stages
+            query_planning: Skip the C/C++ queries that cannot report on a snippet, judged from
+                a tree-sitter scan of its calls, includes and constructs (see modules/query_planner.py)
+            job_cpu_seconds: CPU time limit of each process of a database create or query run
+                (counted per process over all its threads, so allow for the JVM's --threads)
+            job_memory_mb: Memory limit of each process (RLIMIT_DATA, which leaves the JVM's
+                reserved address space alone); the planned --ram budget is capped
+                JVM_NON_HEAP_MB below it
+            job_file_size_mb: Largest file a build, extraction or query run may write
+            job_disk_quota_mb: Disk quota of a job's workspace (sources, database, results)
+            job_wall_clock: Wall-clock cap of each database create or query run in seconds
         """
+        if build_mode not in ('make', 'compile'):
+            raise ValueError(f"Unsupported build mode: {build_mode}")
+        for check in preflight or []:
+            if check not in ('tree-sitter', 'compiler'):
+                raise ValueError(f"Unsupported preflight check: {check}")
+        if preflight_action not in ('reject', 'flag'):
+            raise ValueError(f"Unsupported preflight action: {preflight_action}")
+        if workspace_backend not in ('disk', 'tmpfs'):
+            raise ValueError(f"Unsupported workspace backend: {workspace_backend}")
+        if cli_server and any([job_cpu_seconds, job_memory_mb, job_file_size_mb, job_disk_quota_mb, job_wall_clock]):
+            raise ValueError("CLI server mode cannot enforce per-job resource limits, disable one or the other")
         # Set environment variable to avoid tokenizers parallelism warning
         os.environ["TOKENIZERS_PARALLELISM"] = "false"
         
@@ -36,10 +438,116 @@ class CodeQLAnalyzer:
         
         # Use the path from your Jupyter notebook
         self.codeql_repo_path = codeql_repo_path
+        self.query_pack_path = query_pack_path
+
+        # C/C++ build configuration
+        self.build_mode = build_mode
+        self.include_paths = include_paths or []
+        self.cpp_std = cpp_std
+        self.c_std = c_std
+
+        # Syntax pre-flight configuration
+        self.preflight = list(preflight or [])
+        self.preflight_action = preflight_action
+
+        # Bounded job queue for CodeQL analyses
+        self.scheduler = CodeQLJobScheduler(max_concurrent_jobs, max_queued_jobs) if max_concurrent_jobs else None
+
+        # Per-job --threads/--ram planning
+        self.resource_planning = resource_planning
+        self.ram_fraction = ram_fraction
+        self.min_ram_mb = min_ram_mb
+        self._active_jobs = 0
+
+        # Parallel query evaluation
+        self.query_shards = max(1, query_shards)
+
+        # Rule ID -> query file index per query directory, and the background full rescans
+        self._query_ids: Dict[str, Tuple[Tuple, Dict[str, str]]] = {}
+        self._rescan_executor = None
+        self._async_executor = None
+        self._pending_rescans = 0
+        self.max_pending_rescans = 16
+
+        # Construct-aware query pruning
+        self.query_planner = QueryPlanner() if query_planning else None
+
+        # Per-job resource limits (commands with limits always run as subprocesses)
+        self.job_cpu_seconds = job_cpu_seconds
+        self.job_memory_mb = job_memory_mb
+        self.job_file_size_mb = job_file_size_mb
+        self.job_disk_quota_mb = job_disk_quota_mb
+        self.job_wall_clock = job_wall_clock
+        # Snippets that ran into a limit fail fast when submitted again
+        self._limit_breaches: 'OrderedDict[str, Tuple[str, str]]' = OrderedDict()
+        self.max_remembered_breaches = 1000
+
+        # Opt-in per-query evaluator profiling
+        self.profiler = CodeQLProfileStore(profile_path) if profile_path else None
+
+        # Workspace placement (disk or RAM-backed tmpfs)
+        self.workspace_backend = workspace_backend
+        self.tmpfs_path = tmpfs_path
+        self.tmpfs_reserve_bytes = tmpfs_reserve_mb * 1024 * 1024
+        self.tmpfs_baseline_every = tmpfs_baseline_every
+        self._tmpfs_reserved = 0
+        self._workspace_count = 0
+        self._db_base_bytes = DB_BASE_BYTES
+        if self.workspace_backend == 'tmpfs':
+            os.makedirs(self.tmpfs_path, exist_ok=True)
+
+        # Whole-project analysis limits
+        self.allow_project_build_commands = allow_project_build_commands
+        self.max_project_bytes = max_project_bytes
+        self.max_project_files = max_project_files
+        self.project_timeout = project_timeout
+
+        # Counters and timings reported by get_metrics()
+        self._metrics_lock = threading.Lock()
+        self.stage_seconds: Dict[str, Dict[str, float]] = {'disk': {}, 'tmpfs': {}}
+        self.metrics: Dict[str, float] = {
+            'analyses': 0,
+            'cache_hits': 0,
+            'db_create_seconds_avg': 0.0,
+            'query_seconds_avg': 0.0,
+            'sharded_runs': 0,
+            'db_reuses': 0,
+            'db_reuse_saved_seconds': 0.0,
+            'async_cancelled': 0,
+            'tmpfs_workspaces': 0,
+            'tmpfs_fallbacks': 0,
+            'project_analyses': 0,
+            'verifications': 0,
+            'verify_queries_skipped': 0,
+            'full_rescans': 0,
+            'full_rescans_dropped': 0,
+            'planned_analyses': 0,
+            'plan_fallbacks': 0,
+            'queries_pruned': 0,
+            'query_plan_seconds': 0.0,
+            'limit_breaches': 0,
+            'limit_fast_failures': 0,
+            'preflight_checked': 0,
+            'preflight_rejected': 0,
+            'preflight_flagged': 0,
+            'preflight_seconds': 0.0,
+            'preflight_saved_seconds': 0.0,
+        }
         
         # Create directories if they don't exist
         os.makedirs(self.code_path, exist_ok=True)
         os.makedirs(self.database_path, exist_ok=True)
+
+        # Content-addressed result cache
+        self.result_cache = CodeQLResultCache(cache_path, cache_max_entries, cache_ttl) if cache_path else None
+
+        # Finalized databases kept for follow-up query runs over the same source
+        self.db_store = None
+        if db_retention_bytes:
+            self.db_store = CodeQLDatabaseStore(os.path.join(self.database_path, 'retained'), db_retention_bytes)
+
+        # Runs CodeQL commands as subprocesses or on persistent CLI servers
+        self.codeql = CodeQLRunner(use_server=cli_server, server_command=cli_server_command)
         
         logger.info(f"CodeQL analyzer initialized with code_path={self.code_path}, database_path={self.database_path}, codeql_repo_path={self.codeql_repo_path}")
         
@@ -72,7 +580,133 @@ class CodeQLAnalyzer:
         }
         return lang_map.get(language.lower(), language.lower())
 
-    def save_code_snippet(self, code_snippet: str, language: str, filename: str = 'code_to_analyze') -> str:
+    def _get_query_path(self, language: str) -> str:
+        """Get the top25 query directory for a language."""
+        codeql_lang = self._get_codeql_language(language)
+        if self.query_pack_path:
+            return os.path.join(self.query_pack_path, pack_dir_name(codeql_lang))
+        return os.path.join(self.codeql_repo_path, codeql_lang, 'ql/src/top25')
+
+    def estimate_database_bytes(self, source_bytes: int) -> int:
+        """Estimate the disk footprint of a job's database from its source size."""
+        return self._db_base_bytes + DB_BYTES_PER_SOURCE_BYTE * source_bytes
+
+    def _choose_backend(self, expected_bytes: int) -> str:
+        """
+        Pick the workspace backend of a new job and reserve its tmpfs space.
+
+        Args:
+            expected_bytes: Expected size of the job's workspace
+
+        Returns:
+            'tmpfs' or 'disk'
+        """
+        if self.workspace_backend != 'tmpfs':
+            return 'disk'
+        with self._metrics_lock:
+            self._workspace_count += 1
+            if self.tmpfs_baseline_every and self._workspace_count % self.tmpfs_baseline_every == 0:
+                return 'disk'
+            try:
+                free = shutil.disk_usage(self.tmpfs_path).free
+            except OSError as e:
+                logger.warning(f"tmpfs path {self.tmpfs_path} unavailable: {e}")
+                free = 0
+            if free - self._tmpfs_reserved - self.tmpfs_reserve_bytes < expected_bytes:
+                self.metrics['tmpfs_fallbacks'] += 1
+                logger.info(f"Not enough tmpfs space for {expected_bytes} bytes, using disk")
+                return 'disk'
+            self._tmpfs_reserved += expected_bytes
+            self.metrics['tmpfs_workspaces'] += 1
+            return 'tmpfs'
+
+    def create_workspace(self, language: str, source_bytes: int = 0) -> CodeQLWorkspace:
+        """
+        Create an isolated workspace for one analysis job.
+
+        Each job gets its own source directory (and therefore its own Makefile)
+        and its own database directory, so concurrent analyses never touch
+        each other's files. With the 'tmpfs' backend both live in RAM unless
+        the expected database would not fit.
+
+        Args:
+            language: Programming language ('python', 'c', 'cpp', etc.)
+            source_bytes: Size of the sources the job will analyze
+
+        Returns:
+            The created workspace
+        """
+        job_id = uuid.uuid4().hex[:12]
+        expected_bytes = self.estimate_database_bytes(source_bytes)
+        backend = self._choose_backend(expected_bytes)
+        if backend == 'tmpfs':
+            code_root = os.path.join(self.tmpfs_path, 'code')
+            database_root = os.path.join(self.tmpfs_path, 'db')
+        else:
+            code_root, database_root = self.code_path, self.database_path
+        workspace = CodeQLWorkspace(
+            job_id=job_id,
+            source_dir=os.path.join(code_root, language.lower(), f"job_{job_id}"),
+            db_root=os.path.join(database_root, f"job_{job_id}"),
+            backend=backend,
+            reserved_bytes=expected_bytes if backend == 'tmpfs' else 0
+        )
+        try:
+            os.makedirs(workspace.source_dir)
+            os.makedirs(workspace.db_root)
+        except Exception:
+            self.cleanup_workspace(workspace)
+            raise
+        logger.info(f"Workspace created for job {job_id} on {backend}: source_dir={workspace.source_dir}, db_root={workspace.db_root}")
+        return workspace
+
+    def cleanup_workspace(self, workspace: CodeQLWorkspace) -> None:
+        """
+        Remove everything owned by an analysis job.
+
+        Args:
+            workspace: The workspace to remove
+        """
+        start = time.monotonic()
+        self.cleanup_files([workspace.source_dir, workspace.db_root])
+        self._record_stage(workspace, 'cleanup', time.monotonic() - start)
+        if workspace.reserved_bytes:
+            with self._metrics_lock:
+                self._tmpfs_reserved -= workspace.reserved_bytes
+            workspace.reserved_bytes = 0
+
+    def _record_stage(self, workspace: CodeQLWorkspace, stage: str, seconds: float, weight: float = 0.2) -> None:
+        """Update the moving average time of a workspace stage on the job's backend."""
+        with self._metrics_lock:
+            stages = self.stage_seconds[workspace.backend]
+            previous = stages.get(stage)
+            stages[stage] = seconds if previous is None else (1 - weight) * previous + weight * seconds
+
+    def _learn_database_size(self, db_path: str, source_bytes: int) -> None:
+        """Refine the fixed overhead of the database size model from a finished job."""
+        overhead = directory_size(db_path) - DB_BYTES_PER_SOURCE_BYTE * source_bytes
+        with self._metrics_lock:
+            self._db_base_bytes = max(1024 * 1024, int(0.8 * self._db_base_bytes + 0.2 * overhead))
+
+    def workspace_io_savings(self) -> Dict[str, Dict[str, float]]:
+        """
+        Compare the per-stage time of tmpfs and disk workspaces.
+
+        Returns:
+            Per stage, the moving average seconds on each backend and the
+            seconds saved per job by tmpfs (stages without samples on both
+            backends are omitted)
+        """
+        with self._metrics_lock:
+            disk = dict(self.stage_seconds['disk'])
+            tmpfs = dict(self.stage_seconds['tmpfs'])
+        return {
+            stage: {'disk': disk[stage], 'tmpfs': tmpfs[stage], 'saved': disk[stage] - tmpfs[stage]}
+            for stage in WORKSPACE_STAGES if stage in disk and stage in tmpfs
+        }
+
+    def save_code_snippet(self, code_snippet: str, language: str, filename: str = 'code_to_analyze',
+                          directory: str = None) -> str:
         """
         Save a code snippet to a file for analysis.
         
@@ -80,6 +714,7 @@ class CodeQLAnalyzer:
             code_snippet: The code to analyze
             language: Programming language ('python', 'c', 'cpp', etc.)
             filename: Base name for the file (without extension)
+            directory: Directory to save into (defaults to the shared language directory)
             
         Returns:
             Path to the saved file
@@ -88,20 +723,21 @@ class CodeQLAnalyzer:
         extension = self._get_file_extension(language)
         
         # Create language-specific directory
-        lang_dir = os.path.join(self.code_path, language)
+        lang_dir = directory or os.path.join(self.code_path, language)
         os.makedirs(lang_dir, exist_ok=True)
         
         # Full path to the file
         file_path = os.path.join(lang_dir, f"{filename}{extension}")
         
-        # Remove existing files with the same base name
-        for existing_file in os.listdir(lang_dir):
-            if existing_file.startswith(filename.split('_')[0]) and existing_file.endswith(extension):
-                try:
-                    os.remove(os.path.join(lang_dir, existing_file))
-                    logger.info(f"Removed existing file: {os.path.join(lang_dir, existing_file)}")
-                except Exception as e:
-                    logger.warning(f"Failed to remove existing file {existing_file}: {e}")
+        # Remove existing files with the same base name (only in the shared directory)
+        if directory is None:
+            for existing_file in os.listdir(lang_dir):
+                if existing_file.startswith(filename.split('_')[0]) and existing_file.endswith(extension):
+                    try:
+                        os.remove(os.path.join(lang_dir, existing_file))
+                        logger.info(f"Removed existing file: {os.path.join(lang_dir, existing_file)}")
+                    except Exception as e:
+                        logger.warning(f"Failed to remove existing file {existing_file}: {e}")
         
         # Save the code to the file
         with open(file_path, 'w') as file:
@@ -111,12 +747,14 @@ class CodeQLAnalyzer:
         return file_path
 
     
-    def create_makefile(self, directory: str) -> None:
+    def create_makefile(self, directory: str, failure_log: str = None) -> None:
         """
         Create a Makefile for C/C++ projects.
         
         Args:
             directory: Directory containing C/C++ files
+            failure_log: If set, a failing target is appended to this file instead of
+                aborting the build, so the remaining targets are still extracted
         """
         # Collect all C/C++ files in the directory
         c_files = [f for f in os.listdir(directory) if f.endswith('.c')]
@@ -130,11 +768,14 @@ class CodeQLAnalyzer:
         
         # Add build rules for each target
         for target in targets:
-            src_file = next((f for f in source_files if f.startswith(target)), None)
+            src_file = next((f for f in source_files if os.path.splitext(f)[0] == target), None)
             if src_file:
                 compiler = 'gcc' if src_file.endswith('.c') else 'g++'
                 makefile_content.append(f"{target}: {src_file}")
-                makefile_content.append(f"\t{compiler} {src_file} -o {target}")
+                if failure_log:
+                    makefile_content.append(f"\t{compiler} {src_file} -o {target} || echo {target} >> {failure_log}")
+                else:
+                    makefile_content.append(f"\t{compiler} {src_file} -o {target}")
                 makefile_content.append("")
         
         # Add clean rule
@@ -149,7 +790,56 @@ class CodeQLAnalyzer:
         
         logger.info(f"Makefile created in {directory}")
     
-    def create_codeql_database(self, language: str, source_dir: str, db_name: str = None) -> Optional[str]:
+    def get_compile_commands(self, directory: str, failure_log: str = None, recursive: bool = False) -> List[str]:
+        """
+        Build compile-only compiler invocations for the C/C++ files in a directory.
+
+        CodeQL only needs to observe the compiler invocation, so each file is
+        compiled with -c and nothing is linked; fragments without main() still
+        extract.
+
+        Args:
+            directory: Directory containing C/C++ files
+            failure_log: If set, a failing file is appended to this file instead of failing the build
+            recursive: Walk the whole tree (project archives); every directory holding
+                headers is added to the include path
+
+        Returns:
+            One command line per source file, relative to the directory
+        """
+        if recursive:
+            source_files = []
+            header_dirs = []
+            for root, dirs, files in os.walk(directory):
+                dirs.sort()
+                relative_root = os.path.relpath(root, directory)
+                if any(f.endswith(PROJECT_HEADER_EXTENSIONS) for f in files):
+                    header_dirs.append(relative_root)
+                source_files.extend(
+                    os.path.normpath(os.path.join(relative_root, f)) for f in sorted(files)
+                    if f.endswith(PROJECT_SOURCE_EXTENSIONS)
+                )
+        else:
+            header_dirs = []
+            source_files = [f for f in sorted(os.listdir(directory)) if f.endswith(('.c', '.cpp'))]
+
+        include_flags = ' '.join(f"-I{shlex.quote(path)}" for path in list(self.include_paths) + header_dirs)
+        commands = []
+        for src_file in source_files:
+            if src_file.endswith('.c'):
+                compiler, std = 'gcc', self.c_std
+            else:
+                compiler, std = 'g++', self.cpp_std
+            command = f"{compiler} -c -std={std} {include_flags} {shlex.quote(src_file)} -o /dev/null".replace('  ', ' ')
+            if failure_log:
+                command += f" || echo {shlex.quote(os.path.splitext(src_file)[0])} >> {failure_log}"
+            commands.append(command)
+        return commands
+
+    def create_codeql_database(self, language: str, source_dir: str, db_name: str = None,
+                               db_path: str = None, build_failure_log: str = None,
+                               plan: ResourcePlan = None, build_command: str = None,
+                               timeout: float = 300, limits: ResourceLimits = None) -> Optional[str]:
         """
         Create a CodeQL database for the specified language and source directory.
         
@@ -157,20 +847,56 @@ class CodeQLAnalyzer:
             language: Programming language ('python', 'c', 'cpp', etc.)
             source_dir: Directory containing the source code
             db_name: Name for the database (optional)
+            db_path: Full path for the database, overriding db_name (optional)
+            build_failure_log: For C/C++, record failing targets here instead of failing the build (optional)
+            plan: Thread and memory budget (planned now if omitted)
+            build_command: For C/C++, run this build instead of the configured build mode (optional)
+            timeout: Seconds to wait for the extraction
+            limits: Resource limits of the build and extraction (the job limits on
+                source_dir and db_path if omitted)
             
         Returns:
             Path to the created database or None if creation failed
+
+        Raises:
+            CodeQLResourceLimitError: If the build or extraction ran into a resource limit
         """
         # Generate database name if not provided
         if db_name is None:
             db_name = f"db-{language}-{Path(source_dir).name}"
         
         # Full path to the database
-        db_path = os.path.join(self.database_path, db_name)
+        if db_path is None:
+            db_path = os.path.join(self.database_path, db_name)
         
+        # Explicit build (project archives)
+        if language.lower() in ['c', 'cpp'] and build_command:
+            command = [
+                'codeql', 'database', 'create', db_path,
+                '--language=cpp',
+                f'--command={build_command}',
+                f'--source-root={source_dir}',
+                '--overwrite'
+            ]
+        # Compile-only invocations for C/C++ projects
+        elif language.lower() in ['c', 'cpp'] and self.build_mode == 'compile':
+            compile_commands = self.get_compile_commands(source_dir, failure_log=build_failure_log)
+            if build_failure_log:
+                # Tolerating per-file failures needs a shell, so run the invocations from a script
+                script_path = os.path.join(source_dir, 'build.sh')
+                with open(script_path, 'w') as file:
+                    file.write('\n'.join(compile_commands) + '\n')
+                compile_commands = [f"sh {script_path}"]
+            command = [
+                'codeql', 'database', 'create', db_path,
+                '--language=cpp',
+            ] + [f'--command={compile_command}' for compile_command in compile_commands] + [
+                f'--source-root={source_dir}',
+                '--overwrite'
+            ]
         # Create Makefile for C/C++ projects
-        if language.lower() in ['c', 'cpp']:
-            self.create_makefile(source_dir)
+        elif language.lower() in ['c', 'cpp']:
+            self.create_makefile(source_dir, failure_log=build_failure_log)
             command = [
                 'codeql', 'database', 'create', db_path,
                 '--language=cpp',
@@ -185,15 +911,18 @@ class CodeQLAnalyzer:
                 f'--source-root={source_dir}',
                 '--overwrite'
             ]
+
+        plan = plan or self.plan_resources()
+        if plan:
+            command += plan.codeql_flags()
+        limits = limits or self.job_limits([source_dir, db_path])
         
         logger.info(f"Creating CodeQL database with command: {' '.join(command)}")
         
         try:
             # Check if codeql is available
             try:
-                version_cmd = ['codeql', '--version']
-                version_result = subprocess.run(version_cmd, check=True, capture_output=True, timeout=30)
-                logger.info(f"CodeQL version: {version_result.stdout.decode().strip()}")
+                logger.info(f"CodeQL version: {self.codeql.version(timeout=30)}")
             except subprocess.TimeoutExpired:
                 logger.error("Timeout while checking CodeQL version")
                 return None
@@ -217,21 +946,31 @@ class CodeQLAnalyzer:
             # Create the database with a timeout
             logger.debug(f"Running database create command: {' '.join(command)}")
             try:
-                # Use a longer timeout for database creation (5 minutes)
-                result = subprocess.run(command, check=True, capture_output=True, text=True, timeout=300)
-                logger.info(f"Database created successfully at {db_path}")
+                # Use a longer timeout for database creation (5 minutes by default)
+                result = self.codeql.run(command, timeout=timeout, limits=limits)
                 
                 # Log command output for debugging
                 if result.stdout:
                     logger.debug(f"Command stdout: {result.stdout}")
                 if result.stderr:
                     logger.debug(f"Command stderr: {result.stderr}")
-                
+
+                # The CLI server does not report exit codes, so check for the finalized database
+                if not os.path.exists(os.path.join(db_path, 'codeql-database.yml')):
+                    logger.error(f"Database was not created at {db_path}")
+                    if result.stderr:
+                        logger.error(f"Stderr: {result.stderr}")
+                    return None
+
+                logger.info(f"Database created successfully at {db_path}")
                 return db_path
             except subprocess.TimeoutExpired:
                 logger.error("Timeout expired while creating CodeQL database")
                 return None
                 
+        except CodeQLResourceLimitError as e:
+            logger.error(f"Database creation stopped: {e}")
+            raise
         except subprocess.CalledProcessError as e:
             logger.error(f"Failed to create database: {e}")
             logger.error(f"Command: {e.cmd}")
@@ -246,7 +985,9 @@ class CodeQLAnalyzer:
             logger.error(f"Error traceback: {traceback.format_exc()}")
             return None
     
-    def run_queries(self, database_path: str, language: str, output_file: str) -> Optional[str]:
+    def run_queries(self, database_path: str, language: str, output_file: str,
+                    plan: ResourcePlan = None, queries: List[str] = None, timeout: float = 300,
+                    shard: bool = True, limits: ResourceLimits = None) -> Optional[str]:
         """
         Run CodeQL queries on a database.
         
@@ -254,9 +995,18 @@ class CodeQLAnalyzer:
             database_path: Path to the CodeQL database
             language: Programming language ('python', 'c', 'cpp', etc.)
             output_file: Path to save the results
+            plan: Thread and memory budget (planned now if omitted)
+            queries: Query files to run instead of the whole top25 suite (optional)
+            timeout: Seconds to wait for the evaluation
+            shard: Split the queries into parallel shards when query_shards allows it
+            limits: Resource limits of the evaluation (the job limits on database_path
+                and the output directory if omitted)
             
         Returns:
             Path to the results file, or None if the queries failed
+
+        Raises:
+            CodeQLResourceLimitError: If the evaluation ran into a resource limit
         """
         # Map language to CodeQL language
         codeql_lang = self._get_codeql_language(language)
@@ -264,235 +1014,1306 @@ class CodeQLAnalyzer:
         # Ensure output file has .sarif extension
         if not output_file.endswith('.sarif'):
             output_file += '.sarif'
+
+        plan = plan or self.plan_resources()
+        if shard and self.query_shards > 1:
+            shards = min(self.query_shards, plan.threads if plan else self.query_shards)
+            if queries is not None:
+                shards = min(shards, len(queries))
+            if shards > 1:
+                return self.run_query_shards(database_path, language, output_file, shards, plan, timeout, queries)
         
         # Use the same query path approach as in your Jupyter notebook
-        query_path = os.path.join(self.codeql_repo_path, codeql_lang, 'ql/src/top25')
+        query_path = self._get_query_path(codeql_lang)
         search_path = self.codeql_repo_path
         
         # Command to run queries
         command = [
             'codeql', 'database', 'analyze', database_path,
-            query_path,
+        ] + (queries or [query_path]) + [
             '--format=sarif-latest',
             f'--search-path={search_path}',
             f'--output={output_file}'
         ]
+
+        # Reuse the compilation cache of the precompiled query packs
+        if self.query_pack_path:
+            command.append(f'--compilation-cache={os.path.join(self.query_pack_path, COMPILATION_CACHE_DIR)}')
+
+        if plan:
+            command += plan.codeql_flags()
+
+        # Per-query evaluator log for profiling
+        evaluator_log = None
+        if self.profiler:
+            evaluator_log = f"{output_file[:-len('.sarif')]}.evaluator.jsonl"
+            command += [f'--evaluator-log={evaluator_log}', '--tuple-counting']
         
         logger.info(f"Running CodeQL queries with command: {' '.join(command)}")
         
         try:
             # Run the command
-            result = subprocess.run(command, check=True, capture_output=True, timeout=300)
+            result = self.codeql.run(command, timeout=timeout,
+                                     limits=limits or self.job_limits([database_path, os.path.dirname(output_file)]))
             logger.info(f"CodeQL queries completed successfully")
             
             # Check if the output file exists and has content
             if os.path.exists(output_file) and os.path.getsize(output_file) > 0:
                 logger.info(f"Results saved to: {output_file}")
+                if evaluator_log:
+                    self._summarize_profile(evaluator_log, self._profile_file(output_file))
                 return output_file
             else:
                 logger.error(f"Output file {output_file} does not exist or is empty")
                 return None
+        except CodeQLResourceLimitError as e:
+            logger.error(f"Query evaluation stopped: {e}")
+            raise
         except subprocess.CalledProcessError as e:
             logger.error(f"Error running CodeQL queries: {e}")
             logger.error(f"Command: {e.cmd}")
             logger.error(f"Return code: {e.returncode}")
             if e.stdout:
-                logger.error(f"Stdout: {e.stdout.decode()}")
+                logger.error(f"Stdout: {e.stdout}")
             if e.stderr:
-                logger.error(f"Stderr: {e.stderr.decode()}")
+                logger.error(f"Stderr: {e.stderr}")
             return None
         except subprocess.TimeoutExpired:
-            logger.error(f"Timeout running CodeQL queries after 300 seconds")
+            logger.error(f"Timeout running CodeQL queries after {timeout} seconds")
             return None
         except Exception as e:
             logger.error(f"Unexpected error running CodeQL queries: {e}")
             return None
     
-    def extract_cwe_id(self, tags: List[str]) -> str:
-        """Extract CWE-ID from tags."""
-        for tag in tags:
-            if tag.startswith('external/cwe/cwe-'):
-                return tag.split('-')[-1]
-        return 'No CWE-ID available'
-    
-    def process_sarif_results(self, sarif_file: str) -> List[Dict]:
+    def _profile_file(self, output_file: str) -> str:
+        """Path of the per-query profile written next to a SARIF file."""
+        return f"{output_file[:-len('.sarif')]}.profile.json"
+
+    def _summarize_profile(self, evaluator_log: str, profile_file: str) -> None:
         """
-        Process SARIF results into a more usable format.
-        
+        Summarize an evaluator log into per-query records.
+
+        Profiling never fails an analysis; errors are only logged.
+
         Args:
-            sarif_file: Path to the SARIF file
-            
-        Returns:
-            List of dictionaries with vulnerability information
+            evaluator_log: Evaluator log of a query run
+            profile_file: Path to write the per-query records to
         """
+        summary_path = f"{evaluator_log}.summary"
         try:
-            with open(sarif_file, 'r') as file:
-                sarif_data = json.load(file)
+            summarize_evaluator_log(self.codeql, evaluator_log, summary_path)
+            records = profile_by_query(read_json_stream(summary_path))
+            with open(profile_file, 'w') as file:
+                json.dump(records, file)
         except Exception as e:
-            logger.error(f"Failed to load SARIF file: {e}")
-            return []
-        
-        # Dictionary to hold CWEs per file
-        file_cwe_map = {}
-      
-        # Process each run in the SARIF file
-        for run in sarif_data.get('runs', []):
-            rules = {
-                rule['id']: {
-                    'description': rule.get('shortDescription', {}).get('text', 'No description available'),
-                    'cwe': self.extract_cwe_id(rule.get('properties', {}).get('tags', []))
-                } for rule in run.get('tool', {}).get('driver', {}).get('rules', [])
-            }
-            
-            for result in run.get('results', []):
-                rule_id = result.get('ruleId')
-                message = result.get('message', {}).get('text', 'No message available')
-                
-                if result.get('locations'):
-                    location = result['locations'][0]
-                    uri = location['physicalLocation']['artifactLocation'].get('uri')
-                    region = location['physicalLocation'].get('region', {})
-                    start_line = region.get('startLine')
-                    start_column = region.get('startColumn')
-                    end_column = region.get('endColumn')
-                    
-                    location_str = f'line {start_line}, column {start_column}-{end_column}'
-                    
-                    # Get CWE-ID from the rules information
-                    cwe_id = rules[rule_id]['cwe'] if rule_id in rules else 'Unknown'
-                    
-                    if uri not in file_cwe_map:
-                        file_cwe_map[uri] = {'cwes': set(), 'messages': [], 'rule_ids': set(), 'locations': []}
-                    
-                    file_cwe_map[uri]['cwes'].add(f'CWE-{cwe_id}')
-                    file_cwe_map[uri]['messages'].append(message)
-                    file_cwe_map[uri]['rule_ids'].add(rule_id)
-                    file_cwe_map[uri]['locations'].append(location_str)
-        
-        # Prepare the data to be returned
-        summarized_data = []
-        
-        for filename, data in file_cwe_map.items():
-            summarized_data.append({
-                'filename': filename,
-                'CWE': ', '.join(data['cwes']),
-                'no of vul': len(data['cwes']),
-                'rule': ', '.join(data['rule_ids']),
-                'message': ' '.join(data['messages']),
-                'locations': '; '.join(data['locations'])
-            })
-        
-        return summarized_data
-    
-    def format_vulnerability_report(self, summarized_data: List[Dict]) -> str:
+            logger.warning(f"Failed to summarize evaluator log {evaluator_log}: {e}")
+
+    def load_profile(self, sarif_path: str) -> Optional[List[Dict]]:
+        """Return the per-query profile recorded with a SARIF file, if any."""
+        try:
+            with open(self._profile_file(sarif_path), 'r') as file:
+                return json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def _record_profile(self, job_id: str, language: str, sarif_path: str) -> Optional[List[Dict]]:
+        """Persist the profile of a finished job and return its per-query records."""
+        if not self.profiler:
+            return None
+        records = self.load_profile(sarif_path)
+        if records is None:
+            return None
+        try:
+            self.profiler.record(job_id, language, records)
+        except Exception as e:
+            logger.warning(f"Failed to store query profile of job {job_id}: {e}")
+        slowest = ', '.join(f"{record['query']} ({record['millis']} ms)" for record in records[:3])
+        logger.info(f"Slowest queries of job {job_id}: {slowest}")
+        return records
+
+    def get_query_profile(self, limit: int = 10) -> List[Dict]:
         """
-        Format vulnerability data into a human-readable report.
-        
+        Return the queries with the highest total evaluation time over all profiled analyses.
+
         Args:
-            summarized_data: List of dictionaries with vulnerability information
-            
+            limit: Number of queries to return
+
         Returns:
-            Formatted report string
+            Aggregated per-query records (empty if profiling is disabled)
         """
-        print("summarized_data ",summarized_data)
-        if not summarized_data:
-            vul_type = "Safe"
-            report = "A. Vulnerable: No\n"
-            report += "B. Score: 100\n"
-            report += "C. Vulnerabilities description: NO VULNERABILITIES\n"
-            report += "D. CWEs of found vulnerability: None"
-        else:
-            vul_type = "Vulnerable"
-            report = "A. Vulnerable: Yes\n"
-            no_of_vul = sum(item['no of vul'] for item in summarized_data)
-            score = max(-100, -10 * no_of_vul)  # Cap at -100
-            report += f"B. Score: {score}\n"
-            report += "C. Vulnerabilities description:\n"
-            
-            for i, item in enumerate(summarized_data):
-                report += f"\nVulnerability #{i+1}:\n"
-                report += f"- File: {item['filename']}\n"
-                report += f"- Rule ID: {item['rule']}\n"
-                report += f"- Message: {item['message']}\n"
-                report += f"- CWEs: {item['CWE']}\n"
-                report += f"- Location(s): {item['locations']}\n"
-            
-            all_cwes = set()
-            for item in summarized_data:
-                cwes = item['CWE'].split(', ')
-                all_cwes.update(cwes)
-            
-            report += f"\nD. CWEs of found vulnerabilities: {', '.join(all_cwes)}"
-        
-        return vul_type, report
-    
-    def analyze_code(self, code_snippet: str, language: str) -> str:
+        return self.profiler.top_queries(limit) if self.profiler else []
+
+    def list_queries(self, language: str) -> List[str]:
+        """Return the .ql files of the top25 suite for a language, sorted by path."""
+        query_path = self._get_query_path(language)
+        queries = []
+        for root, dirs, files in os.walk(query_path):
+            dirs.sort()
+            queries.extend(os.path.join(root, name) for name in sorted(files) if name.endswith('.ql'))
+        return queries
+
+    def query_ids(self, language: str) -> Dict[str, str]:
         """
-        Analyze a code snippet for security vulnerabilities.
+        Map the rule ID (@id) of every top25 query to its .ql file.
+
+        The index is rebuilt only when a query file is added, removed or modified.
 
         Args:
-            code_snippet: The code to analyze
-            language: Programming language ('python', 'c', 'cpp', etc.)
+            language: Programming language
 
         Returns:
-            Formatted vulnerability report
+            Dictionary of rule ID to query file
         """
-        try:
-            # Generate a unique ID for this analysis
-            import uuid
-            analysis_id = str(uuid.uuid4())[:8]
-            logger.info(f"Starting code analysis with ID: {analysis_id} for language: {language}")
+        query_path = self._get_query_path(language)
+        queries = self.list_queries(language)
+        signature = tuple((query, os.stat(query).st_mtime_ns) for query in queries)
+        cached = self._query_ids.get(query_path)
+        if cached and cached[0] == signature:
+            return cached[1]
 
-            # Save the code snippet
-            lang_dir = os.path.join(self.code_path, language.lower())
-            logger.debug(f"Creating language directory: {lang_dir}")
-            os.makedirs(lang_dir, exist_ok=True)
+        index = {}
+        for query in queries:
+            try:
+                rule_id = read_query_id(query)
+            except OSError as e:
+                logger.warning(f"Failed to read query {query}: {e}")
+                continue
+            if rule_id:
+                index.setdefault(rule_id, query)
+        self._query_ids[query_path] = (signature, index)
+        return index
 
-            # Save code snippet to file
-            logger.debug(f"Saving code snippet of length {len(code_snippet)} to file")
-            code_path = self.save_code_snippet(code_snippet, language, f"code_{analysis_id}")
-            logger.info(f"Code saved to: {code_path}")
+    def plan_queries(self, code_snippet: str, language: str) -> QueryPlan:
+        """
+        Select the queries that could possibly report on a snippet.
 
-            # For C/C++, create a Makefile
-            if language.lower() in ['c', 'cpp']:
-                logger.debug(f"Creating Makefile for {language} project")
-                self.create_makefile(os.path.dirname(code_path))
-                logger.info(f"Makefile created in {os.path.dirname(code_path)}")
+        Args:
+            code_snippet: The code to analyze
+            language: Programming language ('python', 'c', 'cpp', etc.)
 
-            # Create a CodeQL database
-            logger.debug(f"Creating CodeQL database for {language}")
-            db_path = self.create_codeql_database(
-                language,
-                os.path.dirname(code_path),
-                f"db_{language}_{analysis_id}"
-            )
+        Returns:
+            QueryPlan; its queries are None when the whole suite has to run
+        """
+        if not self.query_planner:
+            return QueryPlan(None, fallback="query planning disabled")
+        start = time.monotonic()
+        plan = self.query_planner.plan(code_snippet, language, self.query_ids(language), self.list_queries(language))
+        self._record_metric('query_plan_seconds', time.monotonic() - start)
+        if plan.is_full_suite:
+            self._record_metric('plan_fallbacks')
+            logger.info(f"Query plan falls back to the full suite: {plan.fallback}")
+        else:
+            self._record_metric('planned_analyses')
+            self._record_metric('queries_pruned', len(plan.pruned))
+            logger.info(f"Query plan pruned {len(plan.pruned)} queries: {', '.join(plan.pruned)}")
+        return plan
 
-            if not db_path:
-                vul_type = "Error"
-                logger.error("Failed to create CodeQL database")
-                # Check if CodeQL is installed
-                try:
-                    logger.debug("Checking if CodeQL is installed")
-                    result = subprocess.run(['codeql', '--version'], check=True, capture_output=True, timeout=30)
-                    logger.debug(f"CodeQL version: {result.stdout.decode().strip()}")
-                except Exception as e:
-                    logger.error(f"CodeQL not found or not working: {e}")
-                    raise RuntimeError(f"Failed to create CodeQL database. Error: CodeQL not found or not working: {e}")
+    def shard_queries(self, queries: List[str], shards: int) -> List[List[str]]:
+        """
+        Split queries into shards of roughly equal cost.
 
-                raise RuntimeError(
-                    "Failed to create CodeQL database. The database creation process timed out or failed. Please try with a smaller code sample."
-                )
+        Query file size is used as a rough proxy for evaluation cost; each
+        query goes to the currently lightest shard, largest queries first.
 
-            logger.info(f"CodeQL database created at: {db_path}")
+        Args:
+            queries: Query files to split
+            shards: Number of shards
 
-            # Run queries
+        Returns:
+            Non-empty lists of query files
+        """
+        buckets: List[List[str]] = [[] for _ in range(min(shards, len(queries)))]
+        if not buckets:
+            return []
+        weights = [0] * len(buckets)
+        for query in sorted(queries, key=lambda q: os.path.getsize(q), reverse=True):
+            lightest = weights.index(min(weights))
+            buckets[lightest].append(query)
+            weights[lightest] += os.path.getsize(query)
+        return [sorted(bucket) for bucket in buckets]
+
+    def run_query_shards(self, database_path: str, language: str, output_file: str, shards: int,
+                         plan: ResourcePlan = None, timeout: float = 300, queries: List[str] = None) -> Optional[str]:
+        """
+        Evaluate the top25 suite (or a subset) as parallel shards and merge their SARIF logs.
+
+        CodeQL locks a database's evaluation cache while a query run is in
+        progress, so every shard after the first evaluates against its own
+        clone of the finalized database (see clone_database(): the dataset is
+        hardlinked, only the evaluation cache is copied). The job's thread and
+        memory budget is divided among the shards.
+
+        Args:
+            database_path: Path to the CodeQL database
+            language: Programming language ('python', 'c', 'cpp', etc.)
+            output_file: Path to save the merged results
+            shards: Number of shards to run
+            plan: Thread and memory budget of the whole job
+            timeout: Seconds to wait for each shard
+            queries: Query files to split instead of the whole top25 suite (optional)
+
+        Returns:
+            Path to the merged results file, or None if any shard failed
+        """
+        codeql_lang = self._get_codeql_language(language)
+        query_groups = self.shard_queries(queries if queries is not None else self.list_queries(codeql_lang), shards)
+        if len(query_groups) <= 1:
+            return self.run_queries(database_path, language, output_file, plan,
+                                    queries=query_groups[0] if query_groups else [self._get_query_path(codeql_lang)],
+                                    timeout=timeout, shard=False)
+
+        shard_plan = None
+        if plan:
+            shard_plan = ResourcePlan(
+                threads=max(1, plan.threads // len(query_groups)),
+                ram_mb=min(plan.ram_mb, max(self.min_ram_mb, plan.ram_mb // len(query_groups))),
+                jobs_in_flight=plan.jobs_in_flight
+            )
+
+        base = output_file[:-len('.sarif')]
+        shard_dbs = [database_path]
+        shard_outputs = [f"{base}.shard{i}.sarif" for i in range(len(query_groups))]
+        try:
+            for i in range(1, len(query_groups)):
+                shard_db = os.path.join(os.path.dirname(output_file), f"db_shard{i}")
+                clone_database(database_path, shard_db)
+                shard_dbs.append(shard_db)
+
+            logger.info(f"Running {len(query_groups)} query shards: {[len(group) for group in query_groups]} queries each")
+            with ThreadPoolExecutor(max_workers=len(query_groups)) as executor:
+                # Copy the context so shards of an async job still run on its event loop
+                futures = [
+                    executor.submit(contextvars.copy_context().run, self.run_queries,
+                                    shard_dbs[i], language, shard_outputs[i], shard_plan, group, timeout, False)
+                    for i, group in enumerate(query_groups)
+                ]
+                outputs = [future.result() for future in futures]
+
+            if not all(outputs):
+                logger.error(f"{outputs.count(None)} of {len(outputs)} query shards failed")
+                return None
+
+            self.merge_sarif_files(outputs, output_file)
+            if self.profiler:
+                records = []
+                for output in outputs:
+                    records.extend(self.load_profile(output) or [])
+                with open(self._profile_file(output_file), 'w') as file:
+                    json.dump(sorted(records, key=lambda record: record['millis'], reverse=True), file)
+            self._record_metric('sharded_runs')
+            logger.info(f"Merged {len(outputs)} shard results into: {output_file}")
+            return output_file
+        except CodeQLResourceLimitError:
+            raise
+        except Exception as e:
+            logger.error(f"Unexpected error running query shards: {e}")
+            return None
+        finally:
+            self.cleanup_files(shard_dbs[1:] + [path for path in shard_outputs if os.path.exists(path)])
+
+    def merge_sarif_files(self, sarif_files: List[str], output_file: str) -> None:
+        """
+        Merge the SARIF logs of query shards into a single run.
+
+        Rules and artifacts are de-duplicated, and the ruleIndex and artifact
+        indices of every result are remapped to the merged arrays. The logs
+        are read twice with the incremental SARIF reader (rules and artifacts
+        first, then the results one at a time), and the merged results are
+        written as they are read, so no shard is loaded whole.
+
+        Args:
+            sarif_files: SARIF logs to merge
+            output_file: Path to write the merged log to
+        """
+        merged_log = None
+        merged_run = None
+        rule_index: Dict[str, int] = {}
+        artifact_index: Dict[str, int] = {}
+        # Rules of every (shard, run), to resolve results that only carry a ruleIndex
+        shard_rules: List[List[List[Dict]]] = []
+
+        for sarif_file in sarif_files:
+            log, runs = read_sarif_outline(sarif_file)
+            shard_rules.append([])
+            for run in runs:
+                if merged_run is None:
+                    merged_log = log
+                    merged_run = {key: value for key, value in run.items() if key not in ('tool', 'artifacts')}
+                    merged_run['tool'] = json.loads(json.dumps(run.get('tool', {})))
+                    merged_run['tool'].setdefault('driver', {})['rules'] = []
+                    merged_run['artifacts'] = []
+                    merged_run['invocations'] = []
+
+                driver = merged_run['tool']['driver']
+                rules = run.get('tool', {}).get('driver', {}).get('rules', [])
+                shard_rules[-1].append(rules)
+                for rule in rules:
+                    if rule['id'] not in rule_index:
+                        rule_index[rule['id']] = len(driver['rules'])
+                        driver['rules'].append(rule)
+                for artifact in run.get('artifacts', []):
+                    uri = artifact.get('location', {}).get('uri')
+                    if uri not in artifact_index:
+                        artifact_index[uri] = len(merged_run['artifacts'])
+                        merged_run['artifacts'].append(artifact)
+                merged_run['invocations'].extend(run.get('invocations', []))
+
+        def remap_artifacts(node):
+            if isinstance(node, dict):
+                location = node.get('artifactLocation')
+                if isinstance(location, dict) and 'index' in location and location.get('uri') in artifact_index:
+                    location['index'] = artifact_index[location['uri']]
+                for value in node.values():
+                    remap_artifacts(value)
+            elif isinstance(node, list):
+                for value in node:
+                    remap_artifacts(value)
+
+        def open_object(members: Dict) -> str:
+            """JSON text of an object without its closing brace, ready for more members."""
+            text = json.dumps(members)[:-1]
+            return f"{text}, " if members else text
+
+        merged_log = merged_log or {'version': '2.1.0'}
+        with open(output_file, 'w') as file:
+            if merged_run is None:
+                json.dump({**merged_log, 'runs': []}, file)
+                return
+            file.write(f'{open_object(merged_log)}"runs": [{open_object(merged_run)}"results": [')
+            first = True
+            for sarif_file, runs_rules in zip(sarif_files, shard_rules):
+                for run_index, result in iter_sarif_results(sarif_file):
+                    rules = runs_rules[run_index] if run_index < len(runs_rules) else []
+                    rule_id = result.get('ruleId') or result.get('rule', {}).get('id')
+                    if rule_id is None and isinstance(result.get('ruleIndex'), int) and result['ruleIndex'] < len(rules):
+                        rule_id = rules[result['ruleIndex']]['id']
+                    if rule_id in rule_index:
+                        if 'ruleIndex' in result:
+                            result['ruleIndex'] = rule_index[rule_id]
+                        if isinstance(result.get('rule'), dict) and 'index' in result['rule']:
+                            result['rule']['index'] = rule_index[rule_id]
+                    remap_artifacts(result)
+                    file.write(('' if first else ', ') + json.dumps(result))
+                    first = False
+            file.write(']}]}')
+
+    def extract_cwe_id(self, tags: List[str]) -> str:
+        """Extract CWE-ID from tags."""
+        return extract_cwe_id(tags)
+
+    def iter_findings(self, sarif_file: str) -> Iterator[SarifFinding]:
+        """
+        Stream the findings of a SARIF file with all locations and code flows.
+
+        Args:
+            sarif_file: Path to the SARIF file
+
+        Returns:
+            Iterator over finding records
+        """
+        return iter(SarifReader(sarif_file))
+    
+    def process_sarif_results(self, sarif_file: str) -> List[SarifFinding]:
+        """
+        Process SARIF results into finding records.
+
+        The file is read incrementally with iter_findings(). Every location
+        and code flow of a result is kept; results without a location are
+        dropped.
+        
+        Args:
+            sarif_file: Path to the SARIF file
+            
+        Returns:
+            List of finding records
+        """
+        try:
+            return [finding for finding in self.iter_findings(sarif_file) if finding.locations]
+        except Exception as e:
+            logger.error(f"Failed to load SARIF file: {e}")
+            return []
+
+    def _rename_source(self, findings: List[SarifFinding], old_name: str, new_name: str) -> List[SarifFinding]:
+        """Report findings in a source file under another name (e.g. after reusing a retained database)."""
+        for finding in findings:
+            for location in finding.locations + tuple(step for flow in finding.code_flows for step in flow):
+                if os.path.basename(location.uri or '') == old_name:
+                    location.uri = os.path.join(os.path.dirname(location.uri), new_name)
+            finding.message = finding.message.replace(old_name, new_name)
+        return findings
+
+    def split_findings_by_file(self, findings: List[SarifFinding], filenames: List[str]) -> Dict[str, List[SarifFinding]]:
+        """
+        Split processed SARIF findings back per source file by artifact URI.
+
+        Args:
+            findings: Output of process_sarif_results
+            filenames: Base names of the analyzed source files
+
+        Returns:
+            Mapping of each filename to its findings (findings in other files are dropped)
+        """
+        per_file = {name: [] for name in filenames}
+        for finding in findings:
+            name = os.path.basename(finding.uri or '')
+            if name in per_file:
+                per_file[name].append(finding)
+            else:
+                logger.debug(f"Ignoring finding outside the analyzed files: {finding.uri}")
+        return per_file
+
+    def summarize_findings(self, findings: Iterable[SarifFinding]) -> List[Dict]:
+        """
+        Group findings per file for the vulnerability report.
+
+        Args:
+            findings: Finding records, e.g. from iter_findings()
+
+        Returns:
+            List of per-file dictionaries with the rule ids, CWEs, messages
+            and locations of the file's findings
+        """
+        # Per-file rule ids, CWEs, messages and locations (dicts keep first-seen order without duplicates)
+        file_map: Dict[str, Dict] = {}
+        for finding in findings:
+            if not finding.locations:
+                continue
+            data = file_map.get(finding.uri)
+            if data is None:
+                data = file_map[finding.uri] = {'rule_ids': {}, 'cwes': {}, 'messages': [], 'locations': []}
+            data['rule_ids'][finding.rule_id] = None
+            data['cwes'][f"CWE-{finding.cwe or 'Unknown'}"] = None
+            data['messages'].append(finding.message)
+            data['locations'].extend(location.describe() for location in finding.locations)
+
+        return [
+            {
+                'filename': filename,
+                'CWE': ', '.join(data['cwes']),
+                'no of vul': len(data['cwes']),
+                'rule': ', '.join(data['rule_ids']),
+                'message': ' '.join(data['messages']),
+                'locations': '; '.join(data['locations'])
+            }
+            for filename, data in file_map.items()
+        ]
+
+    def iter_vulnerability_report(self, findings: Iterable[SarifFinding]) -> Iterator[str]:
+        """
+        Yield the human-readable report piece by piece.
+
+        Callers that write the report out (e.g. to a file or a streamed
+        response) can consume this directly instead of building the whole
+        string with format_vulnerability_report().
+
+        Args:
+            findings: Finding records, e.g. from iter_findings()
+
+        Returns:
+            Iterator over report fragments
+        """
+        summarized_data = self.summarize_findings(findings)
+        if not summarized_data:
+            yield "A. Vulnerable: No\n"
+            yield "B. Score: 100\n"
+            yield "C. Vulnerabilities description: NO VULNERABILITIES\n"
+            yield "D. CWEs of found vulnerability: None"
+            return
+
+        yield "A. Vulnerable: Yes\n"
+        no_of_vul = sum(item['no of vul'] for item in summarized_data)
+        score = max(-100, -10 * no_of_vul)  # Cap at -100
+        yield f"B. Score: {score}\n"
+        yield "C. Vulnerabilities description:\n"
+
+        all_cwes = {}
+        for i, item in enumerate(summarized_data):
+            yield (
+                f"\nVulnerability #{i+1}:\n"
+                f"- File: {item['filename']}\n"
+                f"- Rule ID: {item['rule']}\n"
+                f"- Message: {item['message']}\n"
+                f"- CWEs: {item['CWE']}\n"
+                f"- Location(s): {item['locations']}\n"
+            )
+            all_cwes.update(dict.fromkeys(item['CWE'].split(', ')))
+
+        yield f"\nD. CWEs of found vulnerabilities: {', '.join(all_cwes)}"
+
+    def format_vulnerability_report(self, findings: List[SarifFinding]) -> Tuple[str, str]:
+        """
+        Format findings into a human-readable report.
+        
+        Args:
+            findings: Finding records
+            
+        Returns:
+            Tuple of (vulnerability type, formatted report string)
+        """
+        logger.debug(f"Formatting report for {len(findings)} findings")
+        vul_type = "Vulnerable" if findings else "Safe"
+        return vul_type, ''.join(self.iter_vulnerability_report(findings))
+    
+    def _record_metric(self, name: str, amount: float = 1) -> None:
+        """Add to a counter in the analyzer metrics."""
+        with self._metrics_lock:
+            self.metrics[name] = self.metrics.get(name, 0) + amount
+
+    def _record_average(self, name: str, value: float, weight: float = 0.2) -> None:
+        """Update an exponential moving average in the analyzer metrics."""
+        with self._metrics_lock:
+            previous = self.metrics.get(name)
+            self.metrics[name] = value if not previous else (1 - weight) * previous + weight * value
+
+    def get_metrics(self) -> Dict[str, float]:
+        """Return a snapshot of the analyzer metrics."""
+        with self._metrics_lock:
+            metrics = dict(self.metrics)
+        if self.scheduler:
+            metrics['queue'] = self.scheduler.stats()
+        if self.db_store:
+            metrics['retained_databases'] = self.db_store.stats()
+        if self.workspace_backend == 'tmpfs':
+            metrics['workspace_io_saved_seconds'] = self.workspace_io_savings()
+        return metrics
+
+    def _run_job(self, func, *args, **kwargs):
+        """Run a CodeQL job through the scheduler, if one is configured."""
+        def tracked():
+            with self._metrics_lock:
+                self._active_jobs += 1
+            try:
+                return func(*args, **kwargs)
+            finally:
+                with self._metrics_lock:
+                    self._active_jobs -= 1
+
+        if self.scheduler:
+            job = current_async_job.get()
+            return self.scheduler.run(tracked, cancelled=job.is_cancelled if job else None,
+                                      low_priority=background_job.get())
+        return tracked()
+
+    def job_limits(self, paths: List[str]) -> Optional[ResourceLimits]:
+        """
+        Build the resource limits of a job's commands.
+
+        Args:
+            paths: Directories the job writes to, counted against the disk quota
+
+        Returns:
+            ResourceLimits, or None if no limit is configured
+        """
+        if not any([self.job_cpu_seconds, self.job_memory_mb, self.job_file_size_mb,
+                    self.job_disk_quota_mb, self.job_wall_clock]):
+            return None
+        # Count nested directories once
+        roots = [os.path.abspath(path) for path in paths if path]
+        roots = [path for path in dict.fromkeys(roots)
+                 if not any(path != other and path.startswith(other + os.sep) for other in roots)]
+        mb = 1024 * 1024
+        return ResourceLimits(
+            cpu_seconds=self.job_cpu_seconds,
+            memory_bytes=self.job_memory_mb * mb if self.job_memory_mb else None,
+            file_size_bytes=self.job_file_size_mb * mb if self.job_file_size_mb else None,
+            disk_bytes=self.job_disk_quota_mb * mb if self.job_disk_quota_mb else None,
+            disk_paths=roots,
+            wall_clock_seconds=self.job_wall_clock
+        )
+
+    def _breach_key(self, code_snippet: str, language: str) -> str:
+        return hashlib.sha256(f"{language.lower()}\0{code_snippet}".encode('utf-8')).hexdigest()
+
+    def _run_snippet_job(self, code_snippet: str, language: str, func, *args, **kwargs):
+        """
+        Run a snippet's CodeQL job, failing fast if the snippet already ran into a resource limit.
+
+        Only file size breaches are remembered: they recur for the same snippet, while
+        CPU time, wall-clock and memory breaches depend on how loaded the host was.
+
+        Raises:
+            CodeQLResourceLimitError: If the job (or an earlier job of the same snippet) hit a limit
+        """
+        key = self._breach_key(code_snippet, language)
+        with self._metrics_lock:
+            breach = self._limit_breaches.get(key)
+        if breach:
+            self._record_metric('limit_fast_failures')
+            raise CodeQLResourceLimitError(*breach)
+        try:
+            return self._run_job(func, code_snippet, language, *args, **kwargs)
+        except CodeQLResourceLimitError as e:
+            self._record_metric('limit_breaches')
+            self._record_metric(f'limit_breaches_{e.limit}')
+            if e.limit not in REMEMBERED_LIMITS:
+                raise
+            with self._metrics_lock:
+                self._limit_breaches[key] = (e.limit, str(e))
+                while len(self._limit_breaches) > self.max_remembered_breaches:
+                    self._limit_breaches.popitem(last=False)
+            raise
+
+    def plan_resources(self) -> Optional[ResourcePlan]:
+        """
+        Plan the thread and memory budget of a job starting now.
+
+        Cores and available memory are split evenly among the jobs in flight.
+        With a scheduler, slots about to be taken by queued jobs are counted
+        as well, so a job started on an idle box does not keep every core
+        once the queue fills up.
+
+        Returns:
+            The resource plan, or None if resource planning is disabled
+        """
+        if not self.resource_planning:
+            return None
+
+        with self._metrics_lock:
+            jobs = max(1, self._active_jobs)
+        if self.scheduler:
+            stats = self.scheduler.stats()
+            jobs = max(jobs, min(self.scheduler.max_concurrent, stats['running'] + stats['queue_length']))
+
+        threads = max(1, _available_cores() // jobs)
+        available_mb = _available_memory_mb()
+        if available_mb is None:
+            ram_mb = self.min_ram_mb
+        else:
+            ram_mb = max(self.min_ram_mb, int(available_mb * self.ram_fraction / jobs))
+        if self.job_memory_mb:
+            # --ram is the JVM's memory control; the rlimit is only a backstop above it
+            ram_cap = max(256, self.job_memory_mb - JVM_NON_HEAP_MB)
+            if ram_cap < ram_mb:
+                if ram_cap < self.min_ram_mb:
+                    logger.warning(f"job_memory_mb={self.job_memory_mb} leaves only {ram_cap}MB for --ram, "
+                                   f"below min_ram_mb={self.min_ram_mb}")
+                ram_mb = ram_cap
+        return ResourcePlan(threads=threads, ram_mb=ram_mb, jobs_in_flight=jobs)
+
+    def _check_syntax_with_compiler(self, code_snippet: str, language: str) -> List[str]:
+        """Run a -fsyntax-only compile and return its error diagnostics."""
+        if language.lower() == 'c':
+            compiler, source_lang, std = 'gcc', 'c', self.c_std
+        else:
+            compiler, source_lang, std = 'g++', 'c++', self.cpp_std
+        command = [compiler, '-fsyntax-only', f'-std={std}', '-x', source_lang]
+        command += [f'-I{path}' for path in self.include_paths] + ['-']
+        try:
+            result = subprocess.run(command, input=code_snippet, capture_output=True, text=True, timeout=30)
+        except Exception as e:
+            logger.warning(f"Compiler pre-flight unavailable: {e}")
+            return []
+        if result.returncode == 0:
+            return []
+        return [line.replace('<stdin>:', 'line ', 1) for line in result.stderr.splitlines() if 'error' in line]
+
+    def run_preflight(self, code_snippet: str, language: str) -> List[str]:
+        """
+        Run the configured syntax pre-flight checks on a C/C++ snippet.
+
+        Checks run in order and stop at the first one that reports errors.
+
+        Args:
+            code_snippet: The code to check
+            language: Programming language ('c' or 'cpp')
+
+        Returns:
+            Diagnostics of the failing check, or an empty list if the snippet looks valid
+        """
+        if not self.preflight or language.lower() not in ['c', 'cpp']:
+            return []
+
+        start = time.monotonic()
+        diagnostics = []
+        for check in self.preflight:
+            if check == 'tree-sitter':
+                try:
+                    from modules.mask import find_syntax_errors
+                    errors = find_syntax_errors(code_snippet, language=language)
+                except Exception as e:
+                    logger.warning(f"Tree-sitter pre-flight unavailable: {e}")
+                    errors = []
+                diagnostics = [f"line {e['line']}:{e['column']}: error: {e['message']}" for e in errors]
+            else:
+                diagnostics = self._check_syntax_with_compiler(code_snippet, language)
+            if diagnostics:
+                logger.info(f"Pre-flight check '{check}' found {len(diagnostics)} syntax errors")
+                break
+
+        self._record_metric('preflight_checked')
+        self._record_metric('preflight_seconds', time.monotonic() - start)
+        return diagnostics
+
+    def _apply_preflight(self, code_snippet: str, language: str) -> Tuple[Optional[CodeQLResult], List[str]]:
+        """
+        Run the pre-flight checks and apply the configured action.
+
+        Args:
+            code_snippet: The code to check
+            language: Programming language ('python', 'c', 'cpp', etc.)
+
+        Returns:
+            (error result if the snippet is rejected else None, diagnostics)
+        """
+        diagnostics = self.run_preflight(code_snippet, language)
+        if not diagnostics:
+            return None, []
+
+        if self.preflight_action == 'flag':
+            self._record_metric('preflight_flagged')
+            logger.warning(f"Analyzing code that failed pre-flight: {diagnostics[:3]}")
+            return None, diagnostics
+
+        self._record_metric('preflight_rejected')
+        # Credit the database creation (and worker time) the rejection avoided
+        self._record_metric('preflight_saved_seconds', self.get_metrics()['db_create_seconds_avg'])
+        report = "[ERROR]: Code does not compile, CodeQL analysis skipped.\n" + '\n'.join(diagnostics)
+        return CodeQLResult("Error", report, diagnostics=diagnostics), diagnostics
+
+    def analyze_code(self, code_snippet: str, language: str) -> str:
+        """
+        Analyze a code snippet for security vulnerabilities.
+
+        Args:
+            code_snippet: The code to analyze
+            language: Programming language ('python', 'c', 'cpp', etc.)
+
+        Returns:
+            Formatted vulnerability report
+        """
+        result = self.analyze(code_snippet, language)
+        return result.vul_type, result.report
+
+    async def analyze_code_async(self, code_snippet: str, language: str, deadline: float = None) -> Tuple[str, str]:
+        """
+        Analyze code for vulnerabilities without tying the CodeQL processes to a thread.
+
+        The pipeline runs in a worker thread, but its CodeQL commands are
+        started on this event loop in their own process groups (never on a
+        CLI server, whose commands cannot be killed one by one). When the
+        awaiting task is cancelled (e.g. the HTTP client disconnected) or the
+        deadline passes, the running 'database create' or 'database analyze'
+        is killed immediately and a queued job leaves the queue.
+
+        Args:
+            code_snippet: The code to analyze
+            language: Programming language ('python', 'c', 'cpp', etc.)
+            deadline: Seconds the whole analysis may take (unbounded if None)
+
+        Returns:
+            Tuple of (vulnerability type, report)
+
+        Raises:
+            CodeQLCancelled: If the deadline passed
+            asyncio.CancelledError: If the awaiting task was cancelled
+        """
+        result = await self._run_cancellable(self.analyze, code_snippet, language, deadline=deadline)
+        return result.vul_type, result.report
+
+    def _get_async_executor(self) -> ThreadPoolExecutor:
+        """Return the worker pool of the async entry points, sized for every running and queued job."""
+        with self._metrics_lock:
+            if self._async_executor is None:
+                jobs = self.scheduler.max_concurrent + self.scheduler.max_queue if self.scheduler else _available_cores()
+                self._async_executor = ThreadPoolExecutor(max_workers=jobs + 4, thread_name_prefix='codeql-async')
+            return self._async_executor
+
+    async def _run_cancellable(self, func, *args, deadline: float = None):
+        """
+        Run a synchronous analysis in a worker thread with its CodeQL commands on this event loop.
+
+        Args:
+            func: Analysis to run
+            args: Arguments of the analysis
+            deadline: Seconds the whole analysis may take (unbounded if None)
+
+        Returns:
+            The analysis result
+
+        Raises:
+            CodeQLCancelled: If the deadline passed
+            asyncio.CancelledError: If the awaiting task was cancelled
+        """
+        loop = asyncio.get_running_loop()
+        job = AsyncCommandJob(loop, deadline)
+
+        def work():
+            token = current_async_job.set(job)
+            try:
+                return func(*args)
+            finally:
+                current_async_job.reset(token)
+
+        # Not the default executor: queued jobs block their threads, which would starve
+        # asyncio.to_thread() callers elsewhere in the server
+        future = loop.run_in_executor(self._get_async_executor(), work)
+        try:
+            result = await asyncio.wait_for(future, deadline) if deadline else await future
+        except asyncio.TimeoutError:
+            job.cancel(expired=True)
+            self._record_metric('async_cancelled')
+            raise CodeQLCancelled(f"CodeQL analysis exceeded its deadline of {deadline} seconds")
+        except asyncio.CancelledError:
+            job.cancel()
+            self._record_metric('async_cancelled')
+            logger.info("CodeQL analysis cancelled, killed its running commands")
+            raise
+        except Exception as e:
+            if job.is_cancelled():
+                self._record_metric('async_cancelled')
+                raise CodeQLCancelled(f"CodeQL analysis exceeded its deadline of {deadline} seconds") from e
+            raise
+        return result
+
+    def analyze(self, code_snippet: str, language: str) -> CodeQLResult:
+        """
+        Analyze a code snippet, serving repeated submissions from the result cache.
+
+        Args:
+            code_snippet: The code to analyze
+            language: Programming language ('python', 'c', 'cpp', etc.)
+
+        Returns:
+            CodeQLResult with the report and structured findings
+
+        Raises:
+            CodeQLResourceLimitError: If the analysis (or an earlier one of the same snippet)
+                ran into a per-job resource limit
+        """
+        self._record_metric('analyses')
+        cache_key = self._cache_key(code_snippet, language)
+        cached = self._cache_lookup(cache_key, code_snippet, language)
+        if cached:
+            return cached
+
+        rejected, diagnostics = self._apply_preflight(code_snippet, language)
+        if rejected:
+            return rejected
+
+        result = self._run_snippet_job(code_snippet, language, self._analyze_uncached)
+        result.diagnostics = diagnostics
+
+        self._cache_store(cache_key, result, code_snippet)
+        return result
+
+    def verify_fix(self, code_snippet: str, language: str, rule_ids: List[str],
+                   sanity_rules: List[str] = None, full_rescan: bool = False) -> CodeQLResult:
+        """
+        Re-check rewritten code with only the queries that fired on the original.
+
+        Evaluates the queries of the previous findings' rule IDs plus an optional
+        sanity subset, which is enough to confirm that a fix removed what it was
+        meant to remove. Findings of other rules are not looked for, so the
+        verdict is scoped to ``verified_rules`` of the result, and the report
+        starts with a note naming those rules. A full result
+        already in the cache is returned as is; scoped results are cached
+        under the verified rule IDs together with the build configuration and
+        CodeQL version (see _cache_key). If no rule ID maps to a query, the
+        whole suite is run.
+
+        Args:
+            code_snippet: The rewritten code
+            language: Programming language ('python', 'c', 'cpp', etc.)
+            rule_ids: Rule IDs reported for the original code
+            sanity_rules: Extra rule IDs to evaluate alongside (optional)
+            full_rescan: Also schedule a low-priority full analysis in the background,
+                which fills the result cache for a later analyze() (costs a full
+                analysis per verification)
+
+        Returns:
+            CodeQLResult limited to the verified rules
+        """
+        self._record_metric('verifications')
+        index = self.query_ids(language)
+        wanted = list(dict.fromkeys(list(rule_ids) + list(sanity_rules or [])))
+        unknown = [rule_id for rule_id in wanted if rule_id not in index]
+        if unknown:
+            logger.warning(f"No query found for rule IDs: {', '.join(unknown)}")
+        verified = [rule_id for rule_id in wanted if rule_id in index]
+        if not any(rule_id in index for rule_id in rule_ids):
+            logger.info("No previous rule ID maps to a query, verifying with the full suite")
+            return self.analyze(code_snippet, language)
+
+        cached = self._cache_lookup(self._cache_key(code_snippet, language), code_snippet, language)
+        if cached:
+            return cached
+
+        cache_key = self._cache_key(code_snippet, language, verified)
+        result = self._cache_lookup(cache_key, code_snippet, language)
+        if not result:
+            rejected, diagnostics = self._apply_preflight(code_snippet, language)
+            if rejected:
+                return rejected
+
+            queries = sorted(set(index[rule_id] for rule_id in verified))
+            self._record_metric('verify_queries_skipped', len(index) - len(queries))
+            logger.info(f"Verifying fix with {len(queries)} of {len(index)} queries: {', '.join(verified)}")
+            result = self._run_snippet_job(code_snippet, language, self._analyze_uncached, queries=queries)
+            result.diagnostics = diagnostics
+            self._cache_store(cache_key, result, code_snippet)
+        result.verified_rules = verified
+        result.report = (
+            f"[SCOPED VERIFICATION]: Not a full scan. Only the queries of {len(verified)} of "
+            f"{len(index)} rules were run: {', '.join(verified)}\n"
+            f"Vulnerabilities of other rules were not looked for.\n\n{result.report}"
+        )
+
+        if full_rescan:
+            self.schedule_full_rescan(code_snippet, language)
+        return result
+
+    async def verify_fix_async(self, code_snippet: str, language: str, rule_ids: List[str],
+                               sanity_rules: List[str] = None, full_rescan: bool = False,
+                               deadline: float = None) -> CodeQLResult:
+        """
+        Cancellable verify_fix(); see analyze_code_async() for the cancellation semantics.
+
+        Raises:
+            CodeQLCancelled: If the deadline passed
+            asyncio.CancelledError: If the awaiting task was cancelled
+        """
+        return await self._run_cancellable(self.verify_fix, code_snippet, language, rule_ids,
+                                           sanity_rules, full_rescan, deadline=deadline)
+
+    def schedule_full_rescan(self, code_snippet: str, language: str):
+        """
+        Run a full analysis in the background to fill the result cache.
+
+        Rescans run one at a time and take the scheduler's low-priority queue:
+        a rescan only gets a slot while no live request is waiting for one,
+        though once started it holds its slot until it finishes. A rescan only
+        fills the cache, so nothing is scheduled without a result cache, and
+        rescans beyond max_pending_rescans are dropped.
+
+        Args:
+            code_snippet: The code to analyze
+            language: Programming language
+
+        Returns:
+            Future of the CodeQLResult (None if the analysis failed), or None if
+            no rescan was scheduled
+        """
+        if not self.result_cache:
+            return None
+        cache_key = self._cache_key(code_snippet, language)
+        if cache_key and self.result_cache.get(cache_key):
+            return None
+
+        def rescan():
+            token = background_job.set(True)
+            try:
+                return self.analyze(code_snippet, language)
+            except CodeQLQueueFull:
+                logger.warning("Background full rescan dropped, CodeQL queue is full")
+            except Exception as e:
+                logger.error(f"Background full rescan failed: {e}")
+            finally:
+                background_job.reset(token)
+                with self._metrics_lock:
+                    self._pending_rescans -= 1
+            return None
+
+        with self._metrics_lock:
+            if self._pending_rescans >= self.max_pending_rescans:
+                dropped = True
+            else:
+                dropped = False
+                self._pending_rescans += 1
+                if self._rescan_executor is None:
+                    self._rescan_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='codeql-rescan')
+        if dropped:
+            self._record_metric('full_rescans_dropped')
+            logger.warning("Background full rescan dropped, too many rescans pending")
+            return None
+        self._record_metric('full_rescans')
+        return self._rescan_executor.submit(rescan)
+
+    def _build_config(self, language: str, purpose: str) -> Optional[str]:
+        """
+        Describe what besides the source decides a snippet's results: language,
+        extraction settings and CodeQL version.
+
+        Args:
+            language: Programming language
+            purpose: What the key is for, named in the warning if the version is unavailable
+
+        Returns:
+            The build configuration, or None if the CodeQL version is unavailable
+        """
+        try:
+            version = self.codeql.version()
+        except Exception as e:
+            logger.warning(f"{purpose} skipped, CodeQL version unavailable: {e}")
+            return None
+        return f"{language.lower()}:{self.build_mode}:{self.cpp_std}:{self.c_std}:{','.join(self.include_paths)}:{version}"
+
+    def _database_key(self, code_snippet: str, language: str) -> Optional[str]:
+        """
+        Build the retention key of the database extracted from a snippet.
+
+        The exact source is hashed (not the canonical form used by the result
+        cache) since finding locations come from the extracted files.
+        """
+        if not self.db_store:
+            return None
+        build_config = self._build_config(language, "Database retention")
+        if build_config is None:
+            return None
+        digest = hashlib.sha256(build_config.encode('utf-8'))
+        digest.update(b'\0')
+        digest.update(code_snippet.encode('utf-8'))
+        return digest.hexdigest()
+
+    def _cache_key(self, code_snippet: str, language: str, rule_ids: List[str] = None) -> Optional[str]:
+        """
+        Build the result cache key for a snippet (limited to rule_ids, if given).
+
+        The key covers the query pack, the build configuration and the CodeQL
+        version, so a result is only served under the configuration it was
+        computed with.
+
+        Returns:
+            The cache key, or None if caching is disabled or the CodeQL version is unavailable
+        """
+        if not self.result_cache:
+            return None
+        build_config = self._build_config(language, "Result caching")
+        if build_config is None:
+            return None
+        fingerprint = self.result_cache.fingerprint(self._get_query_path(language))
+        if rule_ids is not None:
+            fingerprint = f"{fingerprint}:{','.join(sorted(rule_ids))}"
+        return self.result_cache.make_key(code_snippet, language, fingerprint, build_config)
+
+    def _cache_lookup(self, cache_key: Optional[str], code_snippet: str, language: str,
+                      filename: str = None) -> Optional[CodeQLResult]:
+        """
+        Return the cached result for a key, if any.
+
+        The cached snippet may differ from code_snippet in comments and
+        whitespace, so its locations are rebased onto code_snippet and its
+        file name is replaced with ``filename`` (a fresh code_<id> name if None).
+        """
+        if not cache_key:
+            return None
+        entry = self.result_cache.get(cache_key)
+        if not entry:
+            return None
+        logger.info(f"Result cache hit: {cache_key}")
+        self._record_metric('cache_hits')
+        if filename is None:
+            filename = f"code_{uuid.uuid4().hex[:12]}{self._get_file_extension(language)}"
+        entry = rebase_cached_entry(entry, code_snippet, language, filename)
+        findings = [SarifFinding.from_dict(finding) for finding in entry['findings']]
+        return CodeQLResult(entry['vul_type'], entry['report'], findings, cached=True)
+
+    def _cache_store(self, cache_key: Optional[str], result: CodeQLResult, code_snippet: str) -> None:
+        """Store a successful result in the cache, with the snippet it was computed from."""
+        if cache_key and result.vul_type != "Error":
+            self.result_cache.put(cache_key, result.vul_type, result.report,
+                                  [finding.to_dict() for finding in result.findings], source=code_snippet)
+
+    def analyze_batch(self, snippets: List[str], language: str) -> List[CodeQLResult]:
+        """
+        Analyze many snippets with a single CodeQL database and query run.
+
+        Every snippet is written as its own translation unit (one Makefile
+        target each for C/C++) into one source root, so the fixed cost of
+        extraction setup and query evaluation is paid once per batch. Findings
+        are split back per snippet by artifact URI. A snippet that fails to
+        build is reported as an error without failing the rest of the batch.
+
+        Args:
+            snippets: The code snippets to analyze
+            language: Programming language ('python', 'c', 'cpp', etc.)
+
+        Returns:
+            One CodeQLResult per snippet, in input order
+        """
+        results: List[Optional[CodeQLResult]] = [None] * len(snippets)
+        cache_keys = [self._cache_key(snippet, language) for snippet in snippets]
+
+        pending = []
+        for i, cache_key in enumerate(cache_keys):
+            results[i] = self._cache_lookup(cache_key, snippets[i], language,
+                                            f"snippet_{i:05d}{self._get_file_extension(language)}")
+            if results[i] is None:
+                results[i], _ = self._apply_preflight(snippets[i], language)
+            if results[i] is None:
+                pending.append(i)
+
+        logger.info(f"Batch analysis of {len(snippets)} snippets: {len(snippets) - len(pending)} cached or rejected, {len(pending)} to analyze")
+        if not pending:
+            return results
+
+        return self._run_job(self._analyze_batch_uncached, snippets, language, pending, cache_keys, results)
+
+    def _analyze_batch_uncached(self, snippets: List[str], language: str, pending: List[int],
+                                cache_keys: List[Optional[str]], results: List[Optional[CodeQLResult]]) -> List[CodeQLResult]:
+        """
+        Analyze the pending snippets of a batch in one database.
+
+        Args:
+            snippets: All snippets of the batch
+            language: Programming language
+            pending: Indices of the snippets to analyze
+            cache_keys: Result cache keys per snippet
+            results: Results per snippet, filled in place for the pending indices
+
+        Returns:
+            The completed results list
+        """
+        source_bytes = sum(len(snippets[i].encode('utf-8')) for i in pending)
+        workspace = self.create_workspace(language, source_bytes)
+        try:
+            extension = self._get_file_extension(language)
+            filenames = {}
+            for i in pending:
+                filename = f"snippet_{i:05d}"
+                self.save_code_snippet(snippets[i], language, filename, directory=workspace.source_dir)
+                filenames[i] = filename
+
+            failure_log = os.path.join(workspace.db_root, 'build_failures.txt')
+            plan = self.plan_resources()
+            logger.info(f"Resource plan for batch job {workspace.job_id}: {plan}")
+            queries = self.plan_queries('\n'.join(snippets[i] for i in pending), language).queries
+            db_path = self.create_codeql_database(
+                language, workspace.source_dir, db_path=workspace.db_path, build_failure_log=failure_log, plan=plan
+            )
+            failed_targets = set()
+            if os.path.exists(failure_log):
+                with open(failure_log, 'r') as file:
+                    failed_targets = {line.strip() for line in file if line.strip()}
+
+            if not db_path:
+                if failed_targets and failed_targets >= set(filenames.values()):
+                    # Nothing could be built, so there was nothing to extract
+                    for i in pending:
+                        results[i] = CodeQLResult("Error", f"[ERROR]: Failed to build snippet #{i}.")
+                    return results
+                raise RuntimeError("Failed to create CodeQL database for the batch.")
+
+            sarif_path = self.run_queries(db_path, language, workspace.sarif_path, plan=plan, queries=queries)
+            if not sarif_path:
+                raise RuntimeError(
+                    f"Failed to run CodeQL queries. No query files (.ql) found in {self.codeql_repo_path}. "
+                    "Please ensure CodeQL is properly installed with query packs."
+                )
+
+            self._record_profile(workspace.job_id, language, sarif_path)
+            findings = self.process_sarif_results(sarif_path)
+            per_file = self.split_findings_by_file(
+                findings, [f"{name}{extension}" for name in filenames.values()]
+            )
+
+            for i, filename in filenames.items():
+                if filename in failed_targets:
+                    results[i] = CodeQLResult("Error", f"[ERROR]: Failed to build snippet #{i}.")
+                    continue
+                findings = per_file[f"{filename}{extension}"]
+                vul_type, report = self.format_vulnerability_report(findings)
+                results[i] = CodeQLResult(vul_type, report, findings)
+                self._cache_store(cache_keys[i], results[i], snippets[i])
+
+            logger.info(f"Batch analysis completed: {len(pending)} analyzed, {len(failed_targets)} failed to build")
+            return results
+        finally:
+            self.cleanup_workspace(workspace)
+
+    def _analyze_uncached(self, code_snippet: str, language: str, queries: List[str] = None) -> CodeQLResult:
+        """
+        Run the full CodeQL pipeline on a code snippet.
+
+        Args:
+            code_snippet: The code to analyze
+            language: Programming language ('python', 'c', 'cpp', etc.)
+            queries: Query files to run instead of the whole top25 suite (optional)
+
+        Returns:
+            CodeQLResult with the report and structured findings
+        """
+        workspace = None
+        db_key = self._database_key(code_snippet, language)
+        checkout = self.db_store.acquire(db_key) if db_key else None
+        retained_db, retained_exclusive = checkout or (None, False)
+        try:
+            # Create an isolated workspace for this analysis
+            source_bytes = len(code_snippet.encode('utf-8'))
+            workspace = self.create_workspace(language, source_bytes)
+            analysis_id = workspace.job_id
+            logger.info(f"Starting code analysis with ID: {analysis_id} for language: {language}")
+
+            # Save code snippet to file
+            logger.debug(f"Saving code snippet of length {len(code_snippet)} to file")
+            stage_start = time.monotonic()
+            code_path = self.save_code_snippet(code_snippet, language, f"code_{analysis_id}", directory=workspace.source_dir)
+            self._record_stage(workspace, 'source', time.monotonic() - stage_start)
+            logger.info(f"Code saved to: {code_path}")
+
+            # Create a CodeQL database (the Makefile for C/C++ is generated inside the job's source dir)
+            logger.debug(f"Creating CodeQL database for {language}")
+            plan = self.plan_resources()
+            logger.info(f"Resource plan for job {analysis_id}: {plan}")
+            if retained_db:
+                # Same source was extracted before: go straight to query evaluation
+                logger.info(f"Reusing retained database {db_key} for job {analysis_id}")
+                if retained_exclusive:
+                    db_path = retained_db
+                else:
+                    # Another job evaluates on the stored copy: query a clone instead of waiting for it
+                    clone_database(retained_db, workspace.db_path)
+                    db_path = workspace.db_path
+                self._record_metric('db_reuses')
+                with self._metrics_lock:
+                    saved_seconds = self.metrics['db_create_seconds_avg']
+                self._record_metric('db_reuse_saved_seconds', saved_seconds)
+            else:
+                db_start = time.monotonic()
+                db_path = self.create_codeql_database(language, workspace.source_dir, db_path=workspace.db_path, plan=plan)
+                if db_path:
+                    self._record_average('db_create_seconds_avg', time.monotonic() - db_start)
+                    self._record_stage(workspace, 'database', time.monotonic() - db_start)
+                    self._learn_database_size(db_path, source_bytes)
+
+            if not db_path:
+                vul_type = "Error"
+                logger.error("Failed to create CodeQL database")
+                # Check if CodeQL is installed
+                try:
+                    logger.debug("Checking if CodeQL is installed")
+                    result = self.codeql.run(['codeql', '--version'], timeout=30)
+                    logger.debug(f"CodeQL version: {result.stdout.strip()}")
+                except Exception as e:
+                    logger.error(f"CodeQL not found or not working: {e}")
+                    raise RuntimeError(f"Failed to create CodeQL database. Error: CodeQL not found or not working: {e}")
+
+                raise RuntimeError(
+                    "Failed to create CodeQL database. The database creation process timed out or failed. Please try with a smaller code sample."
+                )
+
+            logger.info(f"CodeQL database created at: {db_path}")
+
+            # Run queries (the planner may skip those that cannot fire on this snippet)
             logger.debug(f"Running CodeQL queries on database: {db_path}")
-            results_file = os.path.join(self.database_path, f"results_{analysis_id}.sarif")
-            sarif_path = self.run_queries(db_path, language, results_file)
+            targeted = queries is not None
+            if not targeted:
+                queries = self.plan_queries(code_snippet, language).queries
+            query_start = time.monotonic()
+            sarif_path = self.run_queries(db_path, language, workspace.sarif_path, plan=plan, queries=queries)
+            if sarif_path and not targeted:
+                # Only suite runs are comparable, not verification subsets
+                self._record_average('query_seconds_avg', time.monotonic() - query_start)
+                if not retained_db:
+                    self._record_stage(workspace, 'queries', time.monotonic() - query_start)
 
             if not sarif_path:
                 vul_type = "Error"
                 logger.error("Failed to run CodeQL queries")
+                if retained_db:
+                    # Do not keep serving a database that fails to evaluate
+                    self.db_store.release(db_key, retained_exclusive)
+                    self.db_store.discard(db_key)
+                    retained_db = None
                 raise RuntimeError(
                     f"Failed to run CodeQL queries. No query files (.ql) found in {self.codeql_repo_path}. "
                     "Please ensure CodeQL is properly installed with query packs."
@@ -502,20 +2323,29 @@ class CodeQLAnalyzer:
 
             # Process results
             logger.debug(f"Processing SARIF results from: {sarif_path}")
-            summarized_data = self.process_sarif_results(sarif_path)
-            logger.info(f"Processed {len(summarized_data)} vulnerability findings")
+            stage_start = time.monotonic()
+            findings = self.process_sarif_results(sarif_path)
+            self._record_stage(workspace, 'sarif', time.monotonic() - stage_start)
+            logger.info(f"Processed {len(findings)} vulnerability findings")
+            source_name = os.path.basename(code_path)
+            if retained_db:
+                # The retained database was extracted from an earlier job's file
+                stored_name = self.db_store.source_name(db_key)
+                if stored_name and stored_name != source_name:
+                    findings = self._rename_source(findings, stored_name, source_name)
 
             # Format report
             logger.debug("Formatting vulnerability report")
-            vul_type, report = self.format_vulnerability_report(summarized_data)
+            vul_type, report = self.format_vulnerability_report(findings)
             logger.info(f"Report generated with length: {len(report)}")
 
-            # Clean up
-            logger.debug("Cleaning up temporary files")
-            self.cleanup_files([code_path, db_path, sarif_path], language=language)
-            logger.info("Cleanup completed")
+            profile = self._record_profile(analysis_id, language, sarif_path)
+
+            # Keep the finalized database (with its evaluation cache) for follow-up runs
+            if db_key and not retained_db:
+                self.db_store.put(db_key, db_path, source_name=source_name)
 
-            return vul_type, report
+            return CodeQLResult(vul_type, report, findings, profile=profile)
 
         except subprocess.CalledProcessError as e:
             logger.error(f"Subprocess error: {e}")
@@ -533,6 +2363,181 @@ class CodeQLAnalyzer:
             logger.error(f"Error traceback: {traceback.format_exc()}")
             raise  # Re-raise to propagate error
 
+        finally:
+            if retained_db:
+                self.db_store.release(db_key, retained_exclusive)
+            # Clean up only this job's workspace
+            if workspace:
+                logger.debug("Cleaning up job workspace")
+                self.cleanup_workspace(workspace)
+                logger.info("Cleanup completed")
+
+    def _safe_member_path(self, root: str, name: str) -> str:
+        """Resolve an archive member below root, rejecting absolute and escaping paths."""
+        normalized = os.path.normpath(name.replace('\\', '/'))
+        if os.path.isabs(normalized) or normalized == '..' or normalized.startswith('../'):
+            raise UnsafeArchiveError(f"Archive member escapes the project root: {name}")
+        return os.path.join(root, normalized)
+
+    def _copy_member(self, source, target_path: str, budget: List[int]) -> None:
+        """Stream one archive member to disk, enforcing the remaining size budget."""
+        os.makedirs(os.path.dirname(target_path), exist_ok=True)
+        with open(target_path, 'wb') as target:
+            while True:
+                chunk = source.read(1024 * 1024)
+                if not chunk:
+                    break
+                budget[0] -= len(chunk)
+                if budget[0] < 0:
+                    raise UnsafeArchiveError(f"Project archive exceeds {self.max_project_bytes} bytes uncompressed")
+                target.write(chunk)
+
+    def extract_project_archive(self, archive_path: str, destination: str) -> Tuple[int, int]:
+        """
+        Safely extract a tar or zip project archive.
+
+        Only regular files and directories are extracted. Absolute paths,
+        '..' components, links and device files are rejected, and the total
+        uncompressed size and file count are capped while streaming, so
+        decompression bombs stop early.
+
+        Args:
+            archive_path: Path to the uploaded archive
+            destination: Directory to extract into
+
+        Returns:
+            Tuple of (number of extracted files, number of extracted bytes)
+
+        Raises:
+            UnsafeArchiveError: If the archive is not a tar/zip file, is unsafe or too large
+        """
+        budget = [self.max_project_bytes]
+        files = 0
+        if zipfile.is_zipfile(archive_path):
+            with zipfile.ZipFile(archive_path) as archive:
+                for member in archive.infolist():
+                    target_path = self._safe_member_path(destination, member.filename)
+                    if member.is_dir():
+                        os.makedirs(target_path, exist_ok=True)
+                        continue
+                    if stat.S_ISLNK(member.external_attr >> 16):
+                        raise UnsafeArchiveError(f"Links are not allowed in project archives: {member.filename}")
+                    files += 1
+                    if files > self.max_project_files:
+                        raise UnsafeArchiveError(f"Project archive has more than {self.max_project_files} files")
+                    with archive.open(member) as source:
+                        self._copy_member(source, target_path, budget)
+        elif tarfile.is_tarfile(archive_path):
+            with tarfile.open(archive_path, 'r:*') as archive:
+                for member in archive:
+                    target_path = self._safe_member_path(destination, member.name)
+                    if member.isdir():
+                        os.makedirs(target_path, exist_ok=True)
+                        continue
+                    if not member.isfile():
+                        raise UnsafeArchiveError(f"Only regular files are allowed in project archives: {member.name}")
+                    files += 1
+                    if files > self.max_project_files:
+                        raise UnsafeArchiveError(f"Project archive has more than {self.max_project_files} files")
+                    self._copy_member(archive.extractfile(member), target_path, budget)
+        else:
+            raise UnsafeArchiveError("Project archive must be a tar (optionally compressed) or zip file")
+        extracted_bytes = self.max_project_bytes - budget[0]
+        logger.info(f"Extracted {files} files ({extracted_bytes} bytes) to {destination}")
+        return files, extracted_bytes
+
+    def analyze_project(self, archive_path: str, language: str = 'cpp', build_command: str = None) -> CodeQLResult:
+        """
+        Analyze a whole multi-file project from a tar/zip archive with one database build.
+
+        Args:
+            archive_path: Path to the project archive
+            language: Programming language of the project
+            build_command: Build to observe, run from the project root (C/C++ only, requires
+                allow_project_build_commands); without it every source file is compiled
+                on its own, and files that fail to compile are skipped
+
+        Returns:
+            CodeQLResult with findings for all project files
+
+        Raises:
+            UnsafeArchiveError: If the archive is rejected
+            ValueError: If a build command is given but not allowed, or for a language
+                other than C/C++
+            CodeQLQueueFull: If the wait queue is full
+        """
+        if build_command and not self.allow_project_build_commands:
+            raise ValueError("Custom build commands are disabled for project analysis")
+        if build_command and language.lower() not in ['c', 'cpp']:
+            raise ValueError(f"Build commands are only supported for C/C++ projects, not {language}")
+        self._record_metric('project_analyses')
+        return self._run_job(self._analyze_project_uncached, archive_path, language, build_command)
+
+    async def analyze_project_async(self, archive_path: str, language: str = 'cpp', build_command: str = None,
+                                    deadline: float = None) -> CodeQLResult:
+        """Cancellable variant of analyze_project (see analyze_code_async)."""
+        return await self._run_cancellable(self.analyze_project, archive_path, language, build_command, deadline=deadline)
+
+    def _analyze_project_uncached(self, archive_path: str, language: str, build_command: str = None) -> CodeQLResult:
+        """Extract, build and analyze a project archive in its own workspace."""
+        # Extract to disk first: the workspace backend is chosen from the uncompressed size
+        staging_dir = os.path.join(self.code_path, language.lower(), f"upload_{uuid.uuid4().hex[:12]}")
+        workspace = None
+        try:
+            file_count, source_bytes = self.extract_project_archive(archive_path, staging_dir)
+            if not file_count:
+                raise UnsafeArchiveError("Project archive is empty")
+            workspace = self.create_workspace(language, source_bytes)
+            os.rmdir(workspace.source_dir)
+            shutil.move(staging_dir, workspace.source_dir)
+
+            failure_log = None
+            if language.lower() in ['c', 'cpp'] and not build_command:
+                # One compile-only invocation per file; broken files are logged and skipped
+                failure_log = os.path.join(workspace.db_root, 'build_failures.txt')
+                compile_commands = self.get_compile_commands(workspace.source_dir, failure_log=failure_log, recursive=True)
+                if not compile_commands:
+                    raise UnsafeArchiveError("Project archive contains no C/C++ source files")
+                script_path = os.path.join(workspace.db_root, 'build.sh')
+                with open(script_path, 'w') as file:
+                    file.write('\n'.join(compile_commands) + '\n')
+                build_command = f"sh {script_path}"
+
+            plan = self.plan_resources()
+            logger.info(f"Resource plan for project job {workspace.job_id}: {plan}")
+            limits = self.job_limits([workspace.source_dir, workspace.db_root])
+            if limits:
+                # Snippet-sized CPU and wall-clock caps do not fit projects; project_timeout bounds each stage
+                limits.cpu_seconds = limits.wall_clock_seconds = None
+            db_path = self.create_codeql_database(
+                language, workspace.source_dir, db_path=workspace.db_path,
+                plan=plan, build_command=build_command, timeout=self.project_timeout, limits=limits
+            )
+            if not db_path:
+                raise RuntimeError("Failed to create CodeQL database for the project.")
+
+            sarif_path = self.run_queries(db_path, language, workspace.sarif_path, plan=plan,
+                                          timeout=self.project_timeout, limits=limits)
+            if not sarif_path:
+                raise RuntimeError("Failed to run CodeQL queries on the project.")
+
+            self._record_profile(workspace.job_id, language, sarif_path)
+            findings = self.process_sarif_results(sarif_path)
+            vul_type, report = self.format_vulnerability_report(findings)
+
+            diagnostics = []
+            if failure_log and os.path.exists(failure_log):
+                with open(failure_log, 'r') as file:
+                    diagnostics = [f"Failed to compile: {line.strip()}" for line in file if line.strip()]
+            logger.info(f"Project analysis completed: {file_count} files, {len(findings)} findings, "
+                        f"{len(diagnostics)} failed to compile")
+            return CodeQLResult(vul_type, report, findings, diagnostics=diagnostics)
+        finally:
+            if os.path.exists(staging_dir):
+                self.cleanup_files([staging_dir])
+            if workspace:
+                self.cleanup_workspace(workspace)
+
     def cleanup_files(self, file_paths: List[str], language: str = None) -> None:
         """
         Clean up temporary files and directories.
@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+"""
+Bulk CodeQL Scanner
+
+Runs CodeQL over every snippet of a dataset with a pool of worker
+processes and streams one JSON line per snippet to the output file as
+analyses finish. The output doubles as the checkpoint: rerunning the same
+command skips every snippet already in it, so an interrupted run resumes
+where it stopped.
+
+Datasets use the same columns as ``VulnerabilityDataset``:
+``processed_func`` for CSV and ``code`` for JSON / JSON lines.
+
+Usage:
+    python -m modules.codeql_bulk_scan --data_file data.csv --output_file codeql_results.jsonl \
+        --codeql_repo ~/codeql-home/codeql-repo --workers 4
+"""
+
+import os
+import sys
+import csv
+import json
+import time
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Column holding the code, per data type (as in VulnerabilityDataset)
+CODE_COLUMNS = {'csv': 'processed_func', 'json': 'code'}
+
+# Analyzer of the current worker process
+_analyzer = None
+
+
+def iter_dataset(file_path: str, data_type: str) -> Iterator[Tuple[str, str]]:
+    """
+    Stream (idx, code) pairs from a dataset without loading it whole.
+
+    Args:
+        file_path: CSV, JSON array or JSON lines file
+        data_type: 'csv' or 'json'
+
+    Returns:
+        Iterator over (idx, code); idx is the row index, as in VulnerabilityDataset
+    """
+    column = CODE_COLUMNS[data_type]
+    if data_type == 'csv':
+        csv.field_size_limit(sys.maxsize)
+        with open(file_path, 'r', encoding='utf-8', newline='') as file:
+            for idx, row in enumerate(csv.DictReader(file)):
+                yield str(idx), row[column]
+        return
+
+    with open(file_path, 'r', encoding='utf-8') as file:
+        first = file.read(1)
+        while first and first.isspace():
+            first = file.read(1)
+        file.seek(0)
+        if first == '[':
+            for idx, item in enumerate(json.load(file)):
+                yield str(idx), item[column]
+        else:
+            for idx, line in enumerate(line for line in file if line.strip()):
+                yield str(idx), json.loads(line)[column]
+
+
+def load_completed(output_file: str, retry_errors: bool = False) -> Set[str]:
+    """
+    Read the ids already in the output and drop a partially written last line.
+
+    Args:
+        output_file: JSONL output of a previous run
+        retry_errors: Treat snippets whose analysis failed as not done
+
+    Returns:
+        Ids of the completed snippets
+    """
+    completed: Set[str] = set()
+    if not os.path.exists(output_file):
+        return completed
+
+    valid_bytes = 0
+    with open(output_file, 'rb') as file:
+        for line in file:
+            if not line.endswith(b'\n'):
+                break
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                break
+            valid_bytes += len(line)
+            if retry_errors and record.get('vul_type') == 'Error':
+                continue
+            completed.add(record['idx'])
+
+    if valid_bytes < os.path.getsize(output_file):
+        logger.warning(f"Truncating a partially written record at byte {valid_bytes} of {output_file}")
+        with open(output_file, 'r+b') as file:
+            file.truncate(valid_bytes)
+    return completed
+
+
+def _init_worker(analyzer_kwargs: Dict, cpu_sets: List[List[int]], counter) -> None:
+    """Create the worker's analyzer and pin the worker to its share of the cores."""
+    global _analyzer
+    with counter.get_lock():
+        worker_index = counter.value
+        counter.value += 1
+    if cpu_sets and hasattr(os, 'sched_setaffinity'):
+        # The analyzer plans --threads from the affinity mask, so workers do not oversubscribe
+        os.sched_setaffinity(0, cpu_sets[worker_index % len(cpu_sets)])
+
+    from modules.codeql_analyzer import CodeQLAnalyzer
+    _analyzer = CodeQLAnalyzer(**analyzer_kwargs)
+
+
+def _scan_chunk(chunk: List[Tuple[str, str]], language: str) -> List[Dict]:
+    """Analyze a chunk of snippets in a worker (one database per chunk if it has several)."""
+    start = time.monotonic()
+    try:
+        if len(chunk) == 1:
+            results = [_analyzer.analyze(chunk[0][1], language)]
+        else:
+            results = _analyzer.analyze_batch([code for _, code in chunk], language)
+    except Exception as e:
+        seconds = (time.monotonic() - start) / len(chunk)
+        return [
+            {'idx': idx, 'vul_type': 'Error', 'report': f"[ERROR]: CodeQL analysis failed:\n {e}", 'seconds': seconds}
+            for idx, _ in chunk
+        ]
+
+    seconds = (time.monotonic() - start) / len(chunk)
+    return [
+        {
+            'idx': idx,
+            'vul_type': result.vul_type,
+            'report': result.report,
+            'findings': [finding.to_dict() for finding in result.findings],
+            'cached': result.cached,
+            'diagnostics': result.diagnostics,
+            'seconds': seconds,
+        }
+        for (idx, _), result in zip(chunk, results)
+    ]
+
+
+def _chunks(items: Iterator[Tuple[str, str]], size: int) -> Iterator[List[Tuple[str, str]]]:
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _split_cpus(workers: int) -> List[List[int]]:
+    """Split the available cores into one disjoint set per worker."""
+    if not hasattr(os, 'sched_getaffinity'):
+        return []
+    cpus = sorted(os.sched_getaffinity(0))
+    if len(cpus) < workers:
+        return []
+    per_worker = len(cpus) // workers
+    return [cpus[i * per_worker:(i + 1) * per_worker] for i in range(workers)]
+
+
+class BulkScanner:
+    """Scans a dataset with CodeQL across a process pool, resumably."""
+
+    def __init__(self, analyzer_kwargs: Dict, workers: int = 2, batch_size: int = 1,
+                 language: str = 'cpp', checkpoint_every: int = 50):
+        """
+        Initialize the scanner.
+
+        Args:
+            analyzer_kwargs: Keyword arguments of each worker's CodeQLAnalyzer
+            workers: Number of worker processes
+            batch_size: Snippets per task; more than one shares a database per task
+            language: Language of the snippets
+            checkpoint_every: Records between fsyncs of the output file
+        """
+        self.analyzer_kwargs = analyzer_kwargs
+        self.workers = workers
+        self.batch_size = max(1, batch_size)
+        self.language = language
+        self.checkpoint_every = checkpoint_every
+
+    def scan(self, data_file: str, data_type: str, output_file: str, retry_errors: bool = False,
+             limit: Optional[int] = None) -> Dict[str, float]:
+        """
+        Scan a dataset, appending to (and resuming from) the output file.
+
+        Args:
+            data_file: Dataset to scan
+            data_type: 'csv' or 'json'
+            output_file: JSONL file receiving one record per snippet
+            retry_errors: Rescan snippets whose earlier analysis failed
+            limit: Stop after this many dataset rows (optional)
+
+        Returns:
+            Run summary with counts and throughput
+        """
+        completed = load_completed(output_file, retry_errors)
+        if completed:
+            logger.info(f"Resuming: {len(completed)} snippets already in {output_file}")
+
+        def pending() -> Iterator[Tuple[str, str]]:
+            for n, (idx, code) in enumerate(iter_dataset(data_file, data_type)):
+                if limit is not None and n >= limit:
+                    return
+                if idx not in completed:
+                    yield idx, code
+
+        context = multiprocessing.get_context('spawn')
+        counter = context.Value('i', 0)
+        chunks = _chunks(pending(), self.batch_size)
+        max_in_flight = self.workers * 2
+        stats = {'scanned': 0, 'errors': 0, 'cached': 0, 'skipped': len(completed)}
+        start = time.monotonic()
+        last_report = start
+
+        with open(output_file, 'a', encoding='utf-8') as out, ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=context,
+            initializer=_init_worker,
+            initargs=(self.analyzer_kwargs, _split_cpus(self.workers), counter)
+        ) as executor:
+            in_flight = set()
+            try:
+                while True:
+                    # Keep a bounded window of tasks so the dataset is never materialized
+                    for chunk in chunks:
+                        in_flight.add(executor.submit(_scan_chunk, chunk, self.language))
+                        if len(in_flight) >= max_in_flight:
+                            break
+                    if not in_flight:
+                        break
+
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        for record in future.result():
+                            out.write(json.dumps(record, ensure_ascii=False) + '\n')
+                            stats['scanned'] += 1
+                            stats['errors'] += record['vul_type'] == 'Error'
+                            stats['cached'] += bool(record.get('cached'))
+                            if stats['scanned'] % self.checkpoint_every == 0:
+                                out.flush()
+                                os.fsync(out.fileno())
+
+                    now = time.monotonic()
+                    if now - last_report >= 30:
+                        last_report = now
+                        logger.info(f"Scanned {stats['scanned']} snippets "
+                                    f"({stats['scanned'] / ((now - start) / 60):.1f} snippets/min, {stats['errors']} errors)")
+            except KeyboardInterrupt:
+                logger.warning("Interrupted, finished records are kept for resuming")
+                executor.shutdown(wait=False, cancel_futures=True)
+                raise
+            finally:
+                out.flush()
+                os.fsync(out.fileno())
+
+        elapsed = time.monotonic() - start
+        stats['seconds'] = elapsed
+        stats['snippets_per_minute'] = stats['scanned'] / (elapsed / 60) if elapsed > 0 else 0.0
+        return stats
+
+
+def main():
+    """Main function for CLI usage."""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Bulk CodeQL scanning of a dataset")
+
+    # Data arguments
+    parser.add_argument("--data_file", type=str, required=True,
+                       help="Path to input data file")
+    parser.add_argument("--data_type", type=str, default="csv",
+                       choices=list(CODE_COLUMNS.keys()),
+                       help="Type of input data (csv: processed_func column, json: code field)")
+    parser.add_argument("--output_file", type=str, required=True,
+                       help="JSONL file to append results to (resumed if it exists)")
+    parser.add_argument("--language", type=str, default="cpp",
+                       help="Language of the snippets")
+    parser.add_argument("--limit", type=int,
+                       help="Only scan the first N rows")
+    parser.add_argument("--retry_errors", action="store_true",
+                       help="Rescan snippets whose earlier analysis failed (the new record is appended after the old one)")
+
+    # Pool arguments
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 4) // 4),
+                       help="Number of worker processes")
+    parser.add_argument("--batch_size", type=int, default=1,
+                       help="Snippets analyzed per CodeQL database")
+
+    # CodeQL arguments
+    parser.add_argument("--codeql_repo", type=str, required=True,
+                       help="Path to the CodeQL repository")
+    parser.add_argument("--query_pack", type=str,
+                       help="Output root of modules.codeql_querypack (optional)")
+    parser.add_argument("--work_dir", type=str, default="codeql_tmp/bulk",
+                       help="Directory for job workspaces")
+    parser.add_argument("--cache_path", type=str,
+                       help="Result cache directory shared by the workers (optional)")
+    parser.add_argument("--build_mode", type=str, default="compile",
+                       choices=["make", "compile"],
+                       help="C/C++ build strategy")
+    parser.add_argument("--workspace_backend", type=str, default="disk",
+                       choices=["disk", "tmpfs"],
+                       help="Where job workspaces live")
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    analyzer_kwargs = {
+        'code_path': os.path.join(args.work_dir, 'code'),
+        'database_path': os.path.join(args.work_dir, 'db'),
+        'codeql_repo_path': args.codeql_repo,
+        'cache_path': args.cache_path,
+        'query_pack_path': args.query_pack,
+        'build_mode': args.build_mode,
+        'preflight': ['compiler'] if args.language in ('c', 'cpp') else None,
+        'workspace_backend': args.workspace_backend,
+        # Each worker gets an equal share of the memory
+        'ram_fraction': 0.75 / args.workers,
+    }
+    scanner = BulkScanner(analyzer_kwargs, workers=args.workers, batch_size=args.batch_size, language=args.language)
+    stats = scanner.scan(args.data_file, args.data_type, args.output_file, retry_errors=args.retry_errors, limit=args.limit)
+
+    print(f"Scanned {stats['scanned']} snippets in {stats['seconds']:.1f}s "
+          f"({stats['snippets_per_minute']:.1f} snippets/min), "
+          f"{stats['skipped']} already done, {stats['errors']} errors, {stats['cached']} cache hits")
+
+
+if __name__ == "__main__":
+    main()
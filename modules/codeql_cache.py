@@ -0,0 +1,560 @@
+import os
+import re
+import json
+import shutil
+import time
+import hashlib
+import logging
+import threading
+from typing import Dict, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def canonical_source_hash(code_snippet: str, language: str) -> str:
+    """
+    Hash a code snippet after stripping comments and normalizing whitespace.
+
+    C/C++ sources are canonicalized with the tree-sitter machinery in
+    ``modules/mask.py``, which keeps literals and line breaks intact. Python
+    (and C/C++ that cannot be canonicalized) is only stripped of trailing
+    whitespace since indentation is significant there. Either way line
+    numbers are preserved, so cached findings can be rebased onto a new
+    snippet with rebase_cached_entry().
+
+    Args:
+        code_snippet: The code to hash
+        language: Programming language ('python', 'c', 'cpp', etc.)
+
+    Returns:
+        Hex digest of the canonical source
+    """
+    if language.lower() in ['c', 'cpp']:
+        try:
+            from modules.mask import canonicalize_source
+            canonical = canonicalize_source(code_snippet, language=language)
+        except Exception as e:
+            logger.warning(f"Canonicalization failed, stripping trailing whitespace only: {e}")
+            canonical = _strip_trailing_whitespace(code_snippet)
+    else:
+        canonical = _strip_trailing_whitespace(code_snippet)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def _strip_trailing_whitespace(code_snippet: str) -> str:
+    """Strip trailing whitespace of every line, keeping all line breaks."""
+    return '\n'.join(line.rstrip() for line in code_snippet.split('\n'))
+
+
+def _column_maps(code_snippet: str, language: str) -> Optional[List[List[Optional[int]]]]:
+    """Per-line original -> canonical column maps of a snippet (None if columns are unchanged)."""
+    if language.lower() not in ['c', 'cpp']:
+        return None
+    try:
+        from modules.mask import canonicalize_source_with_columns
+        return canonicalize_source_with_columns(code_snippet, language=language)[1]
+    except Exception:
+        return None
+
+
+# Location format of the vulnerability report (SarifLocation.describe)
+LOCATION_PATTERN = re.compile(r'line (\d+), column (\d+)-(\d+)')
+
+# Layout of cache entries; entries of another layout are treated as misses
+ENTRY_FORMAT = 2
+
+
+def rebase_cached_entry(entry: Dict, code_snippet: str, language: str, filename: str) -> Dict:
+    """
+    Rebase a cached result onto the snippet it is served for.
+
+    The cached snippet and the new one share their canonical form, so line
+    numbers are equal but columns may differ where whitespace or comments
+    differ. Every "line L, column S-E" location of the report and every
+    location and code flow step of the findings is mapped through the
+    canonical columns, and the file name of the cached analysis is replaced
+    with ``filename``.
+
+    Args:
+        entry: Cache entry (with the 'source' it was computed from)
+        code_snippet: The snippet the result is served for
+        language: Programming language
+        filename: File name to report for the snippet
+
+    Returns:
+        Entry with 'report' and 'findings' rebased
+    """
+    source = entry.get('source')
+    old_maps = _column_maps(source, language) if source is not None and source != code_snippet else None
+    new_maps = _column_maps(code_snippet, language) if old_maps else None
+
+    def rebase_column(line: Optional[int], column: Optional[int], end: bool = False) -> Optional[int]:
+        # End columns are exclusive, so they are mapped through the last character they cover
+        if (not old_maps or not new_maps or not isinstance(line, int) or not isinstance(column, int)
+                or not 1 <= line <= min(len(old_maps), len(new_maps))):
+            return column
+        old_line, new_line = old_maps[line - 1], new_maps[line - 1]
+        index = column - (2 if end else 1)
+        if not 0 <= index < len(old_line) or old_line[index] is None:
+            return column
+        for new_column, canonical in enumerate(new_line):
+            if canonical == old_line[index]:
+                return new_column + (2 if end else 1)
+        return column
+
+    def rebase_location(match) -> str:
+        line, start, end = (int(group) for group in match.groups())
+        return f"line {line}, column {rebase_column(line, start)}-{rebase_column(line, end, end=True)}"
+
+    def rebase_step(location: Dict) -> Dict:
+        location = dict(location)
+        if location.get('uri'):
+            location['uri'] = os.path.join(os.path.dirname(location['uri']), filename)
+        location['start_column'] = rebase_column(location.get('start_line'), location.get('start_column'))
+        location['end_column'] = rebase_column(location.get('end_line'), location.get('end_column'), end=True)
+        return location
+
+    old_names = {
+        os.path.basename(location['uri'])
+        for finding in entry.get('findings', [])
+        for location in finding.get('locations', []) + [step for flow in finding.get('code_flows', []) for step in flow]
+        if location.get('uri')
+    }
+
+    def rebase_text(text: str) -> str:
+        text = LOCATION_PATTERN.sub(rebase_location, text)
+        for old_name in old_names:
+            text = text.replace(old_name, filename)
+        return text
+
+    findings = [
+        {
+            **finding,
+            'message': rebase_text(finding.get('message', '')),
+            'locations': [rebase_step(location) for location in finding.get('locations', [])],
+            'code_flows': [[rebase_step(step) for step in flow] for flow in finding.get('code_flows', [])],
+        }
+        for finding in entry.get('findings', [])
+    ]
+    return {**entry, 'report': rebase_text(entry.get('report', '')), 'findings': findings}
+
+
+def query_pack_fingerprint(query_path: str) -> str:
+    """
+    Fingerprint the query files (.ql/.qll) under a query directory.
+
+    Args:
+        query_path: Directory containing the query suite
+
+    Returns:
+        Hex digest over the relative paths and contents of all query files
+    """
+    digest = hashlib.sha256()
+    if not os.path.isdir(query_path):
+        digest.update(query_path.encode('utf-8'))
+        return digest.hexdigest()
+    for root, dirs, files in os.walk(query_path):
+        dirs.sort()
+        for name in sorted(files):
+            if not name.endswith(('.ql', '.qll')):
+                continue
+            full_path = os.path.join(root, name)
+            digest.update(os.path.relpath(full_path, query_path).encode('utf-8'))
+            with open(full_path, 'rb') as file:
+                digest.update(file.read())
+    return digest.hexdigest()
+
+
+class CodeQLResultCache:
+    """
+    A persistent, content-addressed cache of CodeQL analysis results.
+
+    Each entry is stored as a JSON file named after its key. Entries older
+    than ``ttl`` seconds are treated as misses, and the least recently used
+    entries are evicted once more than ``max_entries`` are stored.
+    """
+    def __init__(self, cache_path: str, max_entries: int = 1000, ttl: int = 7 * 24 * 3600):
+        """
+        Initialize the result cache.
+
+        Args:
+            cache_path: Directory to store cache entries
+            max_entries: Maximum number of entries to keep
+            ttl: Time-to-live of an entry in seconds
+        """
+        self.cache_path = cache_path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._fingerprints: Dict[str, tuple] = {}
+
+        os.makedirs(self.cache_path, exist_ok=True)
+        logger.info(f"CodeQL result cache initialized at {self.cache_path} (max_entries={self.max_entries}, ttl={self.ttl}s)")
+
+    def fingerprint(self, query_path: str) -> str:
+        """
+        Return the fingerprint of a query directory, recomputed only when its files change.
+
+        Args:
+            query_path: Directory containing the query suite
+
+        Returns:
+            Query pack fingerprint
+        """
+        signature = []
+        if os.path.isdir(query_path):
+            for root, _, files in os.walk(query_path):
+                for name in files:
+                    if name.endswith(('.ql', '.qll')):
+                        stat = os.stat(os.path.join(root, name))
+                        signature.append((os.path.join(root, name), stat.st_mtime_ns, stat.st_size))
+        signature = tuple(sorted(signature))
+
+        with self._lock:
+            cached = self._fingerprints.get(query_path)
+            if cached and cached[0] == signature:
+                return cached[1]
+
+        fingerprint = query_pack_fingerprint(query_path)
+        with self._lock:
+            self._fingerprints[query_path] = (signature, fingerprint)
+        return fingerprint
+
+    def make_key(self, code_snippet: str, language: str, query_fingerprint: str, build_config: str = '') -> str:
+        """
+        Build the cache key for a snippet.
+
+        Args:
+            code_snippet: The code to analyze
+            language: Programming language
+            query_fingerprint: Fingerprint of the query pack used for the analysis
+            build_config: Extraction settings and CodeQL version the result depends on
+
+        Returns:
+            Cache key
+        """
+        source_hash = canonical_source_hash(code_snippet, language)
+        key_material = f"{source_hash}:{language.lower()}:{query_fingerprint}:{build_config}"
+        return hashlib.sha256(key_material.encode('utf-8')).hexdigest()
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.cache_path, f"{key}.json")
+
+    def get(self, key: str) -> Optional[Dict]:
+        """
+        Look up a cache entry.
+
+        Args:
+            key: Cache key
+
+        Returns:
+            The stored entry, or None on a miss or an expired entry
+        """
+        entry_path = self._entry_path(key)
+        try:
+            with open(entry_path, 'r') as file:
+                entry = json.load(file)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Discarding unreadable cache entry {entry_path}: {e}")
+            self._remove(entry_path)
+            return None
+
+        if entry.get('format') != ENTRY_FORMAT:
+            logger.info(f"Discarding cache entry of an older format: {key}")
+            self._remove(entry_path)
+            return None
+
+        if time.time() - entry.get('created', 0) > self.ttl:
+            logger.info(f"Cache entry expired: {key}")
+            self._remove(entry_path)
+            return None
+
+        # Refresh mtime so eviction is least-recently-used
+        try:
+            os.utime(entry_path, None)
+        except OSError:
+            pass
+        return entry
+
+    def put(self, key: str, vul_type: str, report: str, findings: List[Dict], source: str = None) -> None:
+        """
+        Store an analysis result.
+
+        Args:
+            key: Cache key
+            vul_type: Vulnerability type of the result
+            report: Formatted vulnerability report
+            findings: Findings of the analysis (SarifFinding.to_dict() records)
+            source: The analyzed snippet, for rebasing locations on later hits
+        """
+        entry = {
+            'format': ENTRY_FORMAT,
+            'created': time.time(),
+            'vul_type': vul_type,
+            'report': report,
+            'findings': findings,
+            'source': source,
+        }
+        entry_path = self._entry_path(key)
+        tmp_path = f"{entry_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'w') as file:
+                json.dump(entry, file)
+            os.replace(tmp_path, entry_path)
+        except Exception as e:
+            logger.warning(f"Failed to write cache entry {entry_path}: {e}")
+            self._remove(tmp_path)
+            return
+        self.evict()
+
+    def evict(self) -> None:
+        """Remove expired entries and the least recently used ones beyond max_entries."""
+        with self._lock:
+            now = time.time()
+            entries = []
+            for item in os.scandir(self.cache_path):
+                if not item.name.endswith('.json'):
+                    continue
+                try:
+                    stat = item.stat()
+                except FileNotFoundError:
+                    continue
+                # mtime is never older than the creation time, so this only drops expired entries
+                if now - stat.st_mtime > self.ttl:
+                    self._remove(item.path)
+                    continue
+                entries.append((stat.st_mtime, item.path))
+
+            overflow = len(entries) - self.max_entries
+            if overflow > 0:
+                entries.sort()
+                for _, path in entries[:overflow]:
+                    self._remove(path)
+                logger.info(f"Evicted {overflow} cache entries")
+
+    def _remove(self, path: str) -> None:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"Failed to remove cache file {path}: {e}")
+
+
+def directory_size(path: str, seen: Set[Tuple[int, int]] = None) -> int:
+    """
+    Return the total size in bytes of the files under a directory.
+
+    Hardlinked files (e.g. the dataset shared by query shard databases) are
+    counted once; pass the same ``seen`` set to count them once across
+    several directories.
+    """
+    seen = set() if seen is None else seen
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                stat = os.lstat(os.path.join(root, name))
+            except FileNotFoundError:
+                continue
+            if stat.st_nlink > 1:
+                if (stat.st_dev, stat.st_ino) in seen:
+                    continue
+                seen.add((stat.st_dev, stat.st_ino))
+            total += stat.st_size
+    return total
+
+
+class CodeQLDatabaseStore:
+    """
+    A content-addressed store of finalized CodeQL databases.
+
+    Databases are moved into ``<store_path>/<key>`` after a successful
+    analysis so follow-up runs over the same source can skip extraction.
+    Each entry has a metadata file whose mtime records its last use; the
+    least recently used entries are evicted once the store exceeds
+    ``max_bytes``. Entries that are checked out are never evicted. CodeQL
+    locks a database's evaluation cache during a query run, so one checkout
+    at a time gets an entry exclusively (and runs queries in place, warming
+    its cache); concurrent checkouts are shared and read-only.
+    """
+    META_FILE = '.retention.json'
+
+    def __init__(self, store_path: str, max_bytes: int = 5 * 1024 ** 3):
+        """
+        Initialize the database store.
+
+        Args:
+            store_path: Directory to keep databases in
+            max_bytes: Disk quota of the store in bytes
+        """
+        self.store_path = store_path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._key_locks: Dict[str, threading.Lock] = {}
+        self._in_use: Dict[str, int] = {}
+
+        os.makedirs(self.store_path, exist_ok=True)
+        logger.info(f"CodeQL database store initialized at {self.store_path} (max_bytes={self.max_bytes})")
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.store_path, key)
+
+    def _meta_path(self, key: str) -> str:
+        return os.path.join(self.store_path, key, self.META_FILE)
+
+    def _read_meta(self, key: str) -> Dict:
+        try:
+            with open(self._meta_path(key), 'r') as file:
+                return json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _write_meta(self, key: str, size: int, **fields) -> None:
+        meta = {**self._read_meta(key), 'size': size, **fields}
+        meta.setdefault('stored', time.time())
+        with open(self._meta_path(key), 'w') as file:
+            json.dump(meta, file)
+
+    def source_name(self, key: str) -> Optional[str]:
+        """Return the file name the stored database's source was extracted under, if recorded."""
+        return self._read_meta(key).get('source_name')
+
+    def _read_size(self, key: str) -> int:
+        try:
+            with open(self._meta_path(key), 'r') as file:
+                return json.load(file).get('size', 0)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return directory_size(self._entry_path(key))
+
+    def acquire(self, key: str) -> Optional[Tuple[str, bool]]:
+        """
+        Check out a stored database.
+
+        The checkout is exclusive if no one else holds the entry: queries may
+        then run on it in place. Otherwise it is shared without waiting: the
+        entry is kept from eviction but must only be read, e.g. cloned with
+        clone_database() before running queries.
+
+        Args:
+            key: Database key
+
+        Returns:
+            Tuple of (path to the database, whether the checkout is exclusive),
+            or None if it is not stored. A checkout must be handed back with
+            release().
+        """
+        with self._lock:
+            entry_path = self._entry_path(key)
+            if not os.path.exists(os.path.join(entry_path, 'codeql-database.yml')):
+                return None
+            self._in_use[key] = self._in_use.get(key, 0) + 1
+            exclusive = self._key_locks.setdefault(key, threading.Lock()).acquire(blocking=False)
+
+        try:
+            os.utime(self._meta_path(key), None)
+        except OSError:
+            pass
+        return entry_path, exclusive
+
+    def release(self, key: str, exclusive: bool = True) -> None:
+        """
+        Hand back a database checked out with acquire().
+
+        After an exclusive checkout the entry size is refreshed, since query
+        runs grow the evaluation cache.
+
+        Args:
+            key: Database key
+            exclusive: Whether the checkout was exclusive
+        """
+        if exclusive:
+            try:
+                if os.path.isdir(self._entry_path(key)):
+                    self._write_meta(key, directory_size(self._entry_path(key)))
+            except OSError as e:
+                logger.warning(f"Failed to update database store entry {key}: {e}")
+        with self._lock:
+            if exclusive:
+                self._key_locks[key].release()
+            self._in_use[key] -= 1
+            if not self._in_use[key]:
+                del self._in_use[key]
+                del self._key_locks[key]
+        self.evict()
+
+    def put(self, key: str, database_path: str, source_name: str = None) -> bool:
+        """
+        Move a finalized database into the store.
+
+        Args:
+            key: Database key
+            database_path: Database to move (it no longer exists afterwards if stored)
+            source_name: File name the source was extracted under, to rebase the
+                locations of later runs on it
+
+        Returns:
+            Whether the database was stored (False if the key is already present)
+        """
+        size = directory_size(database_path)
+        if size > self.max_bytes:
+            logger.info(f"Database {database_path} ({size} bytes) exceeds the store quota, not retained")
+            return False
+        with self._lock:
+            entry_path = self._entry_path(key)
+            if os.path.exists(entry_path):
+                return False
+            try:
+                shutil.move(database_path, entry_path)
+                self._write_meta(key, size, source_name=source_name, stored=time.time())
+            except Exception as e:
+                logger.warning(f"Failed to retain database {database_path}: {e}")
+                shutil.rmtree(entry_path, ignore_errors=True)
+                return False
+        logger.info(f"Retained database {key} ({size} bytes)")
+        self.evict()
+        return True
+
+    def discard(self, key: str) -> None:
+        """Remove a stored database, e.g. one that failed to evaluate."""
+        with self._lock:
+            if key in self._in_use:
+                return
+            shutil.rmtree(self._entry_path(key), ignore_errors=True)
+
+    def evict(self) -> None:
+        """Remove the least recently used databases until the store fits its quota."""
+        with self._lock:
+            entries = []
+            total = 0
+            for item in os.scandir(self.store_path):
+                if not item.is_dir():
+                    continue
+                try:
+                    last_used = os.stat(self._meta_path(item.name)).st_mtime
+                except FileNotFoundError:
+                    last_used = 0
+                size = self._read_size(item.name)
+                total += size
+                entries.append((last_used, item.name, size))
+
+            entries.sort()
+            evicted = 0
+            for _, key, size in entries:
+                if total <= self.max_bytes:
+                    break
+                if key in self._in_use:
+                    continue
+                shutil.rmtree(self._entry_path(key), ignore_errors=True)
+                total -= size
+                evicted += 1
+            if evicted:
+                logger.info(f"Evicted {evicted} retained databases, store now {total} bytes")
+
+    def stats(self) -> Dict[str, int]:
+        """Return the number of stored databases and their total size."""
+        with self._lock:
+            keys = [item.name for item in os.scandir(self.store_path) if item.is_dir()]
+            return {'databases': len(keys), 'bytes': sum(self._read_size(key) for key in keys)}
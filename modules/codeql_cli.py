@@ -0,0 +1,584 @@
+import os
+import sys
+import json
+import time
+import signal
+import select
+import asyncio
+import logging
+import threading
+import subprocess
+import contextvars
+from dataclasses import dataclass, field
+from typing import List, Optional, Set, Tuple
+
+from modules.codeql_cache import directory_size
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+# Runs the wrapped command under rlimits (argv: cpu_seconds memory_bytes file_size_bytes command...,
+# 0 = unlimited). Memory is limited with RLIMIT_DATA, which counts committed heap and anonymous
+# mappings but not the address space the JVM only reserves, so a JVM cannot fail at start-up
+# just because its reservations exceed the limit. The limits are set in this single-threaded wrapper, so the server never forks
+# with preexec_fn, and are inherited by the command. The wrapper waits for the command to learn
+# its CPU time: a SIGKILL only counts as a CPU breach once the soft CPU limit was used up.
+RLIMIT_WRAPPER = r"""
+import os, resource, signal, subprocess, sys
+cpu, memory, file_size = (int(value) for value in sys.argv[1:4])
+if cpu:
+    resource.setrlimit(resource.RLIMIT_CPU, (cpu, cpu + 5))
+if memory:
+    resource.setrlimit(resource.RLIMIT_DATA, (memory, memory))
+if file_size:
+    resource.setrlimit(resource.RLIMIT_FSIZE, (file_size, file_size))
+try:
+    child = subprocess.Popen(sys.argv[4:])
+except OSError as e:
+    sys.stderr.write(f"{e}\n")
+    sys.exit(127)
+signal.signal(signal.SIGTERM, lambda signum, frame: child.send_signal(signum))
+_, status, usage = os.wait4(child.pid, 0)
+if os.WIFSIGNALED(status):
+    signum = os.WTERMSIG(status)
+    if signum == signal.SIGXCPU or (signum == signal.SIGKILL and cpu and usage.ru_utime + usage.ru_stime >= cpu):
+        sys.stderr.write("CPU time limit exceeded\n")
+    elif signum == signal.SIGXFSZ:
+        sys.stderr.write("File size limit exceeded\n")
+    sys.exit(128 + signum)
+sys.exit(os.WEXITSTATUS(status))
+"""
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SERVER_COMMAND = ['codeql', 'execute', 'cli-server']
+
+
+class CodeQLCliServerError(RuntimeError):
+    """Raised when the CLI server dies or stops speaking the protocol."""
+
+
+class CodeQLCancelled(RuntimeError):
+    """Raised when an async CodeQL job was cancelled or ran past its deadline."""
+
+
+class CodeQLResourceLimitError(RuntimeError):
+    """Raised when a CodeQL command exceeded its CPU, memory, file size, disk or wall-clock limit."""
+    def __init__(self, limit: str, message: str):
+        super().__init__(message)
+        self.limit = limit
+
+
+# Messages printed when a process of the build or extraction hit an rlimit
+LIMIT_MARKERS = {
+    'cpu': ('CPU time limit exceeded',),
+    'file_size': ('File size limit exceeded', 'File too large'),
+    'memory': ('virtual memory exhausted', 'out of memory', 'Cannot allocate memory', 'std::bad_alloc',
+               'java.lang.OutOfMemoryError', 'MemoryError'),
+}
+
+# Messages of a JVM that could not start, e.g. because job_memory_mb is too small for the --ram
+# heap; the limit is mis-sized rather than the snippet too large, so these are not breaches
+JVM_STARTUP_FAILURE_MARKERS = ('Could not reserve enough space', 'Error occurred during initialization of VM',
+                               'Could not create the Java Virtual Machine')
+
+
+@dataclass
+class ResourceLimits:
+    """
+    Limits enforced on every process of one CodeQL command.
+
+    cpu_seconds, memory_bytes (data segment, RLIMIT_DATA) and file_size_bytes
+    are set as rlimits by a small wrapper process (see wrap()) and are
+    inherited by the build, compiler and extractor processes the command
+    spawns (CPU time counts per process, over all of its threads). The JVM's
+    own memory is bounded by the --ram budget, which the analyzer keeps
+    below memory_bytes. The disk quota is watched
+    by polling the size of ``disk_paths``; the wall-clock cap bounds the
+    command's timeout.
+    """
+    cpu_seconds: Optional[int] = None
+    memory_bytes: Optional[int] = None
+    file_size_bytes: Optional[int] = None
+    disk_bytes: Optional[int] = None
+    disk_paths: List[str] = field(default_factory=list)
+    wall_clock_seconds: Optional[float] = None
+    poll_interval: float = 0.5
+
+    def wrap(self, command: List[str]) -> List[str]:
+        """
+        Return the command prefixed with the rlimit wrapper, or unchanged if there are no rlimits.
+
+        Limits are applied by the wrapper rather than with preexec_fn, which
+        is not safe in a multi-threaded server.
+        """
+        if resource is None or not (self.cpu_seconds or self.memory_bytes or self.file_size_bytes):
+            return command
+        values = [str(int(value or 0)) for value in (self.cpu_seconds, self.memory_bytes, self.file_size_bytes)]
+        return [sys.executable, '-c', RLIMIT_WRAPPER, *values, *command]
+
+    def cap_timeout(self, timeout: Optional[float]) -> Tuple[Optional[float], bool]:
+        """Return the effective timeout and whether the wall-clock cap is what bounds it."""
+        if self.wall_clock_seconds and (timeout is None or self.wall_clock_seconds < timeout):
+            return self.wall_clock_seconds, True
+        return timeout, False
+
+    def breach(self, returncode: int, stderr: str) -> Optional[str]:
+        """Name the limit a finished command ran into, if any."""
+        if returncode == 0:
+            return None
+        if jvm_startup_failure(stderr):
+            return None
+        # A bare SIGKILL may come from the OOM killer, the disk watcher or a
+        # cancellation; the wrapper reports SIGKILLs at the CPU hard limit on stderr
+        if self.cpu_seconds and returncode == -signal.SIGXCPU:
+            return 'cpu'
+        if self.file_size_bytes and returncode == -signal.SIGXFSZ:
+            return 'file_size'
+        configured = {'cpu': self.cpu_seconds, 'file_size': self.file_size_bytes, 'memory': self.memory_bytes}
+        for limit, markers in LIMIT_MARKERS.items():
+            if configured[limit] and any(marker in (stderr or '') for marker in markers):
+                return limit
+        return None
+
+
+class DiskQuotaWatcher:
+    """Kills a process group once the watched directories grow past a quota."""
+    def __init__(self, limits: ResourceLimits, pid: int):
+        self.limits = limits
+        self.pid = pid
+        self.breached = False
+        self.used_bytes = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._watch, daemon=True)
+
+    def _watch(self) -> None:
+        while not self._stop.wait(self.limits.poll_interval):
+            seen = set()
+            self.used_bytes = sum(directory_size(path, seen) for path in self.limits.disk_paths)
+            if self.used_bytes > self.limits.disk_bytes:
+                self.breached = True
+                kill_process_group(self.pid)
+                return
+
+    def __enter__(self) -> 'DiskQuotaWatcher':
+        if self.limits.disk_bytes and self.limits.disk_paths:
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+
+
+def jvm_startup_failure(stderr: str) -> bool:
+    """Return whether a command failed because its JVM could not start."""
+    return any(marker in (stderr or '') for marker in JVM_STARTUP_FAILURE_MARKERS)
+
+
+def limit_error(limits: ResourceLimits, limit: str, command: List[str]) -> CodeQLResourceLimitError:
+    """Build the error reported for a command that ran into a limit."""
+    values = {
+        'cpu': f"{limits.cpu_seconds} CPU seconds",
+        'memory': f"{(limits.memory_bytes or 0) // (1024 * 1024)} MB of memory",
+        'file_size': f"{(limits.file_size_bytes or 0) // (1024 * 1024)} MB per file",
+        'disk': f"{(limits.disk_bytes or 0) // (1024 * 1024)} MB of workspace disk",
+        'wall_clock': f"{limits.wall_clock_seconds} seconds of wall-clock time",
+    }
+    return CodeQLResourceLimitError(limit, f"'{' '.join(command[:3])}' exceeded its limit of {values[limit]}")
+
+
+def run_limited(command: List[str], timeout: float, limits: ResourceLimits) -> subprocess.CompletedProcess:
+    """
+    Run a command as a subprocess under resource limits.
+
+    Args:
+        command: Full command line
+        timeout: Seconds to wait for the command, further capped by the wall-clock limit
+        limits: Limits to enforce
+
+    Returns:
+        CompletedProcess with text stdout and stderr
+
+    Raises:
+        CodeQLResourceLimitError: If the command ran into a limit
+        subprocess.CalledProcessError: If the command exits with a non-zero code
+        subprocess.TimeoutExpired: If the command did not finish within timeout
+    """
+    timeout, capped = limits.cap_timeout(timeout)
+    process = subprocess.Popen(limits.wrap(command), stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+                               start_new_session=True)
+    with DiskQuotaWatcher(limits, process.pid) as watcher:
+        try:
+            stdout, stderr = process.communicate(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            kill_process_group(process.pid)
+            process.communicate()
+            if capped:
+                raise limit_error(limits, 'wall_clock', command)
+            raise
+        except BaseException:
+            kill_process_group(process.pid)
+            process.wait()
+            raise
+
+    limit = 'disk' if watcher.breached else limits.breach(process.returncode, stderr)
+    if limit:
+        raise limit_error(limits, limit, command)
+    if process.returncode != 0:
+        if limits.memory_bytes and jvm_startup_failure(stderr):
+            logger.error(f"JVM of '{' '.join(command[:3])}' failed to start under the memory limit, raise job_memory_mb")
+        raise subprocess.CalledProcessError(process.returncode, command, stdout, stderr)
+    return subprocess.CompletedProcess(command, 0, stdout, stderr)
+
+
+def kill_process_group(pid: int) -> None:
+    """Kill a process started with start_new_session=True together with its children."""
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+class AsyncCommandJob:
+    """
+    Routes the CodeQL commands of one job to an asyncio event loop.
+
+    The analysis pipeline itself stays synchronous and runs in a worker
+    thread; every command it issues is started on the loop with
+    ``asyncio.create_subprocess_exec`` in its own process group. Cancelling
+    the job (client gone) or reaching its deadline kills those process
+    groups, so database creation and query evaluation stop right away
+    instead of running to completion, and the pipeline's next command
+    fails fast.
+    """
+    def __init__(self, loop: asyncio.AbstractEventLoop, deadline: float = None):
+        """
+        Initialize the job.
+
+        Args:
+            loop: Event loop that runs the commands
+            deadline: Seconds the whole job may take (unbounded if None)
+        """
+        self.loop = loop
+        self.deadline = time.monotonic() + deadline if deadline else None
+        self.cancelled = False
+        self.expired = False
+        self._processes: Set[asyncio.subprocess.Process] = set()
+
+    def is_cancelled(self) -> bool:
+        """Return whether the job was cancelled or ran past its deadline."""
+        if self.deadline and time.monotonic() >= self.deadline:
+            self.expired = True
+        return self.cancelled or self.expired
+
+    def cancel(self, expired: bool = False) -> None:
+        """Cancel the job and kill its running commands (call from the event loop)."""
+        self.cancelled = True
+        self.expired = self.expired or expired
+        for process in list(self._processes):
+            kill_process_group(process.pid)
+
+    def run(self, command: List[str], timeout: float = None, limits: ResourceLimits = None) -> subprocess.CompletedProcess:
+        """
+        Run a command on the event loop and wait for it (call from the worker thread).
+
+        Args:
+            command: Full command line
+            timeout: Seconds to wait for the command, further capped by the job deadline
+            limits: Resource limits of the command (optional)
+
+        Returns:
+            CompletedProcess with text stdout and stderr
+
+        Raises:
+            CodeQLCancelled: If the job is cancelled or past its deadline
+            CodeQLResourceLimitError: If the command ran into one of its limits
+            subprocess.CalledProcessError: If the command exits with a non-zero code
+            subprocess.TimeoutExpired: If the command did not finish in time
+        """
+        if self.is_cancelled():
+            raise CodeQLCancelled("CodeQL job was cancelled" if self.cancelled else "CodeQL job deadline exceeded")
+        capped = False
+        if limits:
+            timeout, capped = limits.cap_timeout(timeout)
+        if self.deadline:
+            remaining = self.deadline - time.monotonic()
+            if timeout is None or remaining < timeout:
+                timeout, capped = remaining, False
+        future = asyncio.run_coroutine_threadsafe(self._run(command, timeout, limits, capped), self.loop)
+        return future.result()
+
+    async def _run(self, command: List[str], timeout: float = None, limits: ResourceLimits = None,
+                   capped: bool = False) -> subprocess.CompletedProcess:
+        limits = limits or ResourceLimits()
+        process = await asyncio.create_subprocess_exec(
+            *limits.wrap(command),
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            start_new_session=True
+        )
+        self._processes.add(process)
+        with DiskQuotaWatcher(limits, process.pid) as watcher:
+            try:
+                stdout, stderr = await asyncio.wait_for(process.communicate(), timeout)
+            except asyncio.TimeoutError:
+                kill_process_group(process.pid)
+                await process.wait()
+                if self.is_cancelled():
+                    raise CodeQLCancelled("CodeQL job deadline exceeded")
+                if capped:
+                    raise limit_error(limits, 'wall_clock', command)
+                raise subprocess.TimeoutExpired(command, timeout)
+            except asyncio.CancelledError:
+                kill_process_group(process.pid)
+                raise
+            finally:
+                self._processes.discard(process)
+
+        if self.cancelled:
+            raise CodeQLCancelled("CodeQL job was cancelled")
+        stdout = stdout.decode(errors='replace')
+        stderr = stderr.decode(errors='replace')
+        limit = 'disk' if watcher.breached else limits.breach(process.returncode, stderr)
+        if limit:
+            raise limit_error(limits, limit, command)
+        if process.returncode != 0:
+            if limits.memory_bytes and jvm_startup_failure(stderr):
+                logger.error(f"JVM of '{' '.join(command[:3])}' failed to start under the memory limit, raise job_memory_mb")
+            raise subprocess.CalledProcessError(process.returncode, command, stdout, stderr)
+        return subprocess.CompletedProcess(command, 0, stdout, stderr)
+
+
+# Async job of the analysis running in the current thread (copied into shard workers)
+current_async_job: contextvars.ContextVar[Optional[AsyncCommandJob]] = contextvars.ContextVar(
+    'current_async_job', default=None
+)
+
+
+class CodeQLCliServer:
+    """
+    A long-lived ``codeql execute cli-server`` process.
+
+    Commands are written to stdin as a JSON array of arguments (without the
+    leading ``codeql``) followed by a NUL byte. The command's output goes to
+    stdout and is terminated by a NUL byte once the command has finished. The
+    protocol does not report exit codes, so callers must verify the artifacts
+    a command is expected to produce.
+    """
+    def __init__(self, command: List[str] = None):
+        """
+        Initialize the server wrapper (the process is started lazily).
+
+        Args:
+            command: Command line that starts the server
+        """
+        self.command = command or DEFAULT_SERVER_COMMAND
+        self.process: Optional[subprocess.Popen] = None
+        self._stderr_lines: List[str] = []
+        self._stderr_thread: Optional[threading.Thread] = None
+
+    def is_alive(self) -> bool:
+        """Return whether the server process is running."""
+        return self.process is not None and self.process.poll() is None
+
+    def start(self) -> None:
+        """Start the server process."""
+        logger.info(f"Starting CodeQL CLI server: {' '.join(self.command)}")
+        self.process = subprocess.Popen(
+            self.command,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            start_new_session=True
+        )
+        self._stderr_lines = []
+        self._stderr_thread = threading.Thread(target=self._drain_stderr, args=(self.process,), daemon=True)
+        self._stderr_thread.start()
+
+    def _drain_stderr(self, process: subprocess.Popen) -> None:
+        """Keep reading stderr so the server never blocks on a full pipe."""
+        for line in iter(process.stderr.readline, b''):
+            self._stderr_lines.append(line.decode(errors='replace'))
+
+    def stop(self) -> None:
+        """Stop the server process."""
+        if self.process is None:
+            return
+        try:
+            self.process.stdin.close()
+        except Exception:
+            pass
+        try:
+            self.process.terminate()
+            self.process.wait(timeout=5)
+        except Exception:
+            self.process.kill()
+        self.process = None
+
+    def run(self, args: List[str], timeout: float = None) -> subprocess.CompletedProcess:
+        """
+        Run one command on the server.
+
+        Args:
+            args: Command arguments, without the leading 'codeql'
+            timeout: Seconds to wait for the command to finish
+
+        Returns:
+            CompletedProcess with the command's stdout and stderr (returncode is always 0)
+
+        Raises:
+            subprocess.TimeoutExpired: If the command did not finish in time (the server is stopped)
+            CodeQLCliServerError: If the server died or the pipe broke
+        """
+        if not self.is_alive():
+            self.start()
+
+        self._stderr_lines.clear()
+        try:
+            self.process.stdin.write(json.dumps(args).encode() + b'\0')
+            self.process.stdin.flush()
+        except (BrokenPipeError, OSError) as e:
+            self.stop()
+            raise CodeQLCliServerError(f"CLI server pipe closed: {e}")
+
+        deadline = time.monotonic() + timeout if timeout else None
+        fd = self.process.stdout.fileno()
+        chunks = []
+        while True:
+            remaining = deadline - time.monotonic() if deadline else None
+            if remaining is not None and remaining <= 0:
+                self.stop()
+                raise subprocess.TimeoutExpired(['codeql'] + args, timeout)
+            ready, _, _ = select.select([fd], [], [], remaining)
+            if not ready:
+                continue
+            chunk = os.read(fd, 65536)
+            if not chunk:
+                stderr = ''.join(self._stderr_lines)
+                self.stop()
+                raise CodeQLCliServerError(f"CLI server exited unexpectedly: {stderr.strip()}")
+            if chunk.endswith(b'\0'):
+                chunks.append(chunk[:-1])
+                break
+            chunks.append(chunk)
+
+        stdout = b''.join(chunks).decode(errors='replace')
+        return subprocess.CompletedProcess(['codeql'] + args, 0, stdout, ''.join(self._stderr_lines))
+
+
+class CodeQLRunner:
+    """
+    Runs CodeQL commands either as fresh subprocesses or on persistent CLI servers.
+
+    In server mode each worker checks out its own server from a pool, so
+    concurrent analyses never interleave on one server. A crashed server is
+    restarted once; if that also fails the command falls back to a
+    subprocess, and after repeated failures server mode is disabled.
+
+    Server mode only covers plain commands: commands with resource limits
+    and commands of async jobs run as their own subprocesses, since neither
+    rlimits nor a kill on cancellation can target one command of a shared
+    server. CodeQLAnalyzer therefore rejects server mode combined with limits.
+    """
+    MAX_SERVER_FAILURES = 3
+
+    def __init__(self, use_server: bool = False, server_command: List[str] = None):
+        """
+        Initialize the runner.
+
+        Args:
+            use_server: Whether to drive persistent CLI servers
+            server_command: Command line that starts a CLI server
+        """
+        self.use_server = use_server
+        self.server_command = server_command or DEFAULT_SERVER_COMMAND
+        self._idle_servers: List[CodeQLCliServer] = []
+        self._lock = threading.Lock()
+        self._server_failures = 0
+        self._version: Optional[str] = None
+
+    def _checkout_server(self) -> CodeQLCliServer:
+        with self._lock:
+            if self._idle_servers:
+                return self._idle_servers.pop()
+        return CodeQLCliServer(self.server_command)
+
+    def _return_server(self, server: CodeQLCliServer) -> None:
+        with self._lock:
+            self._idle_servers.append(server)
+
+    def run(self, command: List[str], timeout: float = None, limits: ResourceLimits = None) -> subprocess.CompletedProcess:
+        """
+        Run a CodeQL command.
+
+        Commands with resource limits always run as their own subprocess,
+        since the limits cannot be applied to a shared CLI server.
+
+        Args:
+            command: Full command line starting with 'codeql'
+            timeout: Seconds to wait for the command to finish
+            limits: Resource limits of the command (optional)
+
+        Returns:
+            CompletedProcess with text stdout and stderr
+
+        Raises:
+            subprocess.CalledProcessError: If the subprocess exits with a non-zero code
+            subprocess.TimeoutExpired: If the command did not finish in time
+            CodeQLCancelled: If the command belongs to an async job that was cancelled
+            CodeQLResourceLimitError: If the command ran into one of its limits
+        """
+        # Commands of async jobs run on the event loop so they can be killed on cancellation
+        job = current_async_job.get()
+        if job is not None:
+            return job.run(command, timeout, limits)
+
+        if limits:
+            return run_limited(command, timeout, limits)
+
+        if self.use_server:
+            server = self._checkout_server()
+            try:
+                for attempt in range(2):
+                    try:
+                        result = server.run(command[1:], timeout=timeout)
+                        with self._lock:
+                            self._server_failures = 0
+                        return result
+                    except CodeQLCliServerError as e:
+                        logger.warning(f"CodeQL CLI server failed (attempt {attempt + 1}): {e}")
+
+                with self._lock:
+                    self._server_failures += 1
+                    if self._server_failures >= self.MAX_SERVER_FAILURES:
+                        logger.error("CodeQL CLI server keeps failing, switching to subprocess mode")
+                        self.use_server = False
+                logger.warning("Falling back to a subprocess for this command")
+            finally:
+                self._return_server(server)
+
+        return subprocess.run(command, check=True, capture_output=True, text=True, timeout=timeout)
+
+    def version(self, timeout: float = 30) -> str:
+        """
+        Return the CodeQL version string, querying the CLI only once.
+
+        Args:
+            timeout: Seconds to wait for the version command
+
+        Returns:
+            The version output of 'codeql --version'
+        """
+        if self._version is None:
+            result = self.run(['codeql', '--version'], timeout=timeout)
+            self._version = result.stdout.strip()
+        return self._version
+
+    def close(self) -> None:
+        """Stop all idle CLI servers."""
+        with self._lock:
+            servers, self._idle_servers = self._idle_servers, []
+        for server in servers:
+            server.stop()
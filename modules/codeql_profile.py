@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+CodeQL Query Profiling
+
+Turns CodeQL evaluator logs into per-query records (evaluation time, tuple
+counts, cache hits) and keeps them on disk, one file per analysis plus a
+running aggregate, so the few queries that dominate analysis time can be
+found and dropped or rewritten.
+
+Profiling is enabled with ``CodeQLAnalyzer(..., profile_path=...)``; the
+analyzer then runs ``database analyze`` with ``--evaluator-log`` and
+``--tuple-counting`` and summarizes the log with ``codeql generate log-summary``.
+
+Usage:
+    python -m modules.codeql_profile --profile_path codeql_tmp/profile --top 10
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+from typing import Dict, List, Optional
+
+from modules.codeql_cli import CodeQLRunner
+
+logger = logging.getLogger(__name__)
+
+AGGREGATE_FILE = 'aggregate.json'
+RUNS_DIR = 'runs'
+SHARED_QUERY = '(shared)'
+
+
+def summarize_evaluator_log(runner: CodeQLRunner, log_path: str, summary_path: str) -> str:
+    """
+    Summarize a raw evaluator log into per-predicate JSON objects.
+
+    Args:
+        runner: CodeQL command runner
+        log_path: Evaluator log written by --evaluator-log
+        summary_path: Path to write the summary to
+
+    Returns:
+        Path to the summary
+
+    Raises:
+        subprocess.CalledProcessError: If the summary command fails
+    """
+    command = ['codeql', 'generate', 'log-summary', '--format=predicates', log_path, summary_path]
+    runner.run(command, timeout=120)
+    return summary_path
+
+
+def read_json_stream(path: str) -> List[Dict]:
+    """
+    Read a file of concatenated JSON objects (JSON lines or blank-line separated).
+
+    Args:
+        path: File to read
+
+    Returns:
+        The decoded objects
+    """
+    with open(path, 'r') as file:
+        text = file.read()
+    decoder = json.JSONDecoder()
+    objects = []
+    position = 0
+    while True:
+        while position < len(text) and text[position].isspace():
+            position += 1
+        if position >= len(text):
+            break
+        obj, position = decoder.raw_decode(text, position)
+        objects.append(obj)
+    return objects
+
+
+def _tuple_count(predicate: Dict) -> int:
+    """Total tuples produced by a predicate's pipelines (its result size if no pipeline counts)."""
+    total = 0
+    for pipeline in predicate.get('pipelineRuns', []) or []:
+        total += sum(count for count in pipeline.get('counts', []) if isinstance(count, int))
+    return total or predicate.get('resultSize', 0) or 0
+
+
+def profile_by_query(predicates: List[Dict]) -> List[Dict]:
+    """
+    Roll per-predicate summaries up to the query that caused the work.
+
+    Args:
+        predicates: Objects of a log summary
+
+    Returns:
+        One record per query with millis, predicates, tuples and cache_hits,
+        slowest first
+    """
+    records: Dict[str, Dict] = {}
+    for predicate in predicates:
+        if 'predicateName' not in predicate:
+            continue
+        query = predicate.get('queryCausingWork')
+        query = os.path.basename(query) if query else SHARED_QUERY
+        record = records.setdefault(query, {'query': query, 'millis': 0, 'predicates': 0, 'tuples': 0, 'cache_hits': 0})
+        if predicate.get('evaluationStrategy') == 'CACHE_HIT':
+            record['cache_hits'] += 1
+            continue
+        record['millis'] += predicate.get('millis', 0) or 0
+        record['predicates'] += 1
+        record['tuples'] += _tuple_count(predicate)
+    return sorted(records.values(), key=lambda record: record['millis'], reverse=True)
+
+
+class CodeQLProfileStore:
+    """
+    Persists per-analysis query profiles and a running per-query aggregate.
+
+    Each analysis is written to ``runs/<job_id>.json``; only the newest
+    ``max_runs`` of them are kept, while ``aggregate.json`` accumulates
+    totals for every query over all recorded analyses.
+    """
+    def __init__(self, profile_path: str, max_runs: int = 500):
+        """
+        Initialize the profile store.
+
+        Args:
+            profile_path: Directory to store profiles in
+            max_runs: Maximum number of per-analysis profiles to keep
+        """
+        self.profile_path = profile_path
+        self.max_runs = max_runs
+        self._lock = threading.Lock()
+        os.makedirs(os.path.join(self.profile_path, RUNS_DIR), exist_ok=True)
+
+    def _write_json(self, path: str, data) -> None:
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w') as file:
+            json.dump(data, file, indent=2)
+        os.replace(tmp_path, path)
+
+    def load_aggregate(self) -> Dict[str, Dict]:
+        """Return the per-query aggregate, keyed by query file name."""
+        try:
+            with open(os.path.join(self.profile_path, AGGREGATE_FILE), 'r') as file:
+                return json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def record(self, job_id: str, language: str, records: List[Dict]) -> None:
+        """
+        Store the profile of one analysis and fold it into the aggregate.
+
+        Args:
+            job_id: Analysis job ID
+            language: Programming language of the analysis
+            records: Output of profile_by_query
+        """
+        run = {'job_id': job_id, 'language': language, 'created': time.time(), 'queries': records}
+        with self._lock:
+            self._write_json(os.path.join(self.profile_path, RUNS_DIR, f"{job_id}.json"), run)
+
+            aggregate = self.load_aggregate()
+            for record in records:
+                total = aggregate.setdefault(record['query'], {
+                    'runs': 0, 'millis': 0, 'max_millis': 0, 'predicates': 0, 'tuples': 0, 'cache_hits': 0
+                })
+                total['runs'] += 1
+                total['millis'] += record['millis']
+                total['max_millis'] = max(total['max_millis'], record['millis'])
+                total['predicates'] += record['predicates']
+                total['tuples'] += record['tuples']
+                total['cache_hits'] += record['cache_hits']
+            self._write_json(os.path.join(self.profile_path, AGGREGATE_FILE), aggregate)
+            self._prune_runs()
+
+    def _prune_runs(self) -> None:
+        runs_dir = os.path.join(self.profile_path, RUNS_DIR)
+        runs = sorted((item.stat().st_mtime, item.path) for item in os.scandir(runs_dir) if item.name.endswith('.json'))
+        for _, path in runs[:max(0, len(runs) - self.max_runs)]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def load_run(self, job_id: str) -> Optional[Dict]:
+        """Return the stored profile of one analysis, if it is still kept."""
+        try:
+            with open(os.path.join(self.profile_path, RUNS_DIR, f"{job_id}.json"), 'r') as file:
+                return json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def top_queries(self, limit: int = 10) -> List[Dict]:
+        """
+        Return the queries with the highest total evaluation time.
+
+        Args:
+            limit: Number of queries to return
+
+        Returns:
+            Aggregate records with the query name and mean time per run
+        """
+        ranked = []
+        for query, total in self.load_aggregate().items():
+            ranked.append(dict(total, query=query, mean_millis=total['millis'] / max(total['runs'], 1)))
+        ranked.sort(key=lambda record: record['millis'], reverse=True)
+        return ranked[:limit]
+
+
+def main():
+    """Main function for CLI usage."""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Show the slowest CodeQL queries from recorded profiles")
+    parser.add_argument("--profile_path", type=str, required=True,
+                       help="Profile directory of the analyzer")
+    parser.add_argument("--top", type=int, default=10,
+                       help="Number of queries to show")
+    args = parser.parse_args()
+
+    store = CodeQLProfileStore(args.profile_path)
+    print(f"{'query':<50} {'runs':>6} {'total ms':>12} {'mean ms':>10} {'max ms':>10} {'tuples':>14} {'cache hits':>10}")
+    for record in store.top_queries(args.top):
+        print(f"{record['query']:<50} {record['runs']:>6} {record['millis']:>12} {record['mean_millis']:>10.0f} "
+              f"{record['max_millis']:>10} {record['tuples']:>14} {record['cache_hits']:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+CodeQL Query Pack Builder
+
+Builds the Top25 query suites shipped in ``codeql-queries/`` into versioned
+query packs and compiles them once into a shared compilation cache, so
+``CodeQLAnalyzer`` no longer pays query compilation on every request.
+Rebuilding only recompiles the queries whose source, or whose local
+``.qll`` dependencies, changed since the last build.
+
+Usage:
+    python -m modules.codeql_querypack --language cpp --codeql_repo ~/codeql-home/codeql-repo
+"""
+
+import os
+import re
+import json
+import shutil
+import hashlib
+import logging
+from typing import Dict, List, Optional, Set
+
+from modules.codeql_cli import CodeQLRunner
+
+logger = logging.getLogger(__name__)
+
+# Library packs the copied queries resolve their imports against
+PACK_DEPENDENCIES = {
+    'cpp': {'codeql/cpp-all': '*'},
+    'python': {'codeql/python-all': '*', 'codeql/python-queries': '*'},
+}
+
+MANIFEST_FILE = 'manifest.json'
+COMPILATION_CACHE_DIR = 'compilation-cache'
+
+IMPORT_PATTERN = re.compile(r'^\s*(?:private\s+)?import\s+([A-Za-z_][A-Za-z0-9_]*)\s*$', re.MULTILINE)
+
+
+def pack_dir_name(language: str) -> str:
+    """Directory name of the built pack for a CodeQL language."""
+    return f"{language}-top25"
+
+
+class QueryPackBuilder:
+    """Builds and incrementally recompiles the Top25 query packs."""
+
+    def __init__(self, source_root: str, output_root: str, codeql_repo_path: str,
+                 runner: Optional[CodeQLRunner] = None):
+        """
+        Initialize the builder.
+
+        Args:
+            source_root: Directory containing <language>/top25 query sources (codeql-queries)
+            output_root: Directory to write built packs and the compilation cache to
+            codeql_repo_path: Path to the CodeQL repository providing library packs
+            runner: CodeQL command runner (optional)
+        """
+        self.source_root = source_root
+        self.output_root = output_root
+        self.codeql_repo_path = codeql_repo_path
+        self.runner = runner or CodeQLRunner()
+        self.compilation_cache = os.path.join(output_root, COMPILATION_CACHE_DIR)
+
+    def _hash_file(self, path: str) -> str:
+        with open(path, 'rb') as file:
+            return hashlib.sha256(file.read()).hexdigest()
+
+    def _local_imports(self, path: str, local_modules: Set[str]) -> Set[str]:
+        """Return the local .qll modules a query file imports directly."""
+        with open(path, 'r', encoding='utf-8') as file:
+            imports = set(IMPORT_PATTERN.findall(file.read()))
+        return imports & local_modules
+
+    def _effective_hashes(self, source_dir: str) -> Dict[str, str]:
+        """
+        Hash every query together with its transitive local .qll dependencies.
+
+        Args:
+            source_dir: Directory with the query sources
+
+        Returns:
+            Mapping of query file name to its effective hash
+        """
+        files = sorted(f for f in os.listdir(source_dir) if f.endswith(('.ql', '.qll')))
+        local_modules = {f[:-4] for f in files if f.endswith('.qll')}
+        file_hashes = {f: self._hash_file(os.path.join(source_dir, f)) for f in files}
+        direct_imports = {f: self._local_imports(os.path.join(source_dir, f), local_modules) for f in files}
+
+        effective = {}
+        for query in (f for f in files if f.endswith('.ql')):
+            seen: Set[str] = set()
+            stack = list(direct_imports[query])
+            while stack:
+                module = stack.pop()
+                if module in seen:
+                    continue
+                seen.add(module)
+                stack.extend(direct_imports[f"{module}.qll"])
+            digest = hashlib.sha256(file_hashes[query].encode())
+            for module in sorted(seen):
+                digest.update(file_hashes[f"{module}.qll"].encode())
+            effective[query] = digest.hexdigest()
+        return effective
+
+    def _load_manifest(self, pack_dir: str) -> Dict:
+        try:
+            with open(os.path.join(pack_dir, MANIFEST_FILE), 'r') as file:
+                return json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {'build': 0, 'queries': {}}
+
+    def _write_qlpack(self, pack_dir: str, language: str, build: int) -> None:
+        lines = [
+            f"name: secllm/{pack_dir_name(language)}",
+            f"version: 1.0.{build}",
+            "dependencies:",
+        ]
+        for dependency, version in PACK_DEPENDENCIES.get(language, {}).items():
+            lines.append(f'  {dependency}: "{version}"')
+        with open(os.path.join(pack_dir, 'qlpack.yml'), 'w') as file:
+            file.write('\n'.join(lines) + '\n')
+
+    def compile_queries(self, queries: List[str]) -> None:
+        """
+        Compile queries into the shared compilation cache.
+
+        Args:
+            queries: Paths of the .ql files to compile
+
+        Raises:
+            subprocess.CalledProcessError: If compilation fails
+        """
+        command = [
+            'codeql', 'query', 'compile',
+            f'--search-path={self.codeql_repo_path}',
+            f'--compilation-cache={self.compilation_cache}',
+            '--threads=0',
+        ] + queries
+        logger.info(f"Compiling {len(queries)} queries")
+        self.runner.run(command, timeout=1800)
+
+    def build(self, language: str) -> str:
+        """
+        Build (or incrementally rebuild) the query pack for a language.
+
+        Args:
+            language: CodeQL language ('cpp' or 'python')
+
+        Returns:
+            Path to the built pack
+        """
+        source_dir = os.path.join(self.source_root, language, 'top25')
+        pack_dir = os.path.join(self.output_root, pack_dir_name(language))
+        os.makedirs(pack_dir, exist_ok=True)
+        os.makedirs(self.compilation_cache, exist_ok=True)
+
+        manifest = self._load_manifest(pack_dir)
+        previous = manifest.get('queries', {})
+        current = self._effective_hashes(source_dir)
+
+        # Sync sources (stale .bqrs results and disabled .noql files are not copied)
+        for name in os.listdir(source_dir):
+            if name.endswith(('.ql', '.qll')):
+                shutil.copy2(os.path.join(source_dir, name), os.path.join(pack_dir, name))
+        for name in os.listdir(pack_dir):
+            if name.endswith(('.ql', '.qll')) and not os.path.exists(os.path.join(source_dir, name)):
+                os.remove(os.path.join(pack_dir, name))
+                logger.info(f"Removed query no longer in the suite: {name}")
+
+        changed = sorted(q for q, digest in current.items() if previous.get(q) != digest)
+        removed = sorted(set(previous) - set(current))
+        build = manifest.get('build', 0)
+        if changed or removed or not os.path.exists(os.path.join(pack_dir, 'qlpack.yml')):
+            build += 1
+        self._write_qlpack(pack_dir, language, build)
+
+        if changed:
+            self.compile_queries([os.path.join(pack_dir, q) for q in changed])
+        logger.info(f"Query pack {pack_dir} at build {build}: {len(changed)} recompiled, {len(current) - len(changed)} up to date")
+
+        manifest = {'build': build, 'queries': current}
+        with open(os.path.join(pack_dir, MANIFEST_FILE), 'w') as file:
+            json.dump(manifest, file, indent=2)
+        return pack_dir
+
+
+def main():
+    """Main function for CLI usage."""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Build precompiled CodeQL Top25 query packs")
+    parser.add_argument("--language", type=str, nargs='+', default=["cpp"],
+                       choices=list(PACK_DEPENDENCIES.keys()),
+                       help="Languages to build packs for")
+    parser.add_argument("--source_root", type=str, default="codeql-queries",
+                       help="Directory containing <language>/top25 query sources")
+    parser.add_argument("--output_root", type=str, default="codeql_packs",
+                       help="Directory to write built packs to")
+    parser.add_argument("--codeql_repo", type=str, required=True,
+                       help="Path to the CodeQL repository")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    builder = QueryPackBuilder(args.source_root, args.output_root, args.codeql_repo)
+    for language in args.language:
+        pack_dir = builder.build(language)
+        print(f"Built {pack_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Fake CodeQL CLI Server
+
+A stand-in for ``codeql execute cli-server`` that speaks the same
+stdin/stdout protocol, so the CLI server mode of CodeQLAnalyzer can be
+exercised without CodeQL installed. It fakes the artifacts the analyzer
+checks for: a database directory with codeql-database.yml for
+``database create`` and an empty SARIF log for ``database analyze``.
+
+Usage:
+    CodeQLAnalyzer(..., cli_server=True,
+                   cli_server_command=['python', '-m', 'modules.fake_codeql_server'])
+
+Set FAKE_CODEQL_CRASH_AFTER=<n> to make the server exit after n commands.
+
+With command arguments it runs that one command and exits, like a
+``codeql`` subprocess (for the analyzer's fallback when the server fails):
+    python -m modules.fake_codeql_server database create ...
+"""
+
+import os
+import sys
+import json
+
+FAKE_VERSION = "CodeQL command-line toolchain release 2.11.2 (fake cli-server)."
+
+
+def _option(args, name):
+    """Return the value of a --name=value option."""
+    prefix = f"--{name}="
+    for arg in args:
+        if arg.startswith(prefix):
+            return arg[len(prefix):]
+    return None
+
+
+def handle_command(args):
+    """Execute one fake command and return its stdout text."""
+    if args in (['--version'], ['version']):
+        return FAKE_VERSION + "\n"
+
+    if args[:2] == ['database', 'create']:
+        db_path = args[2]
+        os.makedirs(db_path, exist_ok=True)
+        with open(os.path.join(db_path, 'codeql-database.yml'), 'w') as file:
+            file.write(f"primaryLanguage: {(_option(args, 'language') or 'cpp')}\n")
+        return f"Successfully created database at {db_path}.\n"
+
+    if args[:2] == ['database', 'analyze']:
+        output = _option(args, 'output')
+        if output:
+            sarif = {"version": "2.1.0", "runs": [{"tool": {"driver": {"name": "CodeQL", "rules": []}}, "results": []}]}
+            with open(output, 'w') as file:
+                json.dump(sarif, file)
+        return "Interpreting results.\n"
+
+    sys.stderr.write(f"Unknown command: {args}\n")
+    sys.stderr.flush()
+    return ""
+
+
+def main():
+    if len(sys.argv) > 1:
+        sys.stdout.write(handle_command(sys.argv[1:]))
+        return
+
+    crash_after = int(os.environ.get('FAKE_CODEQL_CRASH_AFTER', '0'))
+    handled = 0
+    stdin = sys.stdin.buffer
+    stdout = sys.stdout.buffer
+    buffer = b''
+
+    while True:
+        chunk = stdin.read1(65536)
+        if not chunk:
+            return
+        buffer += chunk
+        while b'\0' in buffer:
+            message, buffer = buffer.split(b'\0', 1)
+            if crash_after and handled >= crash_after:
+                sys.exit(1)
+            output = handle_command(json.loads(message.decode()))
+            stdout.write(output.encode() + b'\0')
+            stdout.flush()
+            handled += 1
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,6 @@
 # masker.py
 from __future__ import annotations
-from typing import Dict, Tuple, List
+from typing import Dict, Tuple, List, Optional
 import re
 
 from tree_sitter import Language, Parser
@@ -222,3 +222,128 @@ def preprocess_and_mask(source_code: str,
     rebuilt = _normalize_ws(rebuilt, remove_whitespace)
 
     return rebuilt, id_map
+
+
+# 캐시 키 정규화 시 내부 공백을 그대로 보존할 노드 (리터럴, 매크로 본문)
+VERBATIM_NODE_TYPES = {"string_literal", "char_literal", "raw_string_literal", "system_lib_string", "preproc_arg"}
+HORIZONTAL_WS = " \t\r\f\v"
+
+
+def _canonical_segments(source_code: str) -> List[Tuple[str, str]]:
+    """
+    소스를 (종류, 텍스트) 구간으로 분할: 'comment' | 'verbatim' | 'code'
+    구문 오류가 있으면 리터럴 경계를 신뢰할 수 없으므로 전체를 'verbatim'으로 반환
+    """
+    CPP_LANGUAGE = Language(tscpp.language())
+    parser = Parser(CPP_LANGUAGE)
+
+    src_bytes = source_code.encode("utf-8")
+    tree = parser.parse(src_bytes)
+    if tree.root_node.has_error:
+        return [("verbatim", source_code)]
+
+    spans: List[Tuple[int,int,str]] = []
+    stack = [tree.walk().node]
+    while stack:
+        n = stack.pop()
+        if n.type in COMMENT_NODE_TYPES:
+            spans.append((n.start_byte, n.end_byte, "comment"))
+            continue
+        if n.type in VERBATIM_NODE_TYPES:
+            spans.append((n.start_byte, n.end_byte, "verbatim"))
+            continue
+        for i in range(n.child_count - 1, -1, -1):
+            stack.append(n.children[i])
+    spans.sort()
+
+    segments: List[Tuple[str, str]] = []
+    cur = 0
+    for s, e, kind in spans:
+        if s < cur:
+            continue
+        if s > cur:
+            segments.append(("code", src_bytes[cur:s].decode("utf-8")))
+        segments.append((kind, src_bytes[s:e].decode("utf-8")))
+        cur = e
+    if cur < len(src_bytes):
+        segments.append(("code", src_bytes[cur:].decode("utf-8")))
+    return segments
+
+
+def canonicalize_source_with_columns(source_code: str, language: str = "cpp") -> Tuple[str, List[List[Optional[int]]]]:
+    """
+    캐시 키 생성용 정규화 + 열 위치 매핑
+    1) 주석 제거 (공백 1개로 취급, 주석 안의 줄바꿈은 유지)
+    2) 리터럴/매크로 본문 밖의 가로 공백만 1개로 축약, 줄 앞뒤 공백 제거
+    3) 모든 줄바꿈 유지 -> 줄 번호가 원본과 동일
+    반환: (정규화된 코드, 줄별 [원본 열(0부터) -> 정규화 열(0부터), 제거된 문자는 None] 목록)
+    """
+    lines: List[List[str]] = [[]]
+    columns: List[List[int]] = [[]]
+    pending_space = False
+    for kind, text in _canonical_segments(source_code):
+        for ch in text:
+            if ch == "\n":
+                columns[-1].append(None)
+                lines.append([])
+                columns.append([])
+                pending_space = False
+                continue
+            out = lines[-1]
+            if kind == "comment" or (kind == "code" and ch in HORIZONTAL_WS):
+                columns[-1].append(None)
+                pending_space = bool(out)
+                continue
+            if pending_space:
+                out.append(" ")
+                pending_space = False
+            columns[-1].append(len(out))
+            out.append(ch)
+    return "\n".join("".join(line) for line in lines), columns
+
+
+def canonicalize_source(source_code: str, language: str = "cpp") -> str:
+    """
+    캐시 키 생성용 정규화 (식별자 마스킹 없음)
+    - 주석 제거, 리터럴 밖의 가로 공백 축약
+    - 문자열/문자 리터럴, 매크로 본문, 줄바꿈은 그대로 유지 (의미가 다른 코드가 같은 키가 되지 않도록)
+    반환: 정규화된 코드 문자열
+    """
+    return canonicalize_source_with_columns(source_code, language)[0]
+
+
+def find_syntax_errors(source_code: str, language: str = "cpp", max_errors: int = 20) -> List[Dict[str, object]]:
+    """
+    Tree-sitter 파싱으로 구문 오류 위치 수집 (컴파일 없이 빠르게 검사)
+    - ERROR 노드: 파싱 불가 구간
+    - MISSING 노드: 누락된 토큰 (예: ';', ')')
+    반환: [{"line", "column", "message"}, ...] (line/column은 1부터 시작)
+    주의: 매크로가 많은 코드는 오탐 가능
+    """
+    CPP_LANGUAGE = Language(tscpp.language())
+    parser = Parser(CPP_LANGUAGE)
+
+    src_bytes = source_code.encode("utf-8")
+    tree = parser.parse(src_bytes)
+
+    errors: List[Dict[str, object]] = []
+    if not tree.root_node.has_error:
+        return errors
+
+    stack = [tree.root_node]
+    while stack and len(errors) < max_errors:
+        n = stack.pop()
+        if not n.has_error:
+            continue
+        row, col = n.start_point
+        if n.is_missing:
+            errors.append({"line": row + 1, "column": col + 1, "message": f"missing '{n.type}'"})
+            continue
+        if n.type == "ERROR":
+            snippet = src_bytes[n.start_byte:n.end_byte].decode("utf-8", errors="replace")
+            snippet = _normalize_ws(snippet, "normalize")[:40]
+            errors.append({"line": row + 1, "column": col + 1, "message": f"syntax error near '{snippet}'"})
+            continue
+        for i in range(n.child_count - 1, -1, -1):
+            stack.append(n.children[i])
+    return errors
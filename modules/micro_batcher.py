@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Micro-batching for the CodeBERT Vulnerability Detector
+
+Concurrent /code/analysis/model requests each used to run their own
+batch-size-1 forward pass and compete for the same cores. The micro-batcher
+sits in front of a SingleCodeDetector: requests are queued, a worker thread
+collects them until max_batch_size requests are waiting or the oldest has
+waited max_wait_ms, runs one predict_batch() call and hands each result
+back through the request's future. If the batched call fails, its requests
+are retried one at a time so only the failing snippets get the error.
+
+Usage:
+    batcher = MicroBatcher(detector, max_batch_size=16, max_wait_ms=10)
+    result = batcher.predict(code, language='c')              # blocking
+    result = await batcher.predict_async(code, language='c')  # asyncio
+"""
+
+import asyncio
+import logging
+import queue
+import threading
+import time
+from bisect import bisect_left
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+# Histogram bucket upper bounds
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
+QUEUE_WAIT_MS_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 250, 500, 1000)
+
+
+class Histogram:
+    """Non-cumulative bucket counts of observed values (the last bucket is +Inf)."""
+    def __init__(self, bounds: Sequence[float]):
+        self.bounds = list(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+
+    def summary(self) -> Dict:
+        """Return count, mean and per-bucket counts keyed by upper bound."""
+        buckets = {f"<={bound:g}": count for bound, count in zip(self.bounds, self.counts)}
+        buckets['+Inf'] = self.counts[-1]
+        return {
+            'count': self.count,
+            'mean': self.total / self.count if self.count else None,
+            'buckets': buckets,
+        }
+
+
+@dataclass
+class _PendingRequest:
+    """A queued prediction request."""
+    code: str
+    language: str
+    future: Future
+    enqueued: float = field(default_factory=time.monotonic)
+
+
+class MicroBatcher:
+    """
+    Collects concurrent prediction requests into batched forward passes.
+
+    Exposes predict() and VULNERABILITY_TYPES like SingleCodeDetector, so it
+    can be passed wherever a detector is used (e.g. analyze_code).
+    """
+    def __init__(self, detector, max_batch_size: int = 16, max_wait_ms: float = 10.0):
+        """
+        Initialize the micro-batcher and start its worker thread.
+
+        Args:
+            detector: SingleCodeDetector (anything with predict_batch(codes, language, batch_size))
+            max_batch_size: Maximum requests per forward pass
+            max_wait_ms: Maximum time the oldest request waits for the batch to fill
+        """
+        self.detector = detector
+        self.VULNERABILITY_TYPES = detector.VULNERABILITY_TYPES
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self.batch_sizes = Histogram(BATCH_SIZE_BUCKETS)
+        self.queue_waits_ms = Histogram(QUEUE_WAIT_MS_BUCKETS)
+        self.batches = 0
+        self.failed_batches = 0
+        self._queue: "queue.Queue[Optional[_PendingRequest]]" = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self._closed = False
+        self._worker = threading.Thread(target=self._run, name="model-microbatcher", daemon=True)
+        self._worker.start()
+        logger.info(f"Micro-batcher started (max batch {self.max_batch_size}, max wait {max_wait_ms}ms)")
+
+    def submit(self, code: str, language: str = 'cpp') -> Future:
+        """
+        Queue a prediction request.
+
+        Returns:
+            Future resolving to the SingleCodeResult
+
+        Raises:
+            RuntimeError: If the batcher has been closed
+        """
+        if self._closed:
+            raise RuntimeError("Micro-batcher is closed")
+        future = Future()
+        self._queue.put(_PendingRequest(code, language, future))
+        return future
+
+    def predict(self, code: str, language: str = 'cpp', timeout: float = None):
+        """Predict a snippet through the batcher, blocking until its batch has run."""
+        return self.submit(code, language).result(timeout)
+
+    async def predict_async(self, code: str, language: str = 'cpp'):
+        """Predict a snippet through the batcher without blocking the event loop."""
+        return await asyncio.wrap_future(self.submit(code, language))
+
+    def _collect(self) -> Optional[List[_PendingRequest]]:
+        """Wait for a request, then gather more until the batch is full or the oldest has waited max_wait."""
+        first = self._queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = first.enqueued + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                request = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if request is None:
+                # Close requested: finish this batch, then stop
+                self._queue.put(None)
+                break
+            batch.append(request)
+        return batch
+
+    def _run(self) -> None:
+        """Worker loop: collect a batch, run it, repeat until closed."""
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+            # Cancelled futures are dropped before running the model
+            batch = [request for request in batch if request.future.set_running_or_notify_cancel()]
+            if batch:
+                self._run_batch(batch)
+
+    def _run_batch(self, batch: List[_PendingRequest]) -> None:
+        """Run one predict_batch() per language in the batch and resolve the futures."""
+        started = time.monotonic()
+        with self._stats_lock:
+            self.batches += 1
+            self.batch_sizes.observe(len(batch))
+            for request in batch:
+                self.queue_waits_ms.observe((started - request.enqueued) * 1000)
+
+        by_language: Dict[str, List[_PendingRequest]] = {}
+        for request in batch:
+            by_language.setdefault(request.language, []).append(request)
+
+        for language, requests in by_language.items():
+            try:
+                results = self.detector.predict_batch([request.code for request in requests], language,
+                                                      batch_size=len(requests))
+            except Exception as e:
+                logger.error(f"Batched prediction of {len(requests)} snippets failed: {e}")
+                with self._stats_lock:
+                    self.failed_batches += 1
+                if len(requests) == 1:
+                    requests[0].future.set_exception(e)
+                else:
+                    self._run_singly(requests, language)
+                continue
+            for request, result in zip(requests, results):
+                request.future.set_result(result)
+
+    def _run_singly(self, requests: List[_PendingRequest], language: str) -> None:
+        """Run each request of a failed batch on its own, so one bad snippet fails only its own request."""
+        for request in requests:
+            try:
+                result, = self.detector.predict_batch([request.code], language, batch_size=1)
+            except Exception as e:
+                logger.error(f"Prediction of a snippet from a failed batch failed: {e}")
+                request.future.set_exception(e)
+            else:
+                request.future.set_result(result)
+
+    def stats(self) -> Dict:
+        """Return queue length, batch counts and batch-size/queue-wait histograms."""
+        with self._stats_lock:
+            return {
+                'max_batch_size': self.max_batch_size,
+                'max_wait_ms': self.max_wait * 1000,
+                'queue_length': self._queue.qsize(),
+                'batches': self.batches,
+                'failed_batches': self.failed_batches,
+                'batch_size': self.batch_sizes.summary(),
+                'queue_wait_ms': self.queue_waits_ms.summary(),
+            }
+
+    def close(self, timeout: float = None) -> None:
+        """Stop accepting requests, run the queued ones and stop the worker."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._worker.join(timeout)
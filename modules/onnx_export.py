@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+ONNX Export of the CodeBERT Vulnerability Classifier
+
+Exports a VulnerabilityModel (with its trained checkpoint) to an ONNX graph
+with dynamic batch and sequence axes, checks the ONNX Runtime logits
+against the PyTorch logits, and provides OnnxClassifier, a drop-in for the
+model in SingleCodeDetector(backend='onnx').
+
+Requires the optional packages onnx and onnxruntime:
+    pip install onnx onnxruntime
+
+Usage:
+    python -m modules.onnx_export --checkpoint_path models/checkpoints/model_etri_demo.bin \
+        --output models/onnx/model_etri_demo.onnx
+"""
+
+import logging
+import os
+from typing import List, Optional, Sequence
+
+import numpy as np
+import torch
+
+from modules.vulnerability_detector import pad_batch
+
+logger = logging.getLogger(__name__)
+
+INPUT_NAMES = ['input_ids', 'attention_mask']
+OUTPUT_NAMES = ['logits']
+DYNAMIC_AXES = {
+    'input_ids': {0: 'batch', 1: 'sequence'},
+    'attention_mask': {0: 'batch', 1: 'sequence'},
+    'logits': {0: 'batch'},
+}
+
+# Snippets of different lengths used to trace and check the export
+SAMPLE_CODES = [
+    "int main() { char buf[10]; gets(buf); return 0; }",
+    "void copy(char *dst, const char *src) {\n    while (*src) {\n        *dst++ = *src++;\n    }\n    *dst = 0;\n}",
+    "#include <stdio.h>\n#include <string.h>\n\nint main(int argc, char **argv) {\n"
+    "    char buffer[16];\n    if (argc > 1) {\n        strcpy(buffer, argv[1]);\n"
+    "        printf(\"%s\\n\", buffer);\n    }\n    return 0;\n}",
+]
+
+
+class OnnxVerificationError(RuntimeError):
+    """Raised when the ONNX Runtime logits differ from the PyTorch logits."""
+
+
+def _create_session(onnx_path: str, num_threads: int = None):
+    """Create a CPU ONNX Runtime session for a graph."""
+    try:
+        import onnxruntime as ort
+    except ImportError:
+        raise ImportError("onnxruntime not installed. Install with: pip install onnxruntime")
+
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    if num_threads:
+        options.intra_op_num_threads = num_threads
+    return ort.InferenceSession(onnx_path, sess_options=options, providers=['CPUExecutionProvider'])
+
+
+class OnnxClassifier:
+    """
+    Runs an exported classifier with ONNX Runtime.
+
+    Called like VulnerabilityModel: model(input_ids, attention_mask) returns
+    a logits tensor, so SingleCodeDetector uses it unchanged.
+    """
+    def __init__(self, onnx_path: str, num_threads: int = None):
+        """
+        Load the ONNX graph.
+
+        Args:
+            onnx_path: Path to the exported .onnx file
+            num_threads: Intra-op threads (ONNX Runtime default if None)
+
+        Raises:
+            FileNotFoundError: If the graph does not exist
+            ImportError: If onnxruntime is not installed
+        """
+        if not os.path.exists(onnx_path):
+            raise FileNotFoundError(f"ONNX model not found: {onnx_path}")
+        self.onnx_path = onnx_path
+        self.session = _create_session(onnx_path, num_threads)
+        logger.info(f"ONNX Runtime session created for {onnx_path}")
+
+    def __call__(self, input_ids: torch.Tensor, attention_mask: Optional[torch.Tensor] = None) -> torch.Tensor:
+        if attention_mask is None:
+            attention_mask = torch.ones_like(input_ids)
+        logits, = self.session.run(OUTPUT_NAMES, {
+            'input_ids': input_ids.cpu().numpy().astype(np.int64),
+            'attention_mask': attention_mask.cpu().numpy().astype(np.int64),
+        })
+        return torch.from_numpy(logits)
+
+
+def _sample_batches(detector, codes: Sequence[str]) -> List[tuple]:
+    """Tokenize sample codes into batches of different sizes and lengths."""
+    encoded = [detector._tokenize_code(detector._preprocess_code(code, 'c')) for code in codes]
+    pad_token_id = detector.tokenizer.pad_token_id
+    batches = [pad_batch([ids], pad_token_id) for ids in encoded]
+    batches.append(pad_batch(encoded, pad_token_id))
+    return batches
+
+
+def export_onnx(detector, output_path: str, opset: int = 17) -> str:
+    """
+    Export the classifier of a SingleCodeDetector to ONNX.
+
+    Args:
+        detector: SingleCodeDetector with the PyTorch backend
+        output_path: Where to write the .onnx file
+        opset: ONNX opset version
+
+    Returns:
+        Path to the exported graph
+    """
+    model = detector.model
+    model.eval()
+    # Trace with a two-snippet batch so that padding and the mask are exercised
+    input_ids, attention_mask = _sample_batches(detector, SAMPLE_CODES[:2])[-1]
+    device = next(model.parameters()).device
+
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    logger.info(f"Exporting ONNX graph to {output_path} (opset {opset})")
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            (input_ids.to(device), attention_mask.to(device)),
+            output_path,
+            input_names=INPUT_NAMES,
+            output_names=OUTPUT_NAMES,
+            dynamic_axes=DYNAMIC_AXES,
+            opset_version=opset,
+            do_constant_folding=True,
+        )
+
+    try:
+        import onnx
+        onnx.checker.check_model(output_path)
+    except ImportError:
+        logger.warning("onnx not installed, skipping the graph check")
+    return output_path
+
+
+def verify_onnx(detector, onnx_path: str, codes: Sequence[str] = SAMPLE_CODES,
+                atol: float = 1e-4, rtol: float = 1e-3) -> float:
+    """
+    Compare ONNX Runtime logits with PyTorch logits on sample batches.
+
+    The batches differ in size and length from the traced input, so the
+    check also covers the dynamic axes.
+
+    Args:
+        detector: SingleCodeDetector with the PyTorch backend
+        onnx_path: Path to the exported graph
+        codes: Source snippets to compare on
+        atol: Absolute tolerance
+        rtol: Relative tolerance
+
+    Returns:
+        Largest absolute logit difference
+
+    Raises:
+        OnnxVerificationError: If any logits differ beyond the tolerances
+    """
+    onnx_model = OnnxClassifier(onnx_path)
+    device = next(detector.model.parameters()).device
+    max_diff = 0.0
+    for input_ids, attention_mask in _sample_batches(detector, codes):
+        with torch.no_grad():
+            expected = detector.model(input_ids.to(device), attention_mask.to(device)).cpu().numpy()
+        actual = onnx_model(input_ids, attention_mask).numpy()
+        max_diff = max(max_diff, float(np.abs(expected - actual).max()))
+        if not np.allclose(expected, actual, atol=atol, rtol=rtol):
+            raise OnnxVerificationError(
+                f"ONNX logits differ from PyTorch for batch shape {tuple(input_ids.shape)}: "
+                f"max abs diff {max_diff:.2e} (atol {atol}, rtol {rtol})"
+            )
+    logger.info(f"ONNX logits match PyTorch (max abs diff {max_diff:.2e})")
+    return max_diff
+
+
+def main():
+    """Main function for CLI usage."""
+    import argparse
+    from modules.single_code_inference import SingleCodeDetector
+
+    parser = argparse.ArgumentParser(description="Export the vulnerability classifier to ONNX")
+    parser.add_argument("--model_name_or_path", type=str, default="microsoft/codebert-base",
+                       help="Model name or path")
+    parser.add_argument("--checkpoint_path", type=str, default="models/checkpoints/model_etri_demo.bin",
+                       help="Path to model checkpoint")
+    parser.add_argument("--model_type", type=str, default="roberta",
+                       help="Type of model to export")
+    parser.add_argument("--num_labels", type=int, default=4,
+                       help="Number of classification labels")
+    parser.add_argument("--output", type=str, default="models/onnx/model_etri_demo.onnx",
+                       help="Path of the exported .onnx file")
+    parser.add_argument("--opset", type=int, default=17,
+                       help="ONNX opset version")
+    parser.add_argument("--atol", type=float, default=1e-4,
+                       help="Absolute tolerance of the logit check")
+    parser.add_argument("--rtol", type=float, default=1e-3,
+                       help="Relative tolerance of the logit check")
+    parser.add_argument("--no_verify", action="store_true",
+                       help="Skip the ONNX Runtime vs PyTorch logit check")
+    args = parser.parse_args()
+
+    detector = SingleCodeDetector(
+        model_name_or_path=args.model_name_or_path,
+        checkpoint_path=args.checkpoint_path,
+        model_type=args.model_type,
+        num_labels=args.num_labels,
+        device='cpu'
+    )
+    export_onnx(detector, args.output, args.opset)
+    print(f"Exported: {args.output}")
+    if not args.no_verify:
+        max_diff = verify_onnx(detector, args.output, atol=args.atol, rtol=args.rtol)
+        print(f"Verified: max abs logit diff {max_diff:.2e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+FP32 vs INT8 Comparison of the Vulnerability Detector
+
+Runs VulnerabilityDetector.predict on a labelled dataset once with the fp32
+model and once with int8 dynamic quantization of its Linear layers, and
+reports the MetricsCalculator metrics of both modes with their deltas,
+next to per-sample latency, peak resident memory and how often the two
+modes agree.
+
+Each mode runs in its own process so that resident memory is not shared
+between them; memory is sampled with psutil while the mode runs.
+
+Usage:
+    python -m modules.quantization_benchmark --data_file test.csv \
+        --checkpoint_path models/checkpoints/model_etri_demo.bin --output_file quantization.json
+"""
+
+import json
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+MODES = {'fp32': None, 'int8': 'int8'}
+
+
+class PeakRSSMonitor:
+    """Samples the resident memory of the current process in a background thread."""
+    def __init__(self, interval: float = 0.05):
+        import psutil
+        self.process = psutil.Process(os.getpid())
+        self.interval = interval
+        self.peak = self.process.memory_info().rss
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, self.process.memory_info().rss)
+
+    def __enter__(self) -> 'PeakRSSMonitor':
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, self.process.memory_info().rss)
+
+
+def run_mode(config_kwargs: Dict, quantization: Optional[str], threads: Optional[int] = None) -> Dict:
+    """
+    Run VulnerabilityDetector.predict in one mode.
+
+    Args:
+        config_kwargs: ModelConfig fields shared by both modes
+        quantization: None for fp32, 'int8' for dynamic quantization
+        threads: Torch intra-op threads (torch default if None)
+
+    Returns:
+        Dict with metrics, predictions, per-sample latency and peak RSS
+    """
+    import torch
+    from modules.vulnerability_detector import ModelConfig, VulnerabilityDetector
+
+    if threads:
+        torch.set_num_threads(threads)
+    config = ModelConfig(**config_kwargs, quantization=quantization)
+    detector = VulnerabilityDetector(config)
+
+    with PeakRSSMonitor() as monitor:
+        start = time.perf_counter()
+        result = detector.predict(config.data_file)
+        total_seconds = time.perf_counter() - start
+
+    samples = len(result.predictions)
+    return {
+        'metrics': result.metrics,
+        'predictions': result.predictions.tolist(),
+        'samples': samples,
+        'latency_ms_per_sample': result.inference_seconds / samples * 1000 if samples else None,
+        'total_seconds': total_seconds,
+        'peak_rss_mb': monitor.peak / 1024 ** 2,
+    }
+
+
+def compare(results: Dict[str, Dict]) -> Dict:
+    """
+    Compare the int8 run with the fp32 run.
+
+    Returns:
+        Dict with metric deltas (int8 - fp32), latency speedup, memory
+        ratio and prediction agreement
+    """
+    fp32, int8 = results['fp32'], results['int8']
+    comparison = {}
+    if fp32['metrics'] and int8['metrics']:
+        comparison['metric_deltas'] = {
+            key: int8['metrics'][key] - fp32['metrics'][key] for key in fp32['metrics']
+        }
+    if fp32['latency_ms_per_sample'] and int8['latency_ms_per_sample']:
+        comparison['latency_speedup'] = fp32['latency_ms_per_sample'] / int8['latency_ms_per_sample']
+    comparison['peak_rss_ratio'] = int8['peak_rss_mb'] / fp32['peak_rss_mb']
+    if fp32['samples']:
+        agree = sum(a == b for a, b in zip(fp32['predictions'], int8['predictions']))
+        comparison['prediction_agreement'] = agree / fp32['samples']
+    return comparison
+
+
+def format_report(results: Dict[str, Dict], comparison: Dict) -> str:
+    """Format the comparison as a text table."""
+    fp32, int8 = results['fp32'], results['int8']
+    lines = [f"{'':24} {'fp32':>10} {'int8':>10} {'delta':>10}"]
+    for key, delta in comparison.get('metric_deltas', {}).items():
+        lines.append(f"{key:24} {fp32['metrics'][key]:10.4f} {int8['metrics'][key]:10.4f} {delta:+10.4f}")
+    if 'latency_speedup' in comparison:
+        lines.append(f"{'latency (ms/sample)':24} {fp32['latency_ms_per_sample']:10.2f} "
+                     f"{int8['latency_ms_per_sample']:10.2f} {comparison['latency_speedup']:9.2f}x")
+    lines.append(f"{'peak RSS (MB)':24} {fp32['peak_rss_mb']:10.1f} {int8['peak_rss_mb']:10.1f} "
+                 f"{comparison['peak_rss_ratio']:9.2f}x")
+    if 'prediction_agreement' in comparison:
+        lines.append(f"{'prediction agreement':24} {comparison['prediction_agreement']:>32.2%}")
+    return '\n'.join(lines)
+
+
+def main():
+    """Main function for CLI usage."""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Compare fp32 and int8 vulnerability detection")
+    parser.add_argument("--data_file", type=str, required=True,
+                       help="Labelled dataset to evaluate on")
+    parser.add_argument("--data_type", type=str, default="csv", choices=["csv", "json"],
+                       help="Type of input data")
+    parser.add_argument("--model_type", type=str, default="roberta",
+                       help="Type of model to use")
+    parser.add_argument("--model_name_or_path", type=str, default="microsoft/codebert-base",
+                       help="Model name or path")
+    parser.add_argument("--checkpoint_path", type=str, default="models/checkpoints/model_etri_demo.bin",
+                       help="Path to model checkpoint")
+    parser.add_argument("--num_labels", type=int, default=4,
+                       help="Number of classification labels")
+    parser.add_argument("--block_size", type=int, default=-1,
+                       help="Maximum sequence length")
+    parser.add_argument("--batch_size", type=int, default=32,
+                       help="Inference batch size")
+    parser.add_argument("--threads", type=int,
+                       help="Torch intra-op threads for both modes")
+    parser.add_argument("--output_file", type=str,
+                       help="Path to save the comparison as JSON")
+    args = parser.parse_args()
+
+    config_kwargs = dict(
+        data_file=args.data_file,
+        data_type=args.data_type,
+        model_type=args.model_type,
+        model_name_or_path=args.model_name_or_path,
+        checkpoint_path=args.checkpoint_path,
+        num_labels=args.num_labels,
+        block_size=args.block_size,
+        batch_size=args.batch_size,
+        device='cpu',
+    )
+
+    # One fresh process per mode, so memory and caches are not shared
+    context = multiprocessing.get_context('spawn')
+    results = {}
+    for mode, quantization in MODES.items():
+        logger.info(f"Running {mode} inference on {args.data_file}")
+        with context.Pool(1) as pool:
+            results[mode] = pool.apply(run_mode, (config_kwargs, quantization, args.threads))
+
+    comparison = compare(results)
+    print(format_report(results, comparison))
+
+    if args.output_file:
+        for result in results.values():
+            result.pop('predictions')
+        with open(args.output_file, 'w', encoding='utf-8') as file:
+            json.dump({'config': config_kwargs, 'results': results, 'comparison': comparison}, file, indent=2)
+        print(f"Saved: {args.output_file}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    main()
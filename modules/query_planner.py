@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+"""
+Construct-aware CodeQL Query Planning
+
+Many top25 queries can only report on code that uses specific APIs: SQL
+injection needs an SQL call, CGI XSS needs an environment read, the DACL
+query needs SetSecurityDescriptorDacl, and so on. The planner scans a
+snippet with tree-sitter for the identifiers it mentions (called functions,
+macros, types), its includes and a few constructs (loops, try blocks,
+subscripts), and skips the queries whose trigger is absent.
+
+The plan is conservative:
+
+* queries without an entry in QUERY_TRIGGERS always run;
+* identifiers and constructs are collected from the whole tree, including
+  macro bodies, so function pointers and wrapper macros still select their
+  queries;
+* a trigger must hold for every branch of its query, so queries with
+  several independent branches list each of them as an alternative;
+* the whole suite runs if tree-sitter is unavailable, the snippet does not
+  parse cleanly, it includes a local header the planner cannot see, or the
+  language is not C/C++.
+
+Usage:
+    python -m modules.query_planner --code_file snippet.cpp --query_path codeql-queries/cpp/top25
+"""
+
+import os
+import re
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, FrozenSet, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Syntax node types collected as identifiers
+IDENTIFIER_NODE_TYPES = {'identifier', 'field_identifier', 'type_identifier', 'namespace_identifier'}
+
+# Syntax node types recorded as constructs
+CONSTRUCT_NODE_TYPES = {
+    'for_statement': 'loop',
+    'for_range_loop': 'loop',
+    'while_statement': 'loop',
+    'do_statement': 'loop',
+    'try_statement': 'try',
+    'subscript_expression': 'subscript',
+}
+
+# Preprocessor nodes whose raw text may hide identifiers (macro bodies, conditions)
+PREPROC_TEXT_NODE_TYPES = {'preproc_arg', 'preproc_params'}
+
+# Constructs recognized in the raw text of macro bodies
+PREPROC_CONSTRUCT_PATTERNS = {
+    'loop': re.compile(r'\b(for|while|do)\b'),
+    'try': re.compile(r'\btry\b'),
+    'subscript': re.compile(r'\['),
+}
+
+WORD_PATTERN = re.compile(r'[A-Za-z_]\w*')
+
+# Rule ID in the metadata comment of a query
+QUERY_ID_PATTERN = re.compile(r'^\s*\*\s*@id\s+(\S+)', re.MULTILINE)
+
+
+@dataclass(frozen=True)
+class QueryTrigger:
+    """
+    What a snippet must contain for a query to possibly report on it.
+
+    A query is selected when an identifier matches ``pattern`` (if given)
+    and one of ``constructs`` is present (if given). A trigger built with
+    any_of() is selected when one of its alternatives is.
+    """
+    pattern: Optional[str] = None
+    constructs: FrozenSet[str] = frozenset()
+    alternatives: Tuple['QueryTrigger', ...] = ()
+
+    @classmethod
+    def any_of(cls, *alternatives: 'QueryTrigger') -> 'QueryTrigger':
+        return cls(alternatives=alternatives)
+
+    def matches(self, scan: 'SnippetScan') -> bool:
+        if self.alternatives:
+            return any(alternative.matches(scan) for alternative in self.alternatives)
+        if self.pattern:
+            regex = re.compile(self.pattern)
+            if not any(regex.search(name) for name in scan.identifiers):
+                return False
+        if self.constructs and not self.constructs & scan.constructs:
+            return False
+        return True
+
+
+@dataclass
+class SnippetScan:
+    """Identifiers, includes and constructs found in a snippet."""
+    identifiers: Set[str] = field(default_factory=set)
+    includes: Set[str] = field(default_factory=set)
+    local_includes: Set[str] = field(default_factory=set)
+    constructs: Set[str] = field(default_factory=set)
+
+
+@dataclass
+class QueryPlan:
+    """Queries selected for a snippet."""
+    queries: Optional[List[str]]
+    pruned: List[str] = field(default_factory=list)
+    fallback: Optional[str] = None
+
+    @property
+    def is_full_suite(self) -> bool:
+        return self.queries is None
+
+
+# Rule IDs of the cpp top25 suite whose sinks or sources are specific APIs or
+# constructs. Patterns are matched with re.search against every identifier
+# of the snippet, so they are deliberately broad. Every entry must cover all
+# branches of its query: query_planner_test.py runs a known-positive sample
+# of each one through the planner.
+QUERY_TRIGGERS: Dict[str, QueryTrigger] = {
+    'cpp/alloca-in-loop': QueryTrigger(r'alloca', frozenset({'loop'})),
+    'cpp/allocation-too-small': QueryTrigger(r'(?i)alloc|dup'),
+    'cpp/suspicious-allocation-size': QueryTrigger(r'(?i)alloc|dup'),
+    'cpp/arithmetic-with-extreme-values': QueryTrigger(r'^(CHAR|SHRT|INT|UINT|LLONG)_(MAX|MIN)$'),
+    'cpp/badly-bounded-write': QueryTrigger(r'(?i)cpy|cat|printf|gets|getws|getts|scanf|realpath|xfrm'),
+    'cpp/overrunning-write': QueryTrigger(r'(?i)cpy|cat|printf|gets|getws|getts|scanf|realpath|xfrm'),
+    'cpp/overrunning-write-with-float': QueryTrigger(r'(?i)printf'),
+    'cpp/very-likely-overrunning-write': QueryTrigger(r'(?i)cpy|cat|printf|gets|getws|getts|scanf|realpath|xfrm'),
+    'cpp/unbounded-write': QueryTrigger(r'(?i)cpy|cat|printf|gets|getws|getts|scanf|realpath|xfrm'),
+    'cpp/potential-buffer-overflow': QueryTrigger(r'^v?sprintf$'),
+    'cpp/no-space-for-terminator': QueryTrigger(r'(?i)(str|wcs|mbs)n?len'),
+    # mbtowc/_mbccpy in loops, wide array offsets (buf[sizeof(buf) - 1] = 0), mbs*/mbc* buffers, string conversions
+    'cpp/dangerous-use-convert-function': QueryTrigger.any_of(
+        QueryTrigger(constructs=frozenset({'loop', 'subscript'})),
+        QueryTrigger(r'(?i)_?mb[sc]|mbr?tow|MultiByteToWideChar|WideCharToMultiByte'),
+    ),
+    'cpp/memory-leak-on-failed-call-to-realloc': QueryTrigger(r'realloc'),
+    'cpp/catch-missing-free': QueryTrigger(constructs=frozenset({'try'})),
+    'cpp/comparison-with-wider-type': QueryTrigger(constructs=frozenset({'loop'})),
+    'cpp/offset-use-before-range-check': QueryTrigger(constructs=frozenset({'subscript'})),
+    'cpp/cgi-xss': QueryTrigger(r'(?i)getenv|environ'),
+    'cpp/sql-injection': QueryTrigger(r'(?i)sql|query|exec|^PQ|^OCI'),
+    'cpp/command-line-injection': QueryTrigger(r'(?i)system|popen|exec|spawn|ShellExecute|CreateProcess'),
+    'cpp/wordexp-injection': QueryTrigger(r'wordexp'),
+    'cpp/unsafe-dacl-security-descriptor': QueryTrigger(r'SetSecurityDescriptorDacl'),
+    'cpp/linux-kernel-double-fetch-vulnerability': QueryTrigger(r'copy_from_user'),
+    'cpp/path-injection': QueryTrigger(r'(?i)open|CreateFile|fstream|filebuf'),
+    'cpp/toctou-race-condition': QueryTrigger(r'(?i)open|remove|unlink|rmdir|rename|chmod|chown|access|stat'),
+    'cpp/work-with-file-without-permissions-rights': QueryTrigger(r'(?i)open'),
+    'cpp/open-call-with-mode-argument': QueryTrigger(r'(?i)open|creat'),
+    'cpp/world-writable-file-creation': QueryTrigger(r'(?i)open|creat|chmod|mkdir|mkfifo|mknod'),
+    # umask(0) before file creation, or arithmetic in the mode of umask/chmod/fchmod
+    'cpp/wrong-use-of-the-umask': QueryTrigger(r'umask|chmod'),
+    'cpp/cleartext-transmission': QueryTrigger(r'(?i)send|recv|read|write|gets|socket|ssl'),
+}
+
+
+def read_query_id(query_file: str) -> Optional[str]:
+    """Return the rule ID (@id) declared in a query's metadata, if any."""
+    with open(query_file, 'r', encoding='utf-8', errors='replace') as file:
+        match = QUERY_ID_PATTERN.search(file.read())
+    return match.group(1) if match else None
+
+
+def scan_snippet(code_snippet: str, language: str = 'cpp') -> SnippetScan:
+    """
+    Collect the identifiers, includes and constructs of a C/C++ snippet.
+
+    Args:
+        code_snippet: The code to scan
+        language: Programming language ('c' or 'cpp')
+
+    Returns:
+        SnippetScan of the snippet
+
+    Raises:
+        ImportError: If tree-sitter is not installed
+        ValueError: If the snippet does not parse cleanly
+    """
+    from tree_sitter import Language, Parser
+    import tree_sitter_cpp as tscpp
+
+    parser = Parser(Language(tscpp.language()))
+    src_bytes = code_snippet.encode('utf-8')
+    tree = parser.parse(src_bytes)
+    if tree.root_node.has_error:
+        raise ValueError("snippet has syntax errors")
+
+    scan = SnippetScan()
+    stack = [tree.root_node]
+    while stack:
+        node = stack.pop()
+        if node.type in IDENTIFIER_NODE_TYPES:
+            scan.identifiers.add(src_bytes[node.start_byte:node.end_byte].decode('utf-8', errors='replace'))
+        elif node.type in PREPROC_TEXT_NODE_TYPES:
+            text = src_bytes[node.start_byte:node.end_byte].decode('utf-8', errors='replace')
+            scan.identifiers.update(WORD_PATTERN.findall(text))
+            scan.constructs.update(name for name, pattern in PREPROC_CONSTRUCT_PATTERNS.items() if pattern.search(text))
+        elif node.type == 'preproc_include':
+            path = node.child_by_field_name('path')
+            if path is not None:
+                header = src_bytes[path.start_byte:path.end_byte].decode('utf-8', errors='replace')
+                if path.type == 'system_lib_string':
+                    scan.includes.add(header.strip('<>'))
+                else:
+                    scan.local_includes.add(header.strip('"'))
+        if node.type in CONSTRUCT_NODE_TYPES:
+            scan.constructs.add(CONSTRUCT_NODE_TYPES[node.type])
+        stack.extend(node.children)
+    return scan
+
+
+class QueryPlanner:
+    """
+    Selects the top25 queries that could possibly report on a snippet.
+
+    Usage:
+        planner = QueryPlanner()
+        plan = planner.plan(code, 'cpp', analyzer.query_ids('cpp'), analyzer.list_queries('cpp'))
+        analyzer.run_queries(db, 'cpp', out, queries=plan.queries)
+    """
+    def __init__(self, triggers: Dict[str, QueryTrigger] = None):
+        """
+        Initialize the planner.
+
+        Args:
+            triggers: Rule ID to trigger table (QUERY_TRIGGERS if None)
+        """
+        self.triggers = QUERY_TRIGGERS if triggers is None else triggers
+
+    def plan(self, code_snippet: str, language: str, query_ids: Dict[str, str],
+             queries: List[str]) -> QueryPlan:
+        """
+        Plan the queries to run on a snippet.
+
+        Args:
+            code_snippet: The code to analyze
+            language: Programming language ('python', 'c', 'cpp', etc.)
+            query_ids: Rule ID to query file map of the suite
+            queries: All query files of the suite
+
+        Returns:
+            QueryPlan with the selected query files, or the full suite
+            (queries=None) together with the fallback reason
+        """
+        if language.lower() not in ['c', 'cpp']:
+            return QueryPlan(None, fallback=f"no planner for {language}")
+        try:
+            scan = scan_snippet(code_snippet, language)
+        except Exception as e:
+            logger.info(f"Query planning skipped, running the full suite: {e}")
+            return QueryPlan(None, fallback=str(e))
+        if scan.local_includes:
+            return QueryPlan(None, fallback=f"local includes: {', '.join(sorted(scan.local_includes))}")
+
+        pruned = sorted(rule_id for rule_id, trigger in self.triggers.items()
+                        if rule_id in query_ids and not trigger.matches(scan))
+        pruned_files = {query_ids[rule_id] for rule_id in pruned}
+        selected = [query for query in queries if query not in pruned_files]
+        if not selected:
+            return QueryPlan(None, fallback="no query selected")
+        return QueryPlan(selected, pruned)
+
+
+def main():
+    """Main function for CLI usage."""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Show the top25 queries the planner selects for a snippet")
+    parser.add_argument("--code_file", type=str, required=True,
+                       help="C/C++ source file to plan for")
+    parser.add_argument("--query_path", type=str, required=True,
+                       help="Directory of the top25 queries")
+    parser.add_argument("--language", type=str, default="cpp",
+                       help="Language of the source file")
+    args = parser.parse_args()
+
+    with open(args.code_file, 'r', encoding='utf-8') as file:
+        code = file.read()
+
+    queries, query_ids = [], {}
+    for root, dirs, files in os.walk(args.query_path):
+        dirs.sort()
+        for name in sorted(files):
+            if name.endswith('.ql'):
+                path = os.path.join(root, name)
+                queries.append(path)
+                rule_id = read_query_id(path)
+                if rule_id:
+                    query_ids.setdefault(rule_id, path)
+
+    plan = QueryPlanner().plan(code, args.language, query_ids, queries)
+    if plan.is_full_suite:
+        print(f"Full suite ({len(queries)} queries): {plan.fallback}")
+        return
+    print(f"Selected {len(plan.queries)} of {len(queries)} queries, pruned {len(plan.pruned)}:")
+    for rule_id in plan.pruned:
+        print(f"  - {rule_id}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,364 @@
+"""
+Incremental SARIF reader.
+
+Reads a SARIF log result by result instead of loading the whole document,
+so memory stays bounded by the largest single result rather than the size
+of the log. Results are turned into compact, slotted finding records that
+keep every location and code flow.
+"""
+
+import json
+import logging
+from typing import Dict, Iterator, List, Optional, TextIO, Tuple
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+
+# Characters a JSON number may continue with
+NUMBER_CHARS = '0123456789.eE+-'
+
+
+class SarifLocation:
+    """A physical location of a finding."""
+    __slots__ = ('uri', 'start_line', 'start_column', 'end_line', 'end_column', 'message')
+
+    def __init__(self, uri: Optional[str], start_line: Optional[int], start_column: Optional[int],
+                 end_line: Optional[int], end_column: Optional[int], message: Optional[str] = None):
+        self.uri = uri
+        self.start_line = start_line
+        self.start_column = start_column
+        self.end_line = end_line
+        self.end_column = end_column
+        self.message = message
+
+    @classmethod
+    def from_sarif(cls, location: Dict) -> 'SarifLocation':
+        physical = location.get('physicalLocation', {})
+        region = physical.get('region', {})
+        return cls(
+            physical.get('artifactLocation', {}).get('uri'),
+            region.get('startLine'),
+            region.get('startColumn'),
+            region.get('endLine', region.get('startLine')),
+            region.get('endColumn'),
+            location.get('message', {}).get('text')
+        )
+
+    def describe(self) -> str:
+        """Location in the format used by the vulnerability report."""
+        return f'line {self.start_line}, column {self.start_column}-{self.end_column}'
+
+    def to_dict(self) -> Dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'SarifLocation':
+        return cls(*(data.get(name) for name in cls.__slots__))
+
+
+class SarifFinding:
+    """One SARIF result with all of its locations and code flows."""
+    __slots__ = ('rule_id', 'message', 'cwe', 'locations', 'code_flows')
+
+    def __init__(self, rule_id: Optional[str], message: str, cwe: Optional[str],
+                 locations: Tuple[SarifLocation, ...], code_flows: Tuple[Tuple[SarifLocation, ...], ...]):
+        self.rule_id = rule_id
+        self.message = message
+        self.cwe = cwe
+        self.locations = locations
+        self.code_flows = code_flows
+
+    @property
+    def uri(self) -> Optional[str]:
+        """URI of the primary location."""
+        return self.locations[0].uri if self.locations else None
+
+    def to_dict(self) -> Dict:
+        return {
+            'rule_id': self.rule_id,
+            'message': self.message,
+            'cwe': self.cwe,
+            'locations': [location.to_dict() for location in self.locations],
+            'code_flows': [[step.to_dict() for step in flow] for flow in self.code_flows],
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'SarifFinding':
+        return cls(
+            data.get('rule_id'),
+            data.get('message', ''),
+            data.get('cwe'),
+            tuple(SarifLocation.from_dict(location) for location in data.get('locations', [])),
+            tuple(tuple(SarifLocation.from_dict(step) for step in flow) for flow in data.get('code_flows', []))
+        )
+
+
+def extract_cwe_id(tags: List[str]) -> str:
+    """Extract CWE-ID from tags."""
+    for tag in tags:
+        if tag.startswith('external/cwe/cwe-'):
+            return tag.split('-')[-1]
+    return 'No CWE-ID available'
+
+
+class _JsonStream:
+    """
+    A minimal pull parser over a text file.
+
+    Containers the caller cares about are walked token by token; every other
+    value is decoded (or skipped) one element at a time with raw_decode, so
+    only the current element has to be buffered.
+    """
+    def __init__(self, file: TextIO, chunk_size: int = CHUNK_SIZE):
+        self.file = file
+        self.chunk_size = chunk_size
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self) -> bool:
+        if self.eof:
+            return False
+        chunk = self.file.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """Return the next non-whitespace character without consuming it."""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in ' \t\r\n':
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                raise ValueError("Unexpected end of SARIF input")
+
+    def expect(self, char: str) -> None:
+        if self.peek() != char:
+            raise ValueError(f"Expected '{char}' at SARIF offset {self.pos}, found '{self.buffer[self.pos]}'")
+        self.pos += 1
+
+    def read_value(self):
+        """Decode the next complete JSON value."""
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if self._fill():
+                    continue
+                raise
+            # A number may continue in the next chunk (e.g. "1" + ".5", "2e" + "-3")
+            if (isinstance(value, (int, float)) and not isinstance(value, bool)
+                    and not self.buffer[end:].strip(NUMBER_CHARS) and self._fill()):
+                continue
+            self.pos = end
+            return value
+
+    def skip_value(self) -> None:
+        """Skip the next value without materializing large containers."""
+        char = self.peek()
+        if char == '[':
+            for _ in self.iter_array():
+                self.skip_value()
+        elif char == '{':
+            for _ in self.iter_object():
+                self.skip_value()
+        else:
+            self.read_value()
+
+    def iter_array(self) -> Iterator[None]:
+        """Step through an array; the caller consumes one element per iteration."""
+        self.expect('[')
+        if self.peek() == ']':
+            self.pos += 1
+            return
+        while True:
+            yield None
+            if self.peek() == ',':
+                self.pos += 1
+                continue
+            self.expect(']')
+            return
+
+    def iter_object(self) -> Iterator[str]:
+        """Step through an object's keys; the caller consumes each member value."""
+        self.expect('{')
+        if self.peek() == '}':
+            self.pos += 1
+            return
+        while True:
+            key = self.read_value()
+            self.expect(':')
+            yield key
+            if self.peek() == ',':
+                self.pos += 1
+                continue
+            self.expect('}')
+            return
+
+
+class SarifReader:
+    """
+    Iterates over the findings of a SARIF log without loading it whole.
+
+    CodeQL writes a run's ``tool`` (with the rule metadata) before its
+    ``results``, so CWE ids are attached as findings are read. If a producer
+    writes results first, that run's findings are held back until its rules
+    have been read, so every finding is yielded with its ``cwe`` set.
+
+    Usage:
+        reader = SarifReader(path)
+        for finding in reader:
+            ...
+    """
+    def __init__(self, sarif_file: str, chunk_size: int = CHUNK_SIZE):
+        """
+        Initialize the reader.
+
+        Args:
+            sarif_file: Path to the SARIF log
+            chunk_size: Characters read from the file at a time
+        """
+        self.sarif_file = sarif_file
+        self.chunk_size = chunk_size
+        self.rules: Dict[str, Dict] = {}
+
+    def __iter__(self) -> Iterator[SarifFinding]:
+        with open(self.sarif_file, 'r') as file:
+            stream = _JsonStream(file, self.chunk_size)
+            for key in stream.iter_object():
+                if key != 'runs':
+                    stream.skip_value()
+                    continue
+                for _ in stream.iter_array():
+                    yield from self._read_run(stream)
+
+    def _read_run(self, stream: _JsonStream) -> Iterator[SarifFinding]:
+        run_rules: List[Dict] = []
+        tool_read = False
+        # Findings read before the run's rules, with their ruleIndex
+        pending: List[Tuple[SarifFinding, Optional[int]]] = []
+        for key in stream.iter_object():
+            if key == 'tool':
+                tool = stream.read_value()
+                run_rules = tool.get('driver', {}).get('rules', [])
+                for rule in run_rules:
+                    self.rules[rule['id']] = {
+                        'description': rule.get('shortDescription', {}).get('text', 'No description available'),
+                        'cwe': extract_cwe_id(rule.get('properties', {}).get('tags', [])),
+                    }
+                tool_read = True
+                yield from self._resolve(pending, run_rules)
+                pending = []
+            elif key == 'results':
+                for _ in stream.iter_array():
+                    result = stream.read_value()
+                    finding = self._finding(result, run_rules)
+                    if tool_read:
+                        yield finding
+                    else:
+                        pending.append((finding, result.get('ruleIndex')))
+            else:
+                stream.skip_value()
+        yield from self._resolve(pending, run_rules)
+
+    def _resolve(self, pending: List[Tuple[SarifFinding, Optional[int]]],
+                 run_rules: List[Dict]) -> Iterator[SarifFinding]:
+        """Attach rule ids and CWE ids to findings buffered before the run's rules were read."""
+        for finding, rule_index in pending:
+            if finding.rule_id is None and isinstance(rule_index, int) and rule_index < len(run_rules):
+                finding.rule_id = run_rules[rule_index]['id']
+            finding.cwe = self._cwe(finding.rule_id)
+            yield finding
+
+    def _cwe(self, rule_id: Optional[str]) -> Optional[str]:
+        return self.rules[rule_id]['cwe'] if rule_id in self.rules else None
+
+    def _finding(self, result: Dict, run_rules: List[Dict]) -> SarifFinding:
+        rule_id = result.get('ruleId') or result.get('rule', {}).get('id')
+        if rule_id is None and isinstance(result.get('ruleIndex'), int) and result['ruleIndex'] < len(run_rules):
+            rule_id = run_rules[result['ruleIndex']]['id']
+        locations = tuple(SarifLocation.from_sarif(location) for location in result.get('locations', []))
+        code_flows = tuple(
+            tuple(
+                SarifLocation.from_sarif(step.get('location', {}))
+                for thread_flow in flow.get('threadFlows', [])
+                for step in thread_flow.get('locations', [])
+            )
+            for flow in result.get('codeFlows', [])
+        )
+        return SarifFinding(
+            rule_id,
+            result.get('message', {}).get('text', 'No message available'),
+            self._cwe(rule_id),
+            locations,
+            code_flows
+        )
+
+
+def iter_sarif_findings(sarif_file: str) -> Iterator[SarifFinding]:
+    """Yield the findings of a SARIF log one at a time."""
+    return iter(SarifReader(sarif_file))
+
+
+def read_sarif_outline(sarif_file: str, chunk_size: int = CHUNK_SIZE) -> Tuple[Dict, List[Dict]]:
+    """
+    Read a SARIF log without its results.
+
+    Args:
+        sarif_file: Path to the SARIF log
+        chunk_size: Characters read from the file at a time
+
+    Returns:
+        Tuple of (top-level members other than runs, runs without their results)
+    """
+    log: Dict = {}
+    runs: List[Dict] = []
+    with open(sarif_file, 'r') as file:
+        stream = _JsonStream(file, chunk_size)
+        for key in stream.iter_object():
+            if key != 'runs':
+                log[key] = stream.read_value()
+                continue
+            for _ in stream.iter_array():
+                run: Dict = {}
+                for run_key in stream.iter_object():
+                    if run_key == 'results':
+                        stream.skip_value()
+                    else:
+                        run[run_key] = stream.read_value()
+                runs.append(run)
+    return log, runs
+
+
+def iter_sarif_results(sarif_file: str, chunk_size: int = CHUNK_SIZE) -> Iterator[Tuple[int, Dict]]:
+    """
+    Yield the raw results of a SARIF log one at a time.
+
+    Args:
+        sarif_file: Path to the SARIF log
+        chunk_size: Characters read from the file at a time
+
+    Returns:
+        Iterator over (run index, result object)
+    """
+    with open(sarif_file, 'r') as file:
+        stream = _JsonStream(file, chunk_size)
+        for key in stream.iter_object():
+            if key != 'runs':
+                stream.skip_value()
+                continue
+            for run_index, _ in enumerate(stream.iter_array()):
+                for run_key in stream.iter_object():
+                    if run_key != 'results':
+                        stream.skip_value()
+                        continue
+                    for _ in stream.iter_array():
+                        yield run_index, stream.read_value()
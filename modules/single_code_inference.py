@@ -12,13 +12,13 @@ A simplified interface for detecting vulnerabilities in a single piece of code.
 import logging
 import torch
 import numpy as np
-from typing import Dict, Optional, Tuple
+from typing import Dict, List, Optional, Tuple
 from dataclasses import dataclass
 
 from modules.mask import preprocess_and_mask
 from modules.vulnerability_detector import (
     ModelConfig, VulnerabilityDetector, VulnerabilityModel, 
-    ModelLoader, CodePreprocessor, MetricsCalculator
+    ModelLoader, CodePreprocessor, MetricsCalculator, pad_batch
 )
 
 # Setup logging
@@ -52,7 +52,12 @@ class SingleCodeDetector:
                  checkpoint_path: Optional[str] = None,
                  model_type: str = "roberta",
                  num_labels: int = 4,
-                 device: Optional[str] = None):
+                 device: Optional[str] = None,
+                 batch_size: int = 16,
+                 dynamic_padding: bool = True,
+                 backend: str = 'torch',
+                 onnx_path: Optional[str] = None,
+                 quantization: Optional[str] = None):
         """
         Initialize single code detector.
         
@@ -62,28 +67,52 @@ class SingleCodeDetector:
             model_type: Type of model architecture
             num_labels: Number of vulnerability classes
             device: Device to run on ('cpu', 'cuda', or None for auto)
+            batch_size: Number of snippets per forward pass in predict_batch
+            dynamic_padding: Pad to the longest snippet of each batch instead
+                of block_size
+            backend: 'torch' (eager PyTorch) or 'onnx' (ONNX Runtime, CPU)
+            onnx_path: Exported graph for the onnx backend (see modules.onnx_export)
+            quantization: 'int8' to quantize the Linear layers of the torch
+                backend (CPU only)
         """
+        if backend not in ('torch', 'onnx'):
+            raise ValueError(f"Unsupported backend: {backend}")
+        if backend == 'onnx' and not onnx_path:
+            raise ValueError("onnx_path is required for the onnx backend")
+        if backend == 'onnx' and quantization:
+            raise ValueError("quantization applies to the torch backend only")
+        self.backend = backend
+        self.onnx_path = onnx_path
+
         self.config = ModelConfig(
             model_name_or_path=model_name_or_path,
             checkpoint_path=checkpoint_path,
             model_type=model_type,
             num_labels=num_labels,
             device=device,
-            batch_size=1,  # Single inference
-            block_size=512
+            batch_size=max(1, batch_size),
+            block_size=512,
+            dynamic_padding=dynamic_padding,
+            quantization=quantization
         )
         
-        self.device = torch.device(self.config.device)
+        # ONNX Runtime runs on CPU, inputs are built there
+        self.device = torch.device('cpu' if backend == 'onnx' else self.config.device)
         self.preprocessor = CodePreprocessor()
         
         # Load model and tokenizer
         self.tokenizer, self.model = self._load_model()
         
-        logger.info(f"Single code detector initialized on {self.device}")
+        logger.info(f"Single code detector initialized on {self.device} ({self.backend} backend)")
     
     def _load_model(self) -> Tuple:
         """Load model and tokenizer."""
         model_loader = ModelLoader(self.config)
+        if self.backend == 'onnx':
+            # The checkpoint is baked into the exported graph
+            from modules.onnx_export import OnnxClassifier
+            return model_loader.load_tokenizer(), OnnxClassifier(self.onnx_path)
+        
         model_config, tokenizer, base_model = model_loader.load_tokenizer_and_base_model()
         
         # Build classifier model
@@ -97,6 +126,7 @@ class SingleCodeDetector:
         
         model.to(self.device)
         model.eval()
+        model = model_loader.quantize_model(model)
         
         return tokenizer, model
     
@@ -116,35 +146,40 @@ class SingleCodeDetector:
             processed_code = self._preprocess_code(code, language)
             
             # Tokenize
-            input_ids = self._tokenize_code(processed_code)
+            input_ids, attention_mask = self._encode_batch([self._tokenize_code(processed_code)])
             
             # Run inference
             with torch.no_grad():
-                logits = self.model(input_ids)
+                logits = self.model(input_ids, attention_mask)
                 probabilities = torch.softmax(logits, dim=-1)
-                prediction = torch.argmax(logits, dim=-1).item()
-                confidence = probabilities.max().item()
-                
-                # Convert probabilities to dict
-                prob_dict = {
-                    i: probabilities[0][i].item() 
-                    for i in range(self.config.num_labels)
-                }
             
-            vulnerability_type = self.VULNERABILITY_TYPES.get(prediction, f"Class_{prediction}")
-            
-            return SingleCodeResult(
-                prediction=prediction,
-                confidence=confidence,
-                probabilities=prob_dict,
-                processed_code=processed_code,
-                vulnerability_type=vulnerability_type
-            )
+            return self._build_result(probabilities[0], processed_code)
             
         except Exception as e:
             logger.error(f"Error during prediction: {e}")
             raise
     
+    def _build_result(self, probabilities: torch.Tensor, processed_code: str) -> SingleCodeResult:
+        """Build a SingleCodeResult from the class probabilities of one snippet."""
+        prediction = torch.argmax(probabilities).item()
+        confidence = probabilities.max().item()
+        
+        # Convert probabilities to dict
+        prob_dict = {
+            i: probabilities[i].item()
+            for i in range(self.config.num_labels)
+        }
+        
+        vulnerability_type = self.VULNERABILITY_TYPES.get(prediction, f"Class_{prediction}")
+        
+        return SingleCodeResult(
+            prediction=prediction,
+            confidence=confidence,
+            probabilities=prob_dict,
+            processed_code=processed_code,
+            vulnerability_type=vulnerability_type
+        )
+    
     def _preprocess_code(self, code: str, language: str) -> str:
         """Preprocess code using masking."""
         try:
@@ -160,50 +195,68 @@ class SingleCodeDetector:
             # Fallback to simple preprocessing
             return self.preprocessor.preprocess_code(code, language)
     
-    def _tokenize_code(self, code: str) -> torch.Tensor:
-        """Tokenize code for the model."""
+    def _tokenize_code(self, code: str) -> List[int]:
+        """Tokenize code for the model (unpadded, see _encode_batch)."""
         if self.config.model_type in ["codet5", "t5", "codegen", "codellama"]:
             # Generative models
-            input_ids = self.tokenizer.encode(
+            return self.tokenizer.encode(
                 code,
                 max_length=self.config.block_size,
-                padding='max_length',
-                truncation=True,
-                return_tensors='pt'
+                truncation=True
             )
-        else:
-            # Encoder models (BERT, RoBERTa, etc.)
-            tokens = self.tokenizer.tokenize(code)
-            tokens = tokens[:self.config.block_size - 2]
-            
-            # Add special tokens
-            source_tokens = [self.tokenizer.cls_token] + tokens + [self.tokenizer.sep_token]
-            source_ids = self.tokenizer.convert_tokens_to_ids(source_tokens)
-            
-            # Add padding
-            padding_length = self.config.block_size - len(source_ids)
-            source_ids += [self.tokenizer.pad_token_id] * padding_length
-            
-            input_ids = torch.tensor([source_ids], dtype=torch.long)
         
-        return input_ids.to(self.device)
+        # Encoder models (BERT, RoBERTa, etc.)
+        tokens = self.tokenizer.tokenize(code)
+        tokens = tokens[:self.config.block_size - 2]
+        
+        # Add special tokens
+        source_tokens = [self.tokenizer.cls_token] + tokens + [self.tokenizer.sep_token]
+        return self.tokenizer.convert_tokens_to_ids(source_tokens)
+    
+    def _encode_batch(self, sequences: List[List[int]]) -> Tuple[torch.Tensor, torch.Tensor]:
+        """Pad token IDs into (input_ids, attention_mask) tensors on the model device."""
+        pad_to = None if self.config.dynamic_padding else self.config.block_size
+        input_ids, attention_mask = pad_batch(sequences, self.tokenizer.pad_token_id, pad_to)
+        return input_ids.to(self.device), attention_mask.to(self.device)
     
-    def predict_batch(self, codes: list, language: str = 'cpp') -> list:
+    def predict_batch(self, codes: List[str], language: str = 'cpp',
+                      batch_size: Optional[int] = None) -> List[SingleCodeResult]:
         """
         Predict vulnerabilities for multiple code snippets.
         
+        All snippets are masked and tokenized up front, sorted by length so
+        that each batch pads as little as possible, then run through the
+        model batch_size at a time with one forward pass per batch.
+        
         Args:
             codes: List of source code strings
             language: Programming language
+            batch_size: Snippets per forward pass (config.batch_size if None)
             
         Returns:
-            List of SingleCodeResult objects
+            List of SingleCodeResult objects, in the order of codes
         """
-        results = []
-        for code in codes:
-            result = self.predict(code, language)
-            results.append(result)
-        return results
+        batch_size = max(1, batch_size or self.config.batch_size)
+        try:
+            processed_codes = [self._preprocess_code(code, language) for code in codes]
+            encoded = [self._tokenize_code(processed_code) for processed_code in processed_codes]
+            order = sorted(range(len(encoded)), key=lambda i: -len(encoded[i]))
+            
+            results = [None] * len(encoded)
+            with torch.no_grad():
+                for start in range(0, len(order), batch_size):
+                    indices = order[start:start + batch_size]
+                    input_ids, attention_mask = self._encode_batch([encoded[i] for i in indices])
+                    logits = self.model(input_ids, attention_mask)
+                    probabilities = torch.softmax(logits, dim=-1)
+                    for i, row in zip(indices, probabilities):
+                        results[i] = self._build_result(row, processed_codes[i])
+            
+            return results
+            
+        except Exception as e:
+            logger.error(f"Error during batch prediction: {e}")
+            raise
 
 
 def get_user_code():
@@ -319,41 +372,45 @@ def analyze_code(detector, code):
         # print("=" * 40)
         
         result = detector.predict(code.strip(), language='c')
-        
-        # Determine risk level and color
-        # if result.confidence > 0.8:
-        #     risk_level = "HIGH RISK"
-        # elif result.confidence > 0.5:
-        #     risk_level = "MEDIUM RISK" 
-        # else:
-        #     risk_level = "LOW RISK"
-        
-        lines = []
-        lines.append(f"RESULT: {result.vulnerability_type}\n")
-        lines.append(f"CONFIDENCE: {result.confidence:.3f}\n")
-        # print(f"RISK LEVEL: {risk_level}")
-
-        # output_path = "result.txt"
-        # with open(output_path, "w", encoding="utf-8") as f:
-        #     f.write(f"-{result.vulnerability_type}")
-
-        lines.append("Detailed Probabilities:\n")
-        sorted_probs = sorted(result.probabilities.items(), key=lambda x: x[1], reverse=True)
-        for class_id, prob in sorted_probs:
-            vuln_type = detector.VULNERABILITY_TYPES.get(class_id, f"Class_{class_id}")
-            bar_length = int(prob * 20)  # Simple text bar
-            bar = "█" * bar_length + "░" * (20 - bar_length)
-            # result.append(f"  {vuln_type:20} {bar} {prob:.3f}\n")
-            lines.append(f"  {vuln_type:20} {prob:.3f}\n")
-        
-        # print("=" * 40)
-        
-        return result.vulnerability_type, "".join(lines)
+        return format_result(detector, result)
         
     except Exception as e:
         print(f"Error analyzing code: {e}")
 
 
+def format_result(detector, result):
+    """Format a SingleCodeResult as (vulnerability type, report text)."""
+    # Determine risk level and color
+    # if result.confidence > 0.8:
+    #     risk_level = "HIGH RISK"
+    # elif result.confidence > 0.5:
+    #     risk_level = "MEDIUM RISK" 
+    # else:
+    #     risk_level = "LOW RISK"
+    
+    lines = []
+    lines.append(f"RESULT: {result.vulnerability_type}\n")
+    lines.append(f"CONFIDENCE: {result.confidence:.3f}\n")
+    # print(f"RISK LEVEL: {risk_level}")
+
+    # output_path = "result.txt"
+    # with open(output_path, "w", encoding="utf-8") as f:
+    #     f.write(f"-{result.vulnerability_type}")
+
+    lines.append("Detailed Probabilities:\n")
+    sorted_probs = sorted(result.probabilities.items(), key=lambda x: x[1], reverse=True)
+    for class_id, prob in sorted_probs:
+        vuln_type = detector.VULNERABILITY_TYPES.get(class_id, f"Class_{class_id}")
+        bar_length = int(prob * 20)  # Simple text bar
+        bar = "█" * bar_length + "░" * (20 - bar_length)
+        # result.append(f"  {vuln_type:20} {bar} {prob:.3f}\n")
+        lines.append(f"  {vuln_type:20} {prob:.3f}\n")
+    
+    # print("=" * 40)
+    
+    return result.vulnerability_type, "".join(lines)
+
+
 def main():
     # import pdb; pdb.set_trace()
     """Main function with different modes."""
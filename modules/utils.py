@@ -33,6 +33,18 @@ def extract_cwe_ids(text: str) -> list[str]:
             unique.append(cwe)
     return "\n".join(unique)
 
+# CodeQL 분석 보고서의 '- Rule ID:' 줄에서 규칙 ID(예: cpp/overflow-buffer)를
+# 등장 순서대로 중복 없이 반환함. (한 줄에 여러 규칙이 ', '로 나열될 수 있음)
+def extract_rule_ids(report: str) -> list[str]:
+    pattern = re.compile(r'^\s*-\s*Rule ID:\s*(.+)$', re.MULTILINE)
+    rule_ids = []
+    for m in pattern.finditer(report):
+        for rule_id in m.group(1).split(','):
+            rule_id = rule_id.strip()
+            if rule_id and rule_id != 'None' and rule_id not in rule_ids:
+                rule_ids.append(rule_id)
+    return rule_ids
+
 # def extract_cpp_code(text: str) -> str:
 #     """
 #     입력 문자열에서 C++/C 코드 블록만 추출하는 함수.
@@ -17,6 +17,7 @@ from modules.mask import preprocess_and_mask
 import json
 import logging
 import os
+import time
 from dataclasses import dataclass, field
 from pathlib import Path
 from typing import Any, Dict, List, Optional, Tuple, Union
@@ -30,7 +31,7 @@ from sklearn.metrics import (
     confusion_matrix,
     precision_recall_fscore_support,
 )
-from torch.utils.data import DataLoader, Dataset, SequentialSampler
+from torch.utils.data import DataLoader, Dataset, Sampler, SequentialSampler
 from transformers import (
     AutoConfig,
     AutoModel,
@@ -76,9 +77,14 @@ class ModelConfig:
     batch_size: int = 32
     do_lower_case: bool = False
     
+    # Batching configuration
+    dynamic_padding: bool = True  # pad to the longest input of each batch instead of block_size
+    length_bucketing: bool = True  # batch inputs of similar length together
+    
     # Hardware configuration
     device: Optional[str] = None
     no_cuda: bool = False
+    quantization: Optional[str] = None  # 'int8': dynamic int8 quantization of Linear layers (CPU only)
     
     def __post_init__(self):
         """Post-initialization validation and defaults."""
@@ -86,8 +92,15 @@ class ModelConfig:
             self.tokenizer_name = self.model_name_or_path
         if not self.config_name:
             self.config_name = self.model_name_or_path
+        if self.quantization not in (None, 'int8'):
+            raise ValueError(f"Unsupported quantization: {self.quantization}")
         if self.device is None:
-            self.device = "cuda" if torch.cuda.is_available() and not self.no_cuda else "cpu"
+            if self.quantization:
+                self.device = "cpu"  # quantized kernels only run on CPU
+            else:
+                self.device = "cuda" if torch.cuda.is_available() and not self.no_cuda else "cpu"
+        elif self.quantization and self.device != "cpu":
+            raise ValueError(f"{self.quantization} quantization requires device 'cpu', got '{self.device}'")
 
 
 @dataclass
@@ -106,6 +119,7 @@ class InferenceResult:
     labels: np.ndarray
     logits: Optional[np.ndarray] = None
     metrics: Optional[Dict[str, float]] = None
+    inference_seconds: Optional[float] = None
 
 
 class ModelRegistry:
@@ -226,16 +240,15 @@ class VulnerabilityDataset(Dataset):
         )
     
     def _tokenize_generative_model(self, code: str) -> List[int]:
-        """Tokenize for generative models (T5, CodeGen, etc.)."""
+        """Tokenize for generative models (T5, CodeGen, etc.), unpadded."""
         return self.tokenizer.encode(
             code.split("</s>")[0],
             max_length=self.config.block_size,
-            padding='max_length',
             truncation=True,
         )
     
     def _tokenize_encoder_model(self, code: str) -> Tuple[List[str], List[int]]:
-        """Tokenize for encoder models (BERT, RoBERTa, etc.)."""
+        """Tokenize for encoder models (BERT, RoBERTa, etc.), unpadded."""
         tokens = self.tokenizer.tokenize(code)
         tokens = tokens[:self.config.block_size - 2]
         
@@ -243,18 +256,18 @@ class VulnerabilityDataset(Dataset):
         source_tokens = [self.tokenizer.cls_token] + tokens + [self.tokenizer.sep_token]
         source_ids = self.tokenizer.convert_tokens_to_ids(source_tokens)
         
-        # Add padding
-        padding_length = self.config.block_size - len(source_ids)
-        source_ids += [self.tokenizer.pad_token_id] * padding_length
-        
         return source_tokens, source_ids
     
+    def lengths(self) -> List[int]:
+        """Return the token count of every example."""
+        return [len(features.input_ids) for features in self.examples]
+    
     def __len__(self) -> int:
         """Return dataset size."""
         return len(self.examples)
     
     def __getitem__(self, idx: int) -> Tuple[torch.Tensor, torch.Tensor]:
-        """Get item by index."""
+        """Get item by index (input IDs are unpadded, see PaddingCollator)."""
         features = self.examples[idx]
         return (
             torch.tensor(features.input_ids, dtype=torch.long),
@@ -262,6 +275,97 @@ class VulnerabilityDataset(Dataset):
         )
 
 
+def pad_batch(sequences: List[List[int]], pad_token_id: int,
+              pad_to: Optional[int] = None) -> Tuple[torch.Tensor, torch.Tensor]:
+    """
+    Pad token ID sequences into a batch.
+    
+    Args:
+        sequences: Unpadded token IDs of each input
+        pad_token_id: Padding token ID
+        pad_to: Fixed length to pad to (the longest sequence if None)
+        
+    Returns:
+        Tuple of (input_ids, attention_mask), both of shape (batch, length)
+    """
+    length = pad_to or max(len(ids) for ids in sequences)
+    input_ids = torch.full((len(sequences), length), pad_token_id, dtype=torch.long)
+    attention_mask = torch.zeros((len(sequences), length), dtype=torch.long)
+    for row, ids in enumerate(sequences):
+        ids = list(ids)[:length]
+        input_ids[row, :len(ids)] = torch.as_tensor(ids, dtype=torch.long)
+        attention_mask[row, :len(ids)] = 1
+    return input_ids, attention_mask
+
+
+class PaddingCollator:
+    """DataLoader collate_fn that pads (input_ids, label) items and builds the attention mask."""
+    
+    def __init__(self, pad_token_id: int, pad_to: Optional[int] = None):
+        """
+        Initialize the collator.
+        
+        Args:
+            pad_token_id: Padding token ID
+            pad_to: Fixed length to pad to (dynamic padding if None)
+        """
+        self.pad_token_id = pad_token_id
+        self.pad_to = pad_to
+    
+    def __call__(self, batch: List[Tuple[torch.Tensor, torch.Tensor]]) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
+        """Return (input_ids, attention_mask, labels) for a batch."""
+        input_ids, attention_mask = pad_batch(
+            [ids.tolist() for ids, _ in batch], self.pad_token_id, self.pad_to
+        )
+        labels = torch.stack([label for _, label in batch])
+        return input_ids, attention_mask, labels
+
+
+class LengthBucketBatchSampler(Sampler):
+    """
+    Batch sampler that groups inputs of similar length.
+    
+    Indices are sorted by length (longest first, so an out-of-memory error
+    shows up on the first batch) and cut into batches of batch_size, which
+    keeps the padding of each batch small under dynamic padding. ``order``
+    lists the dataset indices in the order they are yielded, for restoring
+    the original order of the outputs.
+    """
+    
+    def __init__(self, lengths: List[int], batch_size: int):
+        """
+        Initialize the sampler.
+        
+        Args:
+            lengths: Token count of every example
+            batch_size: Examples per batch
+        """
+        self.batch_size = max(1, batch_size)
+        self.order = sorted(range(len(lengths)), key=lambda i: (-lengths[i], i))
+    
+    def __iter__(self):
+        for start in range(0, len(self.order), self.batch_size):
+            yield self.order[start:start + self.batch_size]
+    
+    def __len__(self) -> int:
+        return (len(self.order) + self.batch_size - 1) // self.batch_size
+
+
+def restore_order(order: List[int], *arrays: np.ndarray) -> Tuple[np.ndarray, ...]:
+    """
+    Put outputs collected in batch order back in dataset order.
+    
+    Args:
+        order: Dataset index of every output row (LengthBucketBatchSampler.order)
+        *arrays: Outputs concatenated over the batches
+    
+    Returns:
+        The arrays, row i holding the output of dataset index i
+    """
+    restore = np.argsort(order)
+    return tuple(array[restore] for array in arrays)
+
+
 class VulnerabilityModel(nn.Module):
     """Enhanced vulnerability detection model."""
     
@@ -315,10 +419,20 @@ class VulnerabilityModel(nn.Module):
         lengths = mask.sum(dim=1).clamp(min=1e-9)
         return summed / lengths
     
-    def forward(self, input_ids: torch.Tensor, labels: Optional[torch.Tensor] = None) -> Union[torch.Tensor, Tuple[torch.Tensor, torch.Tensor]]:
-        """Forward pass."""
-        pad_token_id = self._get_pad_token_id()
-        attention_mask = input_ids.ne(pad_token_id)
+    def forward(self, input_ids: torch.Tensor, attention_mask: Optional[torch.Tensor] = None,
+                labels: Optional[torch.Tensor] = None) -> Union[torch.Tensor, Tuple[torch.Tensor, torch.Tensor]]:
+        """
+        Forward pass.
+        
+        Args:
+            input_ids: Token IDs of shape (batch, length)
+            attention_mask: 1 for real tokens, 0 for padding (derived from
+                the padding token if None)
+            labels: Optional labels for computing the loss
+        """
+        if attention_mask is None:
+            pad_token_id = self._get_pad_token_id()
+            attention_mask = input_ids.ne(pad_token_id)
         
         # Get encoder outputs
         outputs = self.encoder(
@@ -438,6 +552,36 @@ class ModelLoader:
         
         return model_config, tokenizer, base_model
     
+    def quantize_model(self, model: nn.Module) -> nn.Module:
+        """
+        Apply the configured quantization to a loaded model.
+        
+        With quantization='int8' the weights of every nn.Linear layer are
+        stored as int8 and activations are quantized on the fly, which
+        shrinks the encoder roughly 4x and speeds up CPU inference.
+        Call after the checkpoint is loaded.
+        
+        Args:
+            model: Model in eval mode, on CPU
+            
+        Returns:
+            The quantized model (the model itself if quantization is off)
+        """
+        if not self.config.quantization:
+            return model
+        
+        from torch.ao.quantization import quantize_dynamic
+        
+        logger.info(f"Applying {self.config.quantization} dynamic quantization to Linear layers")
+        return quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+    
+    def load_tokenizer(self) -> Any:
+        """Load only the tokenizer (e.g. for a model served outside PyTorch)."""
+        _, _, tokenizer_class = self.registry.get_model_classes(self.config.model_type)
+        tokenizer = self._load_tokenizer(tokenizer_class)
+        self._set_block_size(tokenizer)
+        return tokenizer
+    
     def _load_tokenizer(self, tokenizer_class) -> Any:
         """Load and configure tokenizer."""
         kwargs = {'do_lower_case': self.config.do_lower_case}
@@ -494,6 +638,7 @@ class VulnerabilityDetector:
         
         model.to(self.device)
         model.eval()
+        model = self.model_loader.quantize_model(model)
         
         logger.info(f"Model loaded on device: {self.device}")
         return tokenizer, model
@@ -531,19 +676,18 @@ class VulnerabilityDetector:
             
             # Create dataset and dataloader
             dataset = VulnerabilityDataset(tokenizer, self.config, data_file)
-            sampler = SequentialSampler(dataset)
-            dataloader = DataLoader(
-                dataset, 
-                sampler=sampler, 
-                batch_size=self.config.batch_size
-            )
+            dataloader, order = self._build_dataloader(dataset, tokenizer)
             
             # Run inference
+            start = time.perf_counter()
             all_logits, all_labels = self._run_inference_loop(model, dataloader)
+            inference_seconds = time.perf_counter() - start
             
-            # Process results
+            # Process results (back in dataset order if batches were bucketed)
             logits = np.concatenate(all_logits, axis=0)
             labels = np.concatenate(all_labels, axis=0)
+            if order is not None:
+                logits, labels = restore_order(order, logits, labels)
             predictions = np.argmax(logits, axis=1)
             
             logger.info(f"Processed {len(predictions)} samples")
@@ -561,7 +705,8 @@ class VulnerabilityDetector:
                 predictions=predictions,
                 labels=labels,
                 logits=logits,
-                metrics=metrics
+                metrics=metrics,
+                inference_seconds=inference_seconds
             )
             
             # Save results if output file specified
@@ -578,6 +723,31 @@ class VulnerabilityDetector:
             logger.error(f"Error during inference: {e}")
             raise
     
+    def _build_dataloader(self, dataset: VulnerabilityDataset, tokenizer) -> Tuple[DataLoader, Optional[List[int]]]:
+        """
+        Build the inference dataloader.
+        
+        Returns:
+            Tuple of (dataloader, order), where order lists the dataset
+            indices in batch order when length bucketing is on, else None
+        """
+        pad_to = None if self.config.dynamic_padding else self.config.block_size
+        collator = PaddingCollator(tokenizer.pad_token_id, pad_to)
+        
+        if self.config.length_bucketing:
+            batch_sampler = LengthBucketBatchSampler(dataset.lengths(), self.config.batch_size)
+            dataloader = DataLoader(dataset, batch_sampler=batch_sampler, collate_fn=collator)
+            return dataloader, batch_sampler.order
+        
+        sampler = SequentialSampler(dataset)
+        dataloader = DataLoader(
+            dataset, 
+            sampler=sampler, 
+            batch_size=self.config.batch_size,
+            collate_fn=collator
+        )
+        return dataloader, None
+    
     def _run_inference_loop(self, model: VulnerabilityModel, dataloader: DataLoader) -> Tuple[List[np.ndarray], List[np.ndarray]]:
         """Run the actual inference loop."""
         all_logits, all_labels = [], []
@@ -588,11 +758,12 @@ class VulnerabilityDetector:
                 if i % 100 == 0:
                     logger.info(f"Processing batch {i+1}/{len(dataloader)}")
                 
-                inputs, labels = batch
+                inputs, attention_mask, labels = batch
                 inputs = inputs.to(self.device)
+                attention_mask = attention_mask.to(self.device)
                 labels = labels.to(self.device)
                 
-                logits = model(inputs)
+                logits = model(inputs, attention_mask)
                 
                 all_logits.append(logits.detach().cpu().numpy())
                 all_labels.append(labels.detach().cpu().numpy())
@@ -663,10 +834,16 @@ def main():
                        help="Maximum sequence length")
     parser.add_argument("--batch_size", type=int, default=32,
                        help="Inference batch size")
+    parser.add_argument("--no_dynamic_padding", action="store_true",
+                       help="Pad every input to block_size instead of the longest input of its batch")
+    parser.add_argument("--no_length_bucketing", action="store_true",
+                       help="Batch inputs in file order instead of by length")
     
     # Hardware arguments
     parser.add_argument("--no_cuda", action="store_true",
                        help="Disable CUDA")
+    parser.add_argument("--quantization", type=str, choices=["int8"],
+                       help="Quantize the Linear layers (CPU only)")
     
     args = parser.parse_args()
     
@@ -681,7 +858,10 @@ def main():
         num_labels=args.num_labels,
         block_size=args.block_size,
         batch_size=args.batch_size,
+        dynamic_padding=not args.no_dynamic_padding,
+        length_bucketing=not args.no_length_bucketing,
         no_cuda=args.no_cuda,
+        quantization=args.quantization,
     )
     
     # Run inference
@@ -0,0 +1,191 @@
+"""
+Query planner tests (modules/query_planner.py): every pruned query must stay
+selected for code it reports on.
+
+    python -m pytest query_planner_test.py
+"""
+
+import os
+
+import pytest
+
+pytest.importorskip('tree_sitter_cpp')
+
+from modules.query_planner import QUERY_TRIGGERS, QueryPlanner, read_query_id
+
+QUERY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'codeql-queries', 'cpp', 'top25')
+
+# Known-positive samples per query (one per query branch where the branches
+# need different code), mostly after the examples of the query help.
+POSITIVE_SAMPLES = {
+    'cpp/alloca-in-loop': [
+        '#include <alloca.h>\nvoid f(int n) {\n  for (int i = 0; i < n; i++) {\n    char *p = (char *)alloca(64);\n    p[0] = 0;\n  }\n}\n',
+        '#include <malloc.h>\nvoid f(int n) {\n  while (n--) {\n    char *p = (char *)_malloca(64);\n  }\n}\n',
+    ],
+    'cpp/allocation-too-small': [
+        '#include <stdlib.h>\nvoid f() {\n  int *p = (int *)malloc(2);\n}\n',
+        '#include <string.h>\nstruct S { long a, b; };\nvoid f() {\n  struct S *s = (struct S *)strdup("x");\n}\n',
+    ],
+    'cpp/suspicious-allocation-size': [
+        '#include <stdlib.h>\nvoid f() {\n  int *p = (int *)calloc(1, 6);\n}\n',
+    ],
+    'cpp/arithmetic-with-extreme-values': [
+        '#include <limits.h>\nint f() {\n  int x = INT_MAX;\n  return x + 1;\n}\n',
+        '#include <limits.h>\nint f() {\n  short s = SHRT_MIN;\n  return s - 1;\n}\n',
+    ],
+    'cpp/badly-bounded-write': [
+        '#include <string.h>\nvoid f(const char *s) {\n  char buf[8];\n  strncpy(buf, s, 16);\n}\n',
+        '#include <stdio.h>\nvoid f(const char *s) {\n  char buf[8];\n  snprintf(buf, 16, "%s", s);\n}\n',
+    ],
+    'cpp/overrunning-write': [
+        '#include <string.h>\nvoid f() {\n  char buf[4];\n  strcpy(buf, "too long");\n}\n',
+        '#include <wchar.h>\nvoid f() {\n  wchar_t buf[4];\n  wcscat(buf, L"too long");\n}\n',
+        '#include <tchar.h>\nvoid f() {\n  TCHAR buf[4];\n  _getts(buf);\n}\n',
+    ],
+    'cpp/overrunning-write-with-float': [
+        '#include <stdio.h>\nvoid f(double d) {\n  char buf[16];\n  sprintf(buf, "%f", d);\n}\n',
+    ],
+    'cpp/very-likely-overrunning-write': [
+        '#include <stdio.h>\nvoid f() {\n  char buf[4];\n  int n = 12345;\n  sprintf(buf, "%d", n);\n}\n',
+    ],
+    'cpp/unbounded-write': [
+        '#include <stdio.h>\n#include <string.h>\nint main(int argc, char **argv) {\n  char buf[16];\n  strcpy(buf, argv[1]);\n}\n',
+        '#include <stdio.h>\nvoid f() {\n  char buf[16];\n  scanf("%s", buf);\n}\n',
+        '#include <stdlib.h>\nvoid f(const char *p) {\n  char buf[16];\n  realpath(p, buf);\n}\n',
+    ],
+    'cpp/potential-buffer-overflow': [
+        '#include <stdio.h>\nvoid f(int n) {\n  char buf[4];\n  sprintf(buf, "%d", n);\n}\n',
+        '#include <cstdio>\nvoid f(int n) {\n  char buf[4];\n  std::sprintf(buf, "%d", n);\n}\n',
+    ],
+    'cpp/no-space-for-terminator': [
+        '#include <stdlib.h>\n#include <string.h>\nchar *f(const char *s) {\n  char *p = (char *)malloc(strlen(s));\n  strcpy(p, s);\n  return p;\n}\n',
+        '#include <mbstring.h>\n#include <stdlib.h>\nvoid f(const unsigned char *s) {\n  unsigned char *p = (unsigned char *)malloc(_mbslen(s));\n  _mbscpy(p, s);\n}\n',
+    ],
+    'cpp/dangerous-use-convert-function': [
+        # Wide array terminated at its byte size, no call at all
+        'void f() {\n  wchar_t buf[16];\n  buf[sizeof(buf) - 1] = 0;\n}\n',
+        # The same through a macro
+        '#define TERMINATE(b) b[sizeof(b) - 1] = 0\nvoid f() {\n  wchar_t buf[16];\n  TERMINATE(buf);\n}\n',
+        # mbtowc in a loop with a constant length
+        '#include <stdlib.h>\nvoid f(const char *s, wchar_t *w, int n) {\n  while (n > 0) {\n    int len = mbtowc(w, s, 4);\n    s += len; n -= len;\n  }\n}\n',
+        # mbs*/mbc* buffers copied in a loop bounded by sizeof
+        '#include <mbstring.h>\nvoid f(const unsigned char *src) {\n  unsigned char dst[16];\n  for (unsigned i = 0; i < sizeof(dst); i++) {\n    _mbccpy(dst + i, src + i);\n  }\n}\n',
+        '#include <mbstring.h>\nvoid f(unsigned char *dst, const unsigned char *src) {\n  _mbsncpy(dst, src, mbclen(src));\n}\n',
+        # String conversions
+        '#include <stdlib.h>\nvoid f(const char *s) {\n  wchar_t w[8];\n  mbstowcs(w, s, 8);\n  wprintf(L"%ls", w);\n}\n',
+        '#include <windows.h>\nvoid f(const char *s) {\n  wchar_t *w = (wchar_t *)malloc(10);\n  MultiByteToWideChar(CP_ACP, 0, s, -1, w, 10);\n}\n',
+    ],
+    'cpp/memory-leak-on-failed-call-to-realloc': [
+        '#include <stdlib.h>\nvoid f(char *p, size_t n) {\n  p = (char *)realloc(p, n);\n}\n',
+    ],
+    'cpp/catch-missing-free': [
+        'void g();\nvoid f() {\n  try {\n    g();\n  } catch (int *e) {\n  }\n}\n',
+        'void g();\nvoid f() try {\n  g();\n} catch (int *e) {\n}\n',
+    ],
+    'cpp/comparison-with-wider-type': [
+        'void f(unsigned long long n) {\n  for (unsigned char i = 0; i < n; i++) {\n  }\n}\n',
+        '#define COUNT_UP(i, n) while (i < n) i++\nvoid f(unsigned long long n) {\n  unsigned char i = 0;\n  COUNT_UP(i, n);\n}\n',
+    ],
+    'cpp/offset-use-before-range-check': [
+        'int f(int *a, int i, int n) {\n  return a[i] >= 0 && i < n;\n}\n',
+    ],
+    'cpp/cgi-xss': [
+        '#include <stdio.h>\n#include <stdlib.h>\nvoid f() {\n  printf("%s", getenv("QUERY_STRING"));\n}\n',
+    ],
+    'cpp/sql-injection': [
+        '#include <stdio.h>\n#include <sqlite3.h>\nvoid f(sqlite3 *db, char *name) {\n  char q[256];\n  gets(name);\n  sprintf(q, "SELECT * FROM t WHERE n=\'%s\'", name);\n  sqlite3_exec(db, q, 0, 0, 0);\n}\n',
+        '#include <mysql.h>\nvoid f(MYSQL *db, char *q) {\n  mysql_query(db, q);\n}\n',
+        '#include <libpq-fe.h>\nvoid f(PGconn *c, char *q) {\n  PQexec(c, q);\n}\n',
+    ],
+    'cpp/command-line-injection': [
+        '#include <stdio.h>\n#include <stdlib.h>\nint main(int argc, char **argv) {\n  char cmd[256];\n  snprintf(cmd, 256, "cat %s", argv[1]);\n  system(cmd);\n}\n',
+        '#include <unistd.h>\nvoid f(char *cmd) {\n  execl("/bin/sh", "sh", "-c", cmd, (char *)0);\n}\n',
+        '#include <windows.h>\nvoid f(char *cmd) {\n  WinExec(cmd, 0);\n}\n',
+    ],
+    'cpp/wordexp-injection': [
+        '#include <wordexp.h>\nint main(int argc, char **argv) {\n  wordexp_t w;\n  wordexp(argv[1], &w, 0);\n}\n',
+    ],
+    'cpp/unsafe-dacl-security-descriptor': [
+        '#include <windows.h>\nvoid f(SECURITY_DESCRIPTOR *sd) {\n  SetSecurityDescriptorDacl(sd, TRUE, NULL, FALSE);\n}\n',
+    ],
+    'cpp/linux-kernel-double-fetch-vulnerability': [
+        'long f(int *dst, int *src) {\n  int len;\n  copy_from_user(&len, src, 4);\n  if (len > 64) return -1;\n  copy_from_user(dst, src, len);\n  return 0;\n}\n',
+    ],
+    'cpp/path-injection': [
+        '#include <stdio.h>\nint main(int argc, char **argv) {\n  fopen(argv[1], "r");\n}\n',
+        '#include <fstream>\nint main(int argc, char **argv) {\n  std::ifstream in(argv[1]);\n}\n',
+        '#include <windows.h>\nvoid f(char *p) {\n  CreateFileA(p, 0, 0, 0, 0, 0, 0);\n}\n',
+    ],
+    'cpp/toctou-race-condition': [
+        '#include <stdio.h>\n#include <unistd.h>\nvoid f(const char *p) {\n  if (access(p, W_OK) == 0) {\n    fopen(p, "w");\n  }\n}\n',
+        '#include <sys/stat.h>\n#include <stdio.h>\nvoid f(const char *p) {\n  struct stat s;\n  if (stat(p, &s) == 0) remove(p);\n}\n',
+    ],
+    'cpp/work-with-file-without-permissions-rights': [
+        '#include <stdio.h>\nvoid f() {\n  FILE *fp = fopen("out.txt", "w");\n  fprintf(fp, "secret");\n}\n',
+    ],
+    'cpp/open-call-with-mode-argument': [
+        '#include <fcntl.h>\nvoid f() {\n  open("out.txt", O_CREAT | O_WRONLY);\n}\n',
+    ],
+    'cpp/world-writable-file-creation': [
+        '#include <fcntl.h>\nvoid f() {\n  open("out.txt", O_CREAT | O_WRONLY, 0666);\n}\n',
+        '#include <sys/stat.h>\nvoid f() {\n  chmod("out.txt", 0666);\n}\n',
+        '#include <fcntl.h>\nvoid f() {\n  creat("out.txt", 0777);\n}\n',
+    ],
+    'cpp/wrong-use-of-the-umask': [
+        '#include <sys/stat.h>\n#include <stdio.h>\nvoid f() {\n  umask(0);\n  fopen("out.txt", "w");\n}\n',
+        # Arithmetic in the mode, without umask
+        '#include <sys/stat.h>\nvoid f(int mode) {\n  chmod("out.txt", mode + 1);\n}\n',
+        '#include <sys/stat.h>\nvoid f(int fd, int mode) {\n  fchmod(fd, mode - 1);\n}\n',
+    ],
+    'cpp/cleartext-transmission': [
+        '#include <sys/socket.h>\nvoid f(int sock, const char *password) {\n  send(sock, password, 16, 0);\n}\n',
+        '#include <unistd.h>\nvoid f(int sock, char *password) {\n  read(sock, password, 16);\n}\n',
+    ],
+}
+
+
+@pytest.fixture(scope='module')
+def suite():
+    queries, query_ids = [], {}
+    for root, dirs, files in os.walk(QUERY_PATH):
+        dirs.sort()
+        for name in sorted(files):
+            if name.endswith('.ql'):
+                path = os.path.join(root, name)
+                queries.append(path)
+                query_ids.setdefault(read_query_id(path), path)
+    return queries, query_ids
+
+
+def test_every_trigger_has_samples(suite):
+    _, query_ids = suite
+    assert set(POSITIVE_SAMPLES) == set(QUERY_TRIGGERS)
+    assert set(QUERY_TRIGGERS) <= set(query_ids)
+
+
+# 1. 알려진 탐지 예제에서는 해당 쿼리가 항상 선택됨
+@pytest.mark.parametrize('rule_id, code', [
+    (rule_id, code) for rule_id, samples in POSITIVE_SAMPLES.items() for code in samples
+])
+def test_positive_samples_keep_their_query(suite, rule_id, code):
+    queries, query_ids = suite
+    plan = QueryPlanner().plan(code, 'cpp', query_ids, queries)
+    assert not plan.is_full_suite, plan.fallback
+    assert query_ids[rule_id] in plan.queries
+
+
+# 2. 관련 없는 코드에서는 쿼리를 건너뜀
+def test_unrelated_code_is_pruned(suite):
+    queries, query_ids = suite
+    plan = QueryPlanner().plan('int main() {\n  int x = 1;\n  return x;\n}\n', 'cpp', query_ids, queries)
+    assert not plan.is_full_suite
+    assert 'cpp/dangerous-use-convert-function' in plan.pruned
+    assert 'cpp/wrong-use-of-the-umask' in plan.pruned
+    assert len(plan.queries) == len(queries) - len(plan.pruned)
+
+
+def test_planner_falls_back_to_the_full_suite(suite):
+    queries, query_ids = suite
+    assert QueryPlanner().plan('int main( {', 'cpp', query_ids, queries).is_full_suite
+    assert QueryPlanner().plan('#include "local.h"\nint x;\n', 'cpp', query_ids, queries).is_full_suite
+    assert QueryPlanner().plan('x = 1\n', 'python', query_ids, queries).is_full_suite
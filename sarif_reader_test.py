@@ -0,0 +1,155 @@
+"""
+Incremental SARIF reader tests (modules/sarif_reader.py, and the findings and
+report of CodeQLAnalyzer built from it).
+
+    python -m pytest sarif_reader_test.py
+"""
+
+import io
+import json
+
+import pytest
+
+from modules.codeql_analyzer import CodeQLAnalyzer
+from modules.sarif_reader import (SarifFinding, SarifReader, _JsonStream, iter_sarif_results,
+                                  read_sarif_outline)
+
+CHUNK_SIZES = list(range(1, 17)) + [64 * 1024]
+
+
+def location(uri, line, start, end, message=None):
+    location = {'physicalLocation': {'artifactLocation': {'uri': uri},
+                                     'region': {'startLine': line, 'startColumn': start, 'endColumn': end}}}
+    if message:
+        location['message'] = {'text': message}
+    return location
+
+
+RULES = [
+    {'id': 'cpp/overflow-buffer', 'properties': {'tags': ['security', 'external/cwe/cwe-120']}},
+    {'id': 'cpp/uncontrolled-format-string', 'properties': {'tags': ['external/cwe/cwe-134']}},
+]
+RESULTS = [
+    {'ruleId': 'cpp/overflow-buffer', 'message': {'text': 'Write of 12 bytes into "buf" (8 bytes) – \\ overflow'},
+     'locations': [location('code_a.cpp', 3, 5, 11)]},
+    {'ruleIndex': 1, 'message': {'text': 'Format string from argv'},
+     'locations': [location('code_a.cpp', 7, 12, 16), location('code_a.cpp', 8, 1, 2)],
+     'codeFlows': [{'threadFlows': [{'locations': [
+         {'location': location('code_a.cpp', 2, 14, 18, 'argv')},
+         {'location': location('code_a.cpp', 7, 12, 16, 'fmt')},
+     ]}]}]},
+    {'ruleId': 'cpp/overflow-buffer', 'message': {'text': 'No location'}, 'locations': []},
+    {'ruleId': 'cpp/overflow-buffer', 'message': {'text': 'In a header'},
+     'locations': [location('include/util.h', 10, 1, 40)]},
+]
+
+
+def sarif_log(results_first=False):
+    run = {'tool': {'driver': {'name': 'CodeQL', 'rules': RULES}},
+           'artifacts': [{'location': {'uri': 'code_a.cpp'}}], 'results': RESULTS,
+           'properties': {'metricResults': [1.5, -2e-3, 10 ** 20, True, None]}}
+    if results_first:
+        run = {'results': RESULTS, **{key: value for key, value in run.items() if key != 'results'}}
+    return {'version': '2.1.0', '$schema': 'https://json.schemastore.org/sarif-2.1.0.json', 'runs': [run]}
+
+
+@pytest.fixture
+def sarif_file(tmp_path):
+    path = tmp_path / 'results.sarif'
+    path.write_text(json.dumps(sarif_log(), indent=1, ensure_ascii=False))
+    return str(path)
+
+
+# 1. 청크 경계에 걸친 토큰(문자열, 숫자, 리터럴, 이스케이프)도 그대로 디코딩
+@pytest.mark.parametrize('chunk_size', CHUNK_SIZES)
+def test_json_stream_across_chunk_boundaries(chunk_size):
+    values = [12345, -2.5e10, 'a"b\\c é中', True, False, None, {'k': [1, {'x': 'y'}], 'e': {}}, [], 7]
+    stream = _JsonStream(io.StringIO(' ' + json.dumps(values, ensure_ascii=False) + '\n'), chunk_size)
+    read = []
+    for _ in stream.iter_array():
+        read.append(stream.read_value())
+    assert read == values
+
+
+@pytest.mark.parametrize('chunk_size', CHUNK_SIZES)
+def test_json_stream_skips_nested_values(chunk_size):
+    document = {'skip': {'a': [1, [2, [3, '}]']]], 'b': 'x,y'}, 'keep': [1, 2]}
+    stream = _JsonStream(io.StringIO(json.dumps(document)), chunk_size)
+    kept = {}
+    for key in stream.iter_object():
+        if key == 'keep':
+            kept[key] = stream.read_value()
+        else:
+            stream.skip_value()
+    assert kept == {'keep': [1, 2]}
+
+
+def test_json_stream_rejects_truncated_input():
+    stream = _JsonStream(io.StringIO('[1, 2'), 1)
+    with pytest.raises(ValueError):
+        for _ in stream.iter_array():
+            stream.read_value()
+
+
+# 2. 결과별 스트리밍 읽기: 모든 위치와 code flow 유지, CWE 연결
+@pytest.mark.parametrize('chunk_size', CHUNK_SIZES)
+@pytest.mark.parametrize('results_first', [False, True])
+def test_reader_keeps_locations_and_code_flows(tmp_path, chunk_size, results_first):
+    path = tmp_path / 'results.sarif'
+    path.write_text(json.dumps(sarif_log(results_first), ensure_ascii=False))
+    findings = list(SarifReader(str(path), chunk_size))
+
+    assert [finding.rule_id for finding in findings] == [
+        'cpp/overflow-buffer', 'cpp/uncontrolled-format-string', 'cpp/overflow-buffer', 'cpp/overflow-buffer']
+    assert [finding.cwe for finding in findings] == ['120', '134', '120', '120']
+    assert findings[0].message == RESULTS[0]['message']['text']
+    flow, = findings[1].code_flows
+    assert [(step.start_line, step.message) for step in flow] == [(2, 'argv'), (7, 'fmt')]
+    assert [step.describe() for step in findings[1].locations] == ['line 7, column 12-16', 'line 8, column 1-2']
+    assert findings[2].locations == ()
+
+
+@pytest.mark.parametrize('chunk_size', [1, 7, 64 * 1024])
+def test_outline_and_results(sarif_file, chunk_size):
+    with open(sarif_file) as file:
+        expected = json.load(file)
+    log, runs = read_sarif_outline(sarif_file, chunk_size)
+
+    assert log == {key: value for key, value in expected.items() if key != 'runs'}
+    assert runs == [{key: value for key, value in run.items() if key != 'results'} for run in expected['runs']]
+    assert list(iter_sarif_results(sarif_file, chunk_size)) == [(0, result) for result in RESULTS]
+
+
+def test_finding_round_trip(sarif_file):
+    for finding in SarifReader(sarif_file):
+        assert SarifFinding.from_dict(json.loads(json.dumps(finding.to_dict()))).to_dict() == finding.to_dict()
+
+
+# 3. 분석기: 결과는 finding 레코드, 보고서는 파일별 요약
+@pytest.fixture
+def analyzer(tmp_path):
+    return CodeQLAnalyzer(str(tmp_path / 'code'), str(tmp_path / 'db'), str(tmp_path / 'repo'))
+
+
+def test_findings_and_report(analyzer, sarif_file):
+    findings = analyzer.process_sarif_results(sarif_file)
+
+    assert all(isinstance(finding, SarifFinding) for finding in findings)
+    assert [finding.uri for finding in findings] == ['code_a.cpp', 'code_a.cpp', 'include/util.h']
+    assert len(findings[1].code_flows[0]) == 2
+
+    vul_type, report = analyzer.format_vulnerability_report(findings)
+    assert vul_type == 'Vulnerable'
+    assert report == ''.join(analyzer.iter_vulnerability_report(findings))
+    assert report.count('Vulnerability #') == 2
+    assert '- File: code_a.cpp\n- Rule ID: cpp/overflow-buffer, cpp/uncontrolled-format-string\n' in report
+    assert '- CWEs: CWE-120, CWE-134\n' in report
+    assert '- Location(s): line 3, column 5-11; line 7, column 12-16; line 8, column 1-2\n' in report
+    assert report.startswith('A. Vulnerable: Yes\nB. Score: -30\n')
+
+    per_file = analyzer.split_findings_by_file(findings, ['code_a.cpp', 'code_b.cpp'])
+    assert len(per_file['code_a.cpp']) == 2 and per_file['code_b.cpp'] == []
+
+
+def test_safe_report(analyzer):
+    assert analyzer.format_vulnerability_report([]) == ('Safe', ''.join(analyzer.iter_vulnerability_report([])))
@@ -1,11 +1,11 @@
 from modules.generate_gpt import GPT_Model
 from modules.generate_skku import SKKU_Model
 from modules.secure_rewriter_cpp import secure_rewriter, parse_cwe_text
-from modules.single_code_inference import (SingleCodeDetector, analyze_code)
+from modules.single_code_inference import (SingleCodeDetector, analyze_code, format_result)
+from modules.micro_batcher import MicroBatcher
 from modules.utils import *
-from modules.codeql_analyzer import CodeQLAnalyzer  # 위 코드를 analyzer.py로 저장했다고 가정
+from modules.codeql_analyzer import CodeQLAnalyzer, CodeQLQueueFull, CodeQLResourceLimitError  # 위 코드를 analyzer.py로 저장했다고 가정
 from functools import lru_cache
-import shutil
 import os
 
 rootdir = os.getcwd()
@@ -13,16 +13,58 @@ codeql_home = "/home/sheart95/codeql-home"
 # CodeQL 실행 처리를 위한 임시 디렉토리 (코드, DB) 설정
 code_path = f"{rootdir}/codeql_tmp/code"
 db_path = f"{rootdir}/codeql_tmp/db"
+# CodeQL 분석 결과 캐시 디렉토리 (동일 코드 재분석 시 재사용)
+cache_path = f"{rootdir}/codeql_tmp/cache"
+# 쿼리별 평가 시간/튜플 수 프로파일링 (느린 쿼리 파악용, 켜면 분석마다 evaluator log 생성)
+codeql_profiling = False
+profile_path = f"{rootdir}/codeql_tmp/profile"
 
 # 사용자의 CodeQL repo 경로 지정 (예시)
 codeql_repo = "/home/sheart95/codeql-home/codeql-repo"  # 예: ~/codeql-home/codeql
+# 사전 컴파일된 Top25 쿼리 팩 (python -m modules.codeql_querypack 로 생성, 없으면 repo의 쿼리 사용)
+query_pack = f"{rootdir}/codeql_packs"
+# 업로드된 프로젝트 압축 파일 임시 저장 경로 / 최대 업로드 크기
+upload_path = f"{rootdir}/codeql_tmp/uploads"
+max_project_upload_bytes = 256 * 1024 ** 2
+# 프로젝트 분석 시 사용자가 지정한 빌드 명령 실행 허용 여부 (서버에서 임의 명령이 실행되므로 신뢰된 환경에서만 허용)
+allow_project_build_commands = False
+# 비동기 CodeQL 분석 1건의 최대 소요 시간 (초, 대기열 대기 포함)
+codeql_deadline = 600
+# 수정 코드 검증 시 첫 분석에서 탐지된 규칙 외에 함께 실행할 가벼운 sanity 쿼리
+verify_sanity_rules = ["cpp/overrunning-write", "cpp/badly-bounded-write", "cpp/no-space-for-terminator"]
+# 수정 코드 검증 후 전체 쿼리 재분석을 백그라운드로 실행 (결과는 캐시에 저장, 검증마다 전체 분석 비용이 추가됨)
+verify_full_rescan = False
+# 모델 추론 backend ("torch" 또는 "onnx", onnx 는 python -m modules.onnx_export 로 생성한 그래프를 ONNX Runtime 으로 실행)
+model_backend = "torch"
+model_onnx_path = f"{rootdir}/models/onnx/model_etri_demo.onnx"
+# 모델 분석 요청 micro-batching (동시 요청을 최대 max_batch 개까지, 최대 max_wait_ms 동안 모아 한 번의 forward 로 처리)
+model_max_batch = 16
+model_max_wait_ms = 10
 
 @lru_cache
 def get_codeql_analyzer():
     return CodeQLAnalyzer(
         code_path=str(code_path),
         database_path=str(db_path),
-        codeql_repo_path=str(codeql_repo)
+        codeql_repo_path=str(codeql_repo),
+        cache_path=str(cache_path),
+        query_pack_path=str(query_pack) if os.path.isdir(query_pack) else None,
+        build_mode="compile",  # 링크 없이 컴파일만 수행 (main 없는 코드 조각도 DB 생성 가능)
+        preflight=["compiler"],  # 컴파일 불가 코드는 CodeQL 실행 전에 즉시 실패 처리
+        max_concurrent_jobs=max(1, (os.cpu_count() or 4) // 4),  # 동시 CodeQL 분석 수 제한
+        max_queued_jobs=16,  # 대기열이 가득 차면 CodeQLQueueFull (retry-after) 발생
+        query_shards=4,  # 여유 코어가 있을 때 쿼리 묶음을 최대 4개로 나눠 병렬 실행
+        profile_path=str(profile_path) if codeql_profiling else None,
+        db_retention_bytes=2 * 1024 ** 3,  # 추출된 DB를 소스 해시별로 보관 (재분석 시 추출 생략, 2GB 초과 시 LRU 삭제)
+        workspace_backend="tmpfs" if os.path.isdir("/dev/shm") else "disk",  # 작업 공간을 RAM(/dev/shm)에 생성, 공간 부족 시 작업별로 디스크 사용
+        allow_project_build_commands=allow_project_build_commands,
+        query_planning=True,  # tree-sitter로 호출 함수/include/구문을 확인해 발생 불가능한 쿼리는 실행하지 않음
+        # 작업별 자원 제한 (빌드/추출/쿼리 프로세스에 적용, 초과 시 CodeQLResourceLimitError로 즉시 실패)
+        job_cpu_seconds=1800,  # 프로세스별 CPU 시간 (JVM은 전체 스레드 합산)
+        job_memory_mb=16 * 1024,  # 프로세스별 메모리 (RLIMIT_DATA, JVM 예약 주소 공간은 제외 / --ram 은 이보다 1GB 작게 제한됨)
+        job_file_size_mb=1024,  # 생성 가능한 파일 최대 크기
+        job_disk_quota_mb=4 * 1024,  # 작업 공간(코드, DB, 결과) 디스크 사용량
+        job_wall_clock=300  # 명령별 최대 실행 시간 (초)
     )
 
 @lru_cache
@@ -39,8 +81,15 @@ def get_skku_detector():
         model_name_or_path="microsoft/codebert-base",
         checkpoint_path="models/checkpoints/model_etri_demo.bin",
         model_type="roberta",
-        num_labels=4
+        num_labels=4,
+        batch_size=16,  # predict_batch 시 한 번의 forward 로 처리할 코드 수
+        backend=model_backend,
+        onnx_path=model_onnx_path if model_backend == "onnx" else None
     )
+
+@lru_cache
+def get_skku_batcher():
+    return MicroBatcher(get_skku_detector(), max_batch_size=model_max_batch, max_wait_ms=model_max_wait_ms)
     
 # 1. 코드 생성
 def code_generation(model_id: str, prompt: str):
@@ -58,31 +107,135 @@ def code_generation(model_id: str, prompt: str):
 
 # 2.1 코드 분석
 def model_code_analysis(code: str):
-    detector = get_skku_detector()
+    detector = get_skku_batcher()  # 동시 요청과 함께 배치로 처리
     vul_type, analysis = analyze_code(detector, code)
     print(vul_type)
     print(analysis)
     return vul_type, analysis
 
+# 2.1 코드 분석 (비동기, 스레드를 점유하지 않고 micro-batch 결과를 대기)
+async def model_code_analysis_async(code: str):
+    batcher = get_skku_batcher()
+    result = await batcher.predict_async(code.strip(), language='c')
+    vul_type, analysis = format_result(batcher, result)
+    print(vul_type)
+    print(analysis)
+    return vul_type, analysis
+
+# 2.1.1 모델 micro-batcher 지표 (배치 크기, 대기 시간 히스토그램)
+def model_metrics():
+    return get_skku_batcher().stats()
+
 # 2.2 CODEQL 분석
 def codeql_code_analysis(code: str):
     analyzer = get_codeql_analyzer()
     try:
         vul_type, report = analyzer.analyze_code(code, language="cpp")
+    except CodeQLQueueFull:
+        raise  # API 계층에서 503 + Retry-After 로 응답
+    except CodeQLResourceLimitError as e:
+        vul_type = "Error"
+        report = f"[ERROR]: CodeQL analysis stopped at a resource limit ({e.limit}):\n {e}"
     except Exception as e:
         vul_type = "Error"
         report = f"[ERROR]: CodeQL analysis failed:\n {e}"
-        # 🔥 실행 후 임시 디렉토리 정리
-    finally:
-        shutil.rmtree(code_path, ignore_errors=True)
-        shutil.rmtree(db_path, ignore_errors=True)
-        os.makedirs(code_path, exist_ok=True)
-        os.makedirs(db_path, exist_ok=True)
+    # 임시 디렉토리는 분석 작업별 워크스페이스 단위로 analyzer가 정리 (동시 요청 간 간섭 없음)
+
+    print(vul_type)
+    print(report)
+    return vul_type, report
+
+# 2.2.1 CODEQL 비동기 분석 (요청 취소/마감 시간 초과 시 실행 중인 CodeQL 프로세스 즉시 종료)
+async def codeql_code_analysis_async(code: str, deadline: float = codeql_deadline):
+    analyzer = get_codeql_analyzer()
+    try:
+        vul_type, report = await analyzer.analyze_code_async(code, language="cpp", deadline=deadline)
+    except CodeQLQueueFull:
+        raise  # API 계층에서 503 + Retry-After 로 응답
+    except CodeQLResourceLimitError as e:
+        vul_type = "Error"
+        report = f"[ERROR]: CodeQL analysis stopped at a resource limit ({e.limit}):\n {e}"
+    except Exception as e:
+        vul_type = "Error"
+        report = f"[ERROR]: CodeQL analysis failed:\n {e}"
+
+    print(vul_type)
+    print(report)
+    return vul_type, report
+
+# 2.2.2 CODEQL 수정 코드 검증 (첫 분석 보고서의 규칙 ID에 해당하는 쿼리 + sanity 쿼리만 실행)
+def codeql_fix_verification(code_fixed: str, analysis: str):
+    analyzer = get_codeql_analyzer()
+    try:
+        result = analyzer.verify_fix(code_fixed, "cpp", extract_rule_ids(analysis),
+                                     sanity_rules=verify_sanity_rules, full_rescan=verify_full_rescan)
+        vul_type, report = result.vul_type, result.report
+    except CodeQLQueueFull:
+        raise  # API 계층에서 503 + Retry-After 로 응답
+    except CodeQLResourceLimitError as e:
+        vul_type = "Error"
+        report = f"[ERROR]: CodeQL fix verification stopped at a resource limit ({e.limit}):\n {e}"
+    except Exception as e:
+        vul_type = "Error"
+        report = f"[ERROR]: CodeQL fix verification failed:\n {e}"
+
+    print(vul_type)
+    print(report)
+    return vul_type, report
+
+# 2.2.3 CODEQL 수정 코드 비동기 검증 (요청 취소/마감 시간 초과 시 CodeQL 프로세스 즉시 종료)
+async def codeql_fix_verification_async(code_fixed: str, analysis: str, deadline: float = codeql_deadline):
+    analyzer = get_codeql_analyzer()
+    try:
+        result = await analyzer.verify_fix_async(code_fixed, "cpp", extract_rule_ids(analysis),
+                                                 sanity_rules=verify_sanity_rules, full_rescan=verify_full_rescan,
+                                                 deadline=deadline)
+        vul_type, report = result.vul_type, result.report
+    except CodeQLQueueFull:
+        raise  # API 계층에서 503 + Retry-After 로 응답
+    except CodeQLResourceLimitError as e:
+        vul_type = "Error"
+        report = f"[ERROR]: CodeQL fix verification stopped at a resource limit ({e.limit}):\n {e}"
+    except Exception as e:
+        vul_type = "Error"
+        report = f"[ERROR]: CodeQL fix verification failed:\n {e}"
 
     print(vul_type)
     print(report)
     return vul_type, report
 
+# 2.3 CODEQL 배치 분석 (여러 코드를 하나의 DB로 분석)
+def codeql_batch_analysis(codes: list):
+    analyzer = get_codeql_analyzer()
+    try:
+        results = analyzer.analyze_batch(codes, language="cpp")
+        return [(result.vul_type, result.report) for result in results]
+    except CodeQLQueueFull:
+        raise
+    except Exception as e:
+        report = f"[ERROR]: CodeQL batch analysis failed:\n {e}"
+        return [("Error", report) for _ in codes]
+
+# 2.3.1 CODEQL 프로젝트 분석 (tar/zip 압축 파일 전체를 하나의 DB로 분석)
+async def codeql_project_analysis(archive_path: str, build_command: str = None):
+    analyzer = get_codeql_analyzer()
+    try:
+        result = await analyzer.analyze_project_async(archive_path, language="cpp", build_command=build_command,
+                                                       deadline=analyzer.project_timeout * 2)
+        return result.vul_type, result.report, result.diagnostics
+    finally:
+        # 업로드 파일은 분석이 끝나면 삭제
+        if os.path.exists(archive_path):
+            os.remove(archive_path)
+
+# 2.4 CODEQL 분석기 지표 (캐시, pre-flight, 대기열 길이/대기 시간/실행 시간)
+def codeql_metrics():
+    return get_codeql_analyzer().get_metrics()
+
+# 2.5 CODEQL 쿼리별 프로파일 (누적 평가 시간이 긴 쿼리 순)
+def codeql_query_profile(limit: int = 10):
+    return get_codeql_analyzer().get_query_profile(limit)
+
 # 3. 코드 수정
 def code_fix(code: str, analysis: str):
     analysis_cwe_extract = extract_cwe_ids(analysis) 
@@ -107,7 +260,7 @@ def pipeline(model_id, prompt):
         
         print("=== Code Fix Response ===")
         print("Fixed Code:\n", code_fixed)
-        vul_type_fixed, analysis_fixed = codeql_code_analysis(code_fixed)        
+        vul_type_fixed, analysis_fixed = codeql_fix_verification(code_fixed, analysis)
  
         print("=== Post-Fix Code Analysis Response (Model) ===")
         print("Vulnerability Type:", vul_type_fixed)
@@ -126,7 +279,7 @@ async def pipeline_stream(model_id, prompt):
     yield {"stage": "generation", "code": code}
 
     # 2. 취약점 분석
-    vul_type, analysis = codeql_code_analysis(code)
+    vul_type, analysis = await codeql_code_analysis_async(code)
     yield {"stage": "analysis", "vul_type": vul_type, "analysis": analysis}
 
     # 3. 코드 수정 (취약점 있을 경우)
@@ -134,7 +287,7 @@ async def pipeline_stream(model_id, prompt):
         code_fixed = code_fix(code, analysis)
         yield {"stage": "fix", "code_fixed": code_fixed}
 
-        vul_type_fixed, analysis_fixed = codeql_code_analysis(code_fixed)
+        vul_type_fixed, analysis_fixed = await codeql_fix_verification_async(code_fixed, analysis)
         yield {"stage": "postfix_analysis", "vul_type_fixed": vul_type_fixed, "analysis_fixed": analysis_fixed}
     else:
         yield {"stage": "done", "message": "No vulnerabilities found."}
@@ -146,7 +299,7 @@ async def code_generation_pipeline_stream(model_id, prompt):
     yield {"stage": "generation", "code": code}
 
     # 2. 취약점 분석
-    vul_type, analysis = codeql_code_analysis(code)
+    vul_type, analysis = await codeql_code_analysis_async(code)
     yield {"stage": "analysis", "vul_type": vul_type, "analysis": analysis}
 
 # 스트리밍 코드 수정 파이프라인
@@ -155,8 +308,8 @@ async def code_fix_pipeline_stream(code, analysis):
     code_fixed = code_fix(code, analysis)
     yield {"stage": "fix", "code_fixed": code_fixed}
 
-    # 4. 수정된 코드 재분석
-    vul_type_fixed, analysis_fixed = codeql_code_analysis(code_fixed)
+    # 4. 수정된 코드 재분석 (첫 분석에서 탐지된 규칙만 검증)
+    vul_type_fixed, analysis_fixed = await codeql_fix_verification_async(code_fixed, analysis)
     yield {"stage": "postfix_analysis", "vul_type_fixed": vul_type_fixed, "analysis_fixed": analysis_fixed}
 
 
@@ -0,0 +1,62 @@
+"""
+Length-bucketed inference batching tests (modules/vulnerability_detector.py
+LengthBucketBatchSampler, PaddingCollator and restore_order).
+
+    python -m pytest vulnerability_detector_test.py
+"""
+
+import pytest
+
+torch = pytest.importorskip('torch')
+pytest.importorskip('transformers')
+
+import numpy as np
+from torch.utils.data import DataLoader
+
+from modules.vulnerability_detector import LengthBucketBatchSampler, PaddingCollator, restore_order
+
+LENGTHS = [3, 9, 1, 9, 5, 2, 7, 4, 4, 6, 1]
+
+
+class LengthDataset(torch.utils.data.Dataset):
+    """Items whose input IDs encode their dataset index, label = index."""
+
+    def __init__(self, lengths):
+        self.items = [(torch.full((length,), index + 1, dtype=torch.long), torch.tensor(index))
+                      for index, length in enumerate(lengths)]
+
+    def __len__(self):
+        return len(self.items)
+
+    def __getitem__(self, index):
+        return self.items[index]
+
+
+# 1. 길이별 배치: 긴 입력부터, 배치마다 길이가 비슷
+@pytest.mark.parametrize('batch_size', [1, 3, 4, 32])
+def test_batches_are_grouped_by_length(batch_size):
+    sampler = LengthBucketBatchSampler(LENGTHS, batch_size)
+    batches = list(sampler)
+
+    assert len(batches) == len(sampler)
+    assert sorted(index for batch in batches for index in batch) == list(range(len(LENGTHS)))
+    assert [LENGTHS[index] for batch in batches for index in batch] == sorted(LENGTHS, reverse=True)
+    assert [index for batch in batches for index in batch] == sampler.order
+
+
+# 2. 배치 순서로 모은 출력은 원래 데이터 순서로 복원
+@pytest.mark.parametrize('batch_size', [1, 3, 4, 32])
+def test_outputs_are_restored_to_dataset_order(batch_size):
+    sampler = LengthBucketBatchSampler(LENGTHS, batch_size)
+    dataloader = DataLoader(LengthDataset(LENGTHS), batch_sampler=sampler, collate_fn=PaddingCollator(0))
+
+    all_logits, all_labels = [], []
+    for inputs, attention_mask, labels in dataloader:
+        # Stand-in model: one logit row per input, [index, length]
+        all_logits.append(torch.stack([inputs[:, 0] - 1, attention_mask.sum(dim=1)], dim=1).numpy())
+        all_labels.append(labels.numpy())
+    logits, labels = restore_order(sampler.order, np.concatenate(all_logits), np.concatenate(all_labels))
+
+    assert labels.tolist() == list(range(len(LENGTHS)))
+    assert logits[:, 0].tolist() == list(range(len(LENGTHS)))
+    assert logits[:, 1].tolist() == LENGTHS